@@ -0,0 +1,158 @@
+"""Keyframe choreographies for the emotion reactions.
+
+A reaction is data: per-channel keyframe tracks (time in seconds, value)
+that are linearly interpolated. ``compile_choreography`` samples every track
+once at the control-loop rate into a (ticks, len(COLUMNS)) NumPy array, so
+dog_control's control loop plays a reaction back by reading one row per
+tick. Channels without keys stay 0; a track holds its last value.
+
+The robot walks (mode 2, trot) on ticks where any velocity channel is
+non-zero and holds a forced stand (mode 1) otherwise.
+
+    python choreography.py          # print duration/size of each compiled reaction
+"""
+
+import numpy as np
+
+CHANNELS = ('body_height', 'roll', 'pitch', 'yaw', 'vx', 'vy', 'yaw_speed')
+COLUMNS = ('mode', 'gait_type') + CHANNELS
+VELOCITY_CHANNELS = ('vx', 'vy', 'yaw_speed')
+RAMP = 0.1  # 秒，两个设定值之间的过渡时间
+
+
+def steps(changes, ramp=RAMP, start=0.0):
+    """Keyframes for a piecewise-constant track with linear ramps.
+
+    ``changes`` is a list of (time, value): the track ramps from the previous
+    value to ``value`` over ``ramp`` seconds starting at ``time``.
+    """
+    keys = []
+    value = start
+    for t, target in changes:
+        keys += [(t, value), (t + ramp, target)]
+        value = target
+    return keys
+
+
+class Choreography:
+    """Declarative reaction: ``tracks`` maps a channel name to keyframes."""
+
+    def __init__(self, name, duration, tracks):
+        unknown = set(tracks) - set(CHANNELS)
+        if unknown:
+            raise ValueError(f"{name}: unknown channels {sorted(unknown)}")
+        self.name = name
+        self.duration = duration
+        self.tracks = tracks
+
+
+class CompiledChoreography:
+    """Per-tick command rows; ``commands[i]`` follows ``COLUMNS``.
+
+    ``settle_time`` is when the last row change is sent; the rest of
+    ``duration`` only holds the final pose and serves as a timeout for it.
+
+    With a ``row_factory`` the rows are also prebuilt as ``setpoints``:
+    ``row_factory(mode, gait_type, body_height, euler, velocity, yaw_speed)``
+    is called once per distinct row and consecutive equal rows share the same
+    object, so a player can skip unchanged ticks with an identity check.
+    """
+
+    def __init__(self, name, commands, period, row_factory=None):
+        self.name = name
+        self.commands = commands
+        self.period = period
+        self.duration = len(commands) * period
+        changed = np.nonzero(np.any(np.diff(commands, axis=0) != 0, axis=1))[0]
+        self.settle_time = ((changed[-1] + 2) if len(changed) else 1) * period
+        self.setpoints = None
+        if row_factory is not None:
+            self.setpoints = []
+            previous = current = None
+            for row in commands.tolist():
+                if row != previous:
+                    mode, gait, height, roll, pitch, yaw, vx, vy, yaw_speed = row
+                    current = row_factory(int(mode), int(gait), height, (roll, pitch, yaw),
+                                          (vx, vy), yaw_speed)
+                    previous = row
+                self.setpoints.append(current)
+
+    def __len__(self):
+        return len(self.commands)
+
+
+def compile_choreography(choreography, rate, row_factory=None):
+    """Sample every track at ``rate`` Hz."""
+    period = 1.0 / rate
+    ticks = max(1, int(round(choreography.duration * rate)))
+    t = np.arange(1, ticks + 1) * period  # 第 i 拍发送 t=(i+1)*period 时刻的设定值
+    commands = np.zeros((ticks, len(COLUMNS)))
+    for channel, keys in choreography.tracks.items():
+        times = np.array([k[0] for k in keys], dtype=float)
+        if np.any(np.diff(times) < 0):
+            raise ValueError(f"{choreography.name}: '{channel}' keyframes are not in time order")
+        commands[:, COLUMNS.index(channel)] = np.interp(t, times, [k[1] for k in keys])
+
+    walking = np.any(commands[:, [COLUMNS.index(c) for c in VELOCITY_CHANNELS]] != 0.0, axis=1)
+    commands[:, COLUMNS.index('mode')] = np.where(walking, 2, 1)       # 2: walk, 1: forced stand
+    commands[:, COLUMNS.index('gait_type')] = np.where(walking, 1, 0)  # 1: trot
+    if walking[-1]:
+        raise ValueError(f"{choreography.name}: ends while walking (the last row is held)")
+    commands.flags.writeable = False
+    return CompiledChoreography(choreography.name, commands, period, row_factory)
+
+
+# ========== Emotion reactions ==========
+SWAY_ANGLE = 0.35  # 摇摆角度（弧度）
+
+REACTIONS = [
+    # 生气：后退两步，停顿，然后坐下
+    Choreography('angry_reaction', 4.5, {
+        'vx': steps([(0.0, -0.3), (2.0, 0.0)]),
+        'body_height': steps([(2.5, -0.2)]),
+    }),
+    # 悲伤：靠近两步，停顿，然后坐下
+    Choreography('sad_reaction', 4.5, {
+        'vx': steps([(0.0, 0.2), (2.0, 0.0)]),
+        'body_height': steps([(2.5, -0.2)]),
+    }),
+    # 高兴：站直后左右摇摆身体 3 次，再回到中性位置
+    Choreography('happy_reaction', 7.2, {
+        'roll': steps([(0.5 + i, SWAY_ANGLE if i % 2 == 0 else -SWAY_ANGLE) for i in range(6)]
+                      + [(6.5, 0.0)]),
+    }),
+    # 害怕：快速后退并蹲低
+    Choreography('fear_reaction', 3.3, {
+        'vx': steps([(0.0, -0.4), (1.5, 0.0)]),
+        'body_height': steps([(1.8, -0.25)]),
+    }),
+    # 惊讶：快速站高，然后回到正常高度
+    Choreography('surprise_reaction', 2.5, {
+        'body_height': steps([(0.0, 0.2), (1.5, 0.0)], ramp=0.05),
+    }),
+    # 厌恶：转身避开，然后稍微后退
+    Choreography('disgust_reaction', 4.0, {
+        'yaw_speed': steps([(0.0, 1.0), (2.0, 0.0)]),
+        'vx': steps([(2.5, -0.2), (3.5, 0.0)]),
+    }),
+]
+
+
+def compile_reactions(rate, reactions=REACTIONS, row_factory=None):
+    """Compile every reaction; returns {name: CompiledChoreography}."""
+    return {c.name: compile_choreography(c, rate, row_factory) for c in reactions}
+
+
+def main():
+    import time
+    start = time.perf_counter()
+    compiled = compile_reactions(500)
+    elapsed = time.perf_counter() - start
+    for program in compiled.values():
+        print(f"[Choreography] {program.name:18s} {program.duration:4.1f}s {len(program):5d} ticks "
+              f"{program.commands.nbytes / 1024:6.1f} KiB")
+    print(f"[Choreography] compiled {len(compiled)} reactions in {elapsed * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
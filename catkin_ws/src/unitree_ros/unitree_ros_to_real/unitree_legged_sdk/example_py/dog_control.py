@@ -2,23 +2,177 @@
 
 import time
 import threading
-import sys
+import functools
 import math
-
-sys.path.append('../lib/python/amd64')
-import robot_interface as sdk
-
-# ========== UDP Setup ==========
-HIGHLEVEL = 0xee
-udp = sdk.UDP(HIGHLEVEL, 8080, "192.168.123.161", 8082)
-
-cmd = sdk.HighCmd()
-state = sdk.HighState()
-udp.InitCmdData(cmd)
-
-# ========== Thread Lock ==========
-is_busy = False
-lock = threading.Lock()
+from collections import deque, namedtuple
+
+import choreography
+import metrics
+import telemetry
+
+import robot_backend
+
+# ========== Robot Backend ==========
+# ROBOT_BACKEND=sdk（默认，真实机器人 UDP）| sim | sim-virtual（虚拟时间仿真）
+backend = None
+udp = cmd = state = clock = None
+
+control = None  # ControlLoop，在下方创建
+
+def use_backend(new_backend):
+    """Switch the backend (udp/cmd/state/clock) used by every action."""
+    global backend, udp, cmd, state, clock
+    if control is not None:
+        control.stop()
+    backend = new_backend
+    udp, cmd, state, clock = new_backend.udp, new_backend.cmd, new_backend.state, new_backend.clock
+    print(f"[Backend] Using {new_backend.name} backend")
+    if control is not None:
+        _write_full(IDLE)
+        control.publish(IDLE)
+        if not clock.virtual:
+            control.start()
+
+use_backend(robot_backend.create_backend())
+
+# ========== Action Executor ==========
+# 优先级：停止 > 运动 > 情绪反应。更高优先级的命令会在一个控制周期内抢占正在执行的动作
+PRIORITY_EMOTION = 1
+PRIORITY_MOTION = 2
+PRIORITY_STOP = 3
+
+class ActionCancelled(Exception):
+    """Raised inside a running action when a higher-priority command preempts it."""
+
+class Action:
+    def __init__(self, name, func, priority, origin=None):
+        self.name = name
+        self.func = func
+        self.priority = priority
+        self.origin = origin  # time.monotonic() of the token that caused it
+        self.cancel_event = threading.Event()
+        self.preempted_at = None  # perf_counter() at the moment of preemption
+
+class ActionExecutor:
+    """Runs robot actions one at a time on a dedicated worker thread.
+
+    ``submit()`` never blocks. A command with strictly higher priority than
+    the running action cancels it; the action notices at its next control
+    tick (``check_cancelled``/``sleep``) and the new command starts right
+    after. Lower or equal priority commands are ignored while busy.
+    """
+
+    def __init__(self, history=1000):
+        self._cond = threading.Condition()
+        self._running = None
+        self._pending = None
+        self.preempt_latencies = deque(maxlen=history)  # 秒
+        self._thread = threading.Thread(target=self._worker, name='action-executor', daemon=True)
+        self._thread.start()
+
+    def submit(self, name, func, priority, origin=None):
+        with self._cond:
+            running = self._running
+            if running is not None and priority <= running.priority:
+                print(f"[Warning] Robot is busy ({running.name}). Ignoring '{name}' command.")
+                return None
+            if self._pending is not None and priority < self._pending.priority:
+                print(f"[Warning] Robot is busy ({self._pending.name}). Ignoring '{name}' command.")
+                return None
+
+            action = Action(name, func, priority, origin)
+            if running is not None and not running.cancel_event.is_set():
+                print(f"[Executor] Preempting '{running.name}' for '{name}'")
+                running.preempted_at = time.perf_counter()
+                running.cancel_event.set()
+            self._pending = action
+            metrics.ACTION_QUEUE_DEPTH.set(1 if running is None else 2)
+            self._cond.notify()
+            return action
+
+    def is_busy(self):
+        with self._cond:
+            return self._running is not None or self._pending is not None
+
+    def wait_idle(self, timeout=None):
+        """Block until no action is running or pending."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._running is None and self._pending is None, timeout)
+
+    def check_cancelled(self):
+        """Raise ActionCancelled if the calling action has been preempted."""
+        action = self._running
+        if (action is not None and action.cancel_event.is_set()
+                and threading.current_thread() is self._thread):
+            raise ActionCancelled(action.name)
+
+    def sleep(self, seconds):
+        """Cancellable replacement for time.sleep() inside actions."""
+        action = self._running
+        in_action = action is not None and threading.current_thread() is self._thread
+        if in_action and not clock.virtual:
+            if action.cancel_event.wait(seconds):
+                raise ActionCancelled(action.name)
+            return
+        if clock.virtual:
+            control.run_for(seconds)  # 虚拟时间下由调用线程逐拍驱动控制循环
+            return
+        clock.sleep(seconds)
+
+    def current_action(self):
+        """Name of the running action, or None."""
+        action = self._running
+        return action.name if action is not None else None
+
+    def preemption_stats(self):
+        """Measured preemption latency (request -> preempted action exited)."""
+        latencies = list(self.preempt_latencies)
+        if not latencies:
+            return {'count': 0, 'mean_ms': 0.0, 'max_ms': 0.0}
+        return {
+            'count': len(latencies),
+            'mean_ms': sum(latencies) / len(latencies) * 1000,
+            'max_ms': max(latencies) * 1000,
+        }
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None)
+                action = self._running = self._pending
+                self._pending = None
+                metrics.ACTION_QUEUE_DEPTH.set(1)
+
+            _arm_first_send(action.origin)
+            started = time.perf_counter()
+            try:
+                action.func()
+            except ActionCancelled:
+                pass
+            except Exception as e:
+                print(f"[Error] Action '{action.name}' failed: {e}")
+            finally:
+                metrics.ACTION_DURATION.observe(time.perf_counter() - started, action.name)
+                with self._cond:
+                    self._running = None
+                    metrics.ACTION_QUEUE_DEPTH.set(0 if self._pending is None else 1)
+                    if action.preempted_at is not None:
+                        latency = time.perf_counter() - action.preempted_at
+                        self.preempt_latencies.append(latency)
+                        print(f"[Executor] '{action.name}' preempted in {latency * 1000:.1f} ms")
+                    self._cond.notify_all()
+
+executor = ActionExecutor()
+
+def action(priority):
+    """Turn an action body into a non-blocking command submitted to ``executor``."""
+    def decorator(func):
+        @functools.wraps(func)
+        def submit(origin=None):
+            return executor.submit(func.__name__, func, priority, origin)
+        submit.run = func  # 同步执行（不经过 executor）
+        return submit
+    return decorator
 
 # ========== Speed Control ==========
 current_speed = 0.2  # 默认速度
@@ -29,8 +183,30 @@ min_speed = 0.1
 # ========== Continuous Movement Control ==========
 is_moving = False
 movement_direction = 0  # 0: stopped, 1: forward, -1: backward
-movement_thread = None
-stop_movement = False
+
+# ========== UDP Send + Metrics ==========
+_first_send_origin = None  # 动作开始时记录，首次发布设定点时交给控制循环
+_publish_origin = None     # 等待记录"手势到达 → 首次发送"延迟的时间戳
+_last_send_time = None
+
+def _arm_first_send(origin):
+    global _first_send_origin
+    _first_send_origin = origin
+
+def _transmit():
+    """Push ``cmd`` to the robot and record send-loop timing."""
+    global _publish_origin, _last_send_time
+    udp.SetSend(cmd)
+    udp.Send()
+
+    now = clock.time()
+    if _last_send_time is not None and 0 <= now - _last_send_time < 0.1:  # 只统计连续发送中的周期
+        metrics.UDP_SEND_PERIOD.observe(now - _last_send_time)
+    _last_send_time = now
+    origin = _publish_origin
+    if origin is not None:
+        _publish_origin = None
+        metrics.TOKEN_TO_FIRST_SEND.observe(time.monotonic() - origin)
 
 def _init_cmd_fields():
     """初始化所有字段到官方示例的默认值"""
@@ -44,66 +220,447 @@ def _init_cmd_fields():
     cmd.yawSpeed = 0.0
     cmd.reserve = 0
 
-def send_body_height(height, duration_ms=1000):
-    """Send body height command to robot."""
-    t0 = time.time()
-    while (time.time() - t0) * 1000 < duration_ms:
-        time.sleep(0.002)
+# ========== Control Loop ==========
+# 唯一访问 udp/cmd/state 的线程：动作只发布设定点，由它以 500 Hz 发送
+CONTROL_RATE = 500  # Hz
+
+Setpoint = namedtuple('Setpoint', 'mode gaitType bodyHeight euler velocity yawSpeed',
+                      defaults=(0, 0, 0.0, (0.0, 0.0, 0.0), (0.0, 0.0), 0.0))
+# 各模式的命令模板，动作在其上 _replace() 需要的字段
+IDLE = Setpoint()
+STAND = Setpoint(mode=1)               # forced stand, zero velocity
+WALK = Setpoint(mode=2, gaitType=1)    # continuous walk, trot gait
+
+_written = IDLE  # 与 cmd 当前内容一致的设定点，只由控制线程修改
+
+def _write_full(sp):
+    """Rewrite every HighCmd field (after a backend switch, and as the benchmark baseline)."""
+    global _written
+    _init_cmd_fields()
+    cmd.mode = sp.mode
+    cmd.gaitType = sp.gaitType
+    cmd.bodyHeight = sp.bodyHeight
+    cmd.euler = list(sp.euler)
+    cmd.velocity = list(sp.velocity)
+    cmd.yawSpeed = sp.yawSpeed
+    _written = sp
+
+def _write_changed(sp):
+    """Write only the fields of ``sp`` that differ from what cmd already holds.
+
+    Setpoints are immutable and reused, so a held setpoint costs one
+    identity check; changed euler/velocity tuples are passed as-is (the SDK
+    converts any sequence), no per-tick lists are built.
+    """
+    global _written
+    last = _written
+    if sp is last:
+        return
+    if sp.mode != last.mode:
+        cmd.mode = sp.mode
+    if sp.gaitType != last.gaitType:
+        cmd.gaitType = sp.gaitType
+    if sp.bodyHeight != last.bodyHeight:
+        cmd.bodyHeight = sp.bodyHeight
+    if sp.euler != last.euler:
+        cmd.euler = sp.euler
+    if sp.velocity != last.velocity:
+        cmd.velocity = sp.velocity
+    if sp.yawSpeed != last.yawSpeed:
+        cmd.yawSpeed = sp.yawSpeed
+    _written = sp
+
+class ControlLoop:
+    """Deadline-scheduled 500 Hz loop that owns the SDK objects.
+
+    Deadlines are absolute (``start + k * period``) so sleep overshoot never
+    accumulates into drift; a tick that wakes more than one period late skips
+    the missed slots instead of bursting to catch up. Each tick does
+    Recv/GetRecv, writes the current ``Setpoint`` into ``cmd`` and sends it.
+
+    ``play()`` hands the loop a compiled choreography instead: each tick sends
+    the next precomputed row, and the last row stays as the setpoint.
+
+    On a virtual clock no thread runs: ``run_for()`` steps the ticks in the
+    caller's thread, so simulations stay deterministic.
+    """
+
+    def __init__(self, rate=CONTROL_RATE, history=5000):
+        self.period = 1.0 / rate
+        self.setpoint = IDLE
+        self._program = None  # 正在播放的 CompiledChoreography
+        self._stream = None   # 正在使用的 VelocityStream
+        self._frame = 0
+        self._lock = threading.Lock()
+        self._goal = None  # 当前等待的 Convergence
+        self.ticks = 0
+        self.missed = 0
+        self.errors = 0
+        self.jitter = deque(maxlen=history)  # 秒，实际唤醒时间 - 截止时间
+        self._started = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def publish(self, setpoint):
+        """Replace the setpoint sent from the next tick on (ends any playback or stream)."""
+        with self._lock:
+            self._program = None
+            self._stream = None
+            self.setpoint = setpoint  # 整体替换，控制线程每拍只读一次
+        self._arm()
+
+    def play(self, program):
+        """Start playing a CompiledChoreography from the next tick on."""
+        with self._lock:
+            self._frame = 0
+            self._program = program
+            self._stream = None
+        self._arm()
+
+    def stream(self, source):
+        """Take the setpoint from ``source.next_setpoint(now)`` every tick."""
+        with self._lock:
+            self._program = None
+            self._stream = source
+
+    @property
+    def streaming(self):
+        return self._stream is not None
+
+    def halt(self):
+        """Freeze playback at the last sent pose with zero velocity."""
+        self.publish(_written._replace(mode=1, gaitType=0, velocity=(0.0, 0.0), yawSpeed=0.0))
+
+    def _arm(self):
+        global _first_send_origin, _publish_origin
+        origin = _first_send_origin
+        if origin is not None:
+            _first_send_origin = None
+            _publish_origin = origin
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='control-loop', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join()
+        self._thread = None
+
+    def run_for(self, seconds):
+        """Step the loop for ``seconds`` of virtual time (cancellable per tick)."""
+        ticks = max(1, int(round(seconds / self.period))) if seconds > 0 else 0
+        for _ in range(ticks):
+            executor.check_cancelled()
+            clock.sleep(self.period)
+            self.tick()
+
+    def tick(self):
         udp.Recv()
         udp.GetRecv(state)
+        now = clock.time()
+        goal = self._goal
+        if goal is not None:
+            goal.update(state, now)
+
+        sp = self._next_row()
+        if sp is None:
+            stream = self._stream
+            sp = self.setpoint if stream is None else stream.next_setpoint(now)
+        _write_changed(sp)
+
+        _transmit()
+        telemetry_ring.record(state, now)  # 发送之后再记录，不推迟命令
+        self.ticks += 1
+
+    def wait_for(self, goal, timeout):
+        """Block the calling action until ``goal`` is met or ``timeout`` s pass.
+
+        Returns the time from the call until the state entered tolerance for
+        good, or None on timeout. Cancellable like executor.sleep().
+        """
+        start = clock.time()
+        self._goal = goal
+        try:
+            while not goal.done:
+                remaining = start + timeout - clock.time()
+                if remaining <= 0:
+                    return None
+                executor.sleep(min(self.period, remaining))
+        finally:
+            self._goal = None
+        return max(goal.entered_at - start, 0.0)
+
+    def _next_row(self):
+        """Next row of the playing program, or None when nothing is playing."""
+        # 节目和帧号一起在锁内读写：播放中途 play()/publish() 切换节目时不会用旧帧号索引新节目
+        with self._lock:
+            program = self._program
+            if program is None:
+                return None
+            sp = program.setpoints[self._frame]
+            self._frame += 1
+            if self._frame >= len(program):
+                self._program = None
+                self.setpoint = sp
+            return sp
+
+    def stats(self):
+        """Tick count, missed deadlines and wake-up jitter of the real-time loop."""
+        jitter = sorted(self.jitter)
+        elapsed = clock.time() - self._started if self._started is not None else 0.0
+        result = {
+            'ticks': self.ticks,
+            'missed': self.missed,
+            'errors': self.errors,
+            'rate_hz': (self.ticks + self.missed) / elapsed if elapsed > 0 else 0.0,
+        }
+        if jitter:
+            result.update(jitter_mean_ms=sum(jitter) / len(jitter) * 1000,
+                          jitter_p99_ms=jitter[min(len(jitter) - 1, int(0.99 * len(jitter)))] * 1000,
+                          jitter_max_ms=jitter[-1] * 1000)
+        return result
+
+    def _run(self):
+        period = self.period
+        self._started = clock.time()
+        deadline = self._started + period
+        while not self._stop.is_set():
+            delay = deadline - clock.time()
+            if delay > 0:
+                clock.sleep(delay)
+            lateness = clock.time() - deadline
+            self.jitter.append(lateness)
+            metrics.CONTROL_JITTER.observe(max(lateness, 0.0))
+            if lateness >= period:
+                missed = int(lateness / period)  # 跳过错过的周期，不补发
+                self.missed += missed
+                metrics.CONTROL_MISSED_DEADLINES.inc(amount=missed)
+                deadline += missed * period
+            deadline += period
 
-        _init_cmd_fields()
-        cmd.mode = 1               # forced stand
-        cmd.bodyHeight = height
+            try:
+                self.tick()
+            except Exception as e:
+                self.errors += 1
+                if self.errors == 1 or self.errors % 500 == 0:
+                    print(f"[Error] Control loop tick failed ({self.errors}): {e}")
+
+telemetry_ring = telemetry.TelemetryRing()
+
+def enable_telemetry(path=None, capacity=telemetry.DEFAULT_CAPACITY):
+    """Record HighState into a new ring, memory-mapped to ``path`` if given."""
+    global telemetry_ring
+    old, telemetry_ring = telemetry_ring, telemetry.TelemetryRing(capacity, path)
+    old.close()
+    return telemetry_ring
+
+control = ControlLoop()
+REACTIONS = choreography.compile_reactions(CONTROL_RATE, row_factory=Setpoint)
+_write_full(IDLE)
+if not clock.virtual:
+    control.start()
+
+# ========== Convergence ==========
+# 姿态命令在 HighState 连续 CONVERGE_TICKS 拍进入容差后完成，duration_ms 只作为超时
+CONVERGE_TICKS = 25          # 50 ms
+HEIGHT_TOLERANCE = 0.01      # m
+EULER_TOLERANCE = 0.03       # rad
+VELOCITY_TOLERANCE = 0.05    # m/s
+
+class Convergence:
+    """A HighState predicate that must hold for ``ticks`` consecutive ticks."""
+
+    def __init__(self, predicate, ticks=CONVERGE_TICKS):
+        self.predicate = predicate
+        self.ticks = ticks
+        self.count = 0
+        self.entered_at = None  # 最后一次进入容差的时间
+        self.done = False
+
+    def update(self, state, now):
+        if not self.predicate(state):
+            self.count = 0
+            return
+        if self.count == 0:
+            self.entered_at = now
+        self.count += 1
+        if self.count >= self.ticks:
+            self.done = True
+
+def pose_reached(sp):
+    """Predicate: body height, roll and pitch at ``sp`` and standing still.
+
+    HighState.bodyHeight is absolute while the command is an offset from the
+    nominal standing height; yaw is not checked (the IMU yaw is the heading).
+    """
+    height = robot_backend.NOMINAL_BODY_HEIGHT + sp.bodyHeight
+    roll, pitch = sp.euler[0], sp.euler[1]
+
+    def reached(s):
+        rpy = s.imu.rpy
+        return (abs(s.bodyHeight - height) <= HEIGHT_TOLERANCE
+                and abs(rpy[0] - roll) <= EULER_TOLERANCE
+                and abs(rpy[1] - pitch) <= EULER_TOLERANCE
+                and abs(s.velocity[0]) <= VELOCITY_TOLERANCE
+                and abs(s.velocity[1]) <= VELOCITY_TOLERANCE)
+    return reached
+
+convergence_times = {}  # 动作名 -> 最近的收敛时间（秒，None 表示超时）
+
+def wait_converged(sp, timeout):
+    """Wait until the robot settles at stand setpoint ``sp``; returns seconds or None."""
+    name = executor.current_action() or 'direct'
+    seconds = control.wait_for(Convergence(pose_reached(sp)), timeout)
+    convergence_times.setdefault(name, deque(maxlen=100)).append(seconds)
+    if seconds is None:
+        metrics.CONVERGENCE_TIMEOUTS.inc(name)
+        print(f"[Warning] '{name}' did not converge within {timeout:.1f}s")
+    else:
+        metrics.ACTION_CONVERGENCE.observe(seconds, name)
+    return seconds
+
+def convergence_stats():
+    """Per action: converged count, mean/max time to converge, timeouts."""
+    result = {}
+    for name, times in convergence_times.items():
+        done = [t for t in times if t is not None]
+        result[name] = {
+            'converged': len(done),
+            'timeouts': len(times) - len(done),
+            'mean_ms': sum(done) / len(done) * 1000 if done else 0.0,
+            'max_ms': max(done) * 1000 if done else 0.0,
+        }
+    return result
+
+# ========== Velocity Streaming ==========
+# 客户端以摄像头帧率发送 vx/vy/yaw；只保留最新值，限幅和加速度限制在这里统一执行
+STREAM_LIMITS = (max_speed, 0.3, 1.0)  # |vx| m/s, |vy| m/s, |yaw| rad/s
+STREAM_ACCEL = (1.0, 1.0, 2.0)         # m/s², m/s², rad/s²
+STREAM_MAX_AGE = 0.25                  # 秒，采集时间更早的设定点直接丢弃
+STREAM_TIMEOUT = 0.3                   # 秒，没有新设定点时减速到 0
+
+class VelocityStream:
+    """Latest-value-wins analog velocity channel.
+
+    ``update()`` (server threads) overwrites a single slot: a setpoint that
+    replaces one the loop never used counts as coalesced, and setpoints older
+    than the newest accepted one or than STREAM_MAX_AGE are dropped, never
+    queued. ``next_setpoint()`` (control loop) moves the command toward the
+    newest target by at most STREAM_ACCEL per second and brakes to zero if
+    no setpoint arrives for STREAM_TIMEOUT.
+    """
+
+    def __init__(self, period):
+        self.period = period
+        self.counts = {'accepted': 0, 'coalesced': 0, 'stale': 0}
+        self._lock = threading.Lock()
+        self._target = (0.0, 0.0, 0.0)
+        self._stamp = None    # 最新被接受设定点的采集时间 (time.time())
+        self._updated = None  # 最新被接受设定点的到达时间 (clock)
+        self._fresh = False   # 控制循环还没用过最新设定点
+        self._command = (0.0, 0.0, 0.0)
+        self._setpoint = STAND
+
+    def engage(self, current):
+        """Start ramping from the velocity currently commanded by ``current``."""
+        if current.mode == 2:
+            self._command = (current.velocity[0], current.velocity[1], current.yawSpeed)
+            self._setpoint = current
+        else:
+            self._command = (0.0, 0.0, 0.0)
+            self._setpoint = STAND
+
+    def update(self, vx, vy, yaw_speed, stamp=None):
+        """Offer a setpoint; returns 'accepted', 'coalesced' or 'stale'."""
+        now = time.time()
+        if stamp is None:
+            stamp = now
+        with self._lock:
+            if (self._stamp is not None and stamp <= self._stamp) or now - stamp > STREAM_MAX_AGE:
+                self.counts['stale'] += 1
+                return 'stale'
+            result = 'coalesced' if self._fresh else 'accepted'
+            self.counts[result] += 1
+            self._target = (max(-STREAM_LIMITS[0], min(STREAM_LIMITS[0], vx)),
+                            max(-STREAM_LIMITS[1], min(STREAM_LIMITS[1], vy)),
+                            max(-STREAM_LIMITS[2], min(STREAM_LIMITS[2], yaw_speed)))
+            self._stamp = stamp
+            self._updated = clock.time()
+            self._fresh = True
+            return result
+
+    def next_setpoint(self, now):
+        self._fresh = False
+        target = self._target
+        if self._updated is None or now - self._updated > STREAM_TIMEOUT:
+            target = (0.0, 0.0, 0.0)  # 发送端停了：减速停下
+        command = self._command
+        if target == command:
+            return self._setpoint
+        limited = []
+        for current, goal, accel in zip(command, target, STREAM_ACCEL):
+            step = accel * self.period
+            limited.append(goal if abs(goal - current) <= step else current + math.copysign(step, goal - current))
+        vx, vy, yaw_speed = self._command = tuple(limited)
+        if vx or vy or yaw_speed:
+            self._setpoint = WALK._replace(velocity=(vx, vy), yawSpeed=yaw_speed)
+        else:
+            self._setpoint = STAND
+        return self._setpoint
+
+velocity_stream = VelocityStream(control.period)
+
+def stream_velocity(vx, vy, yaw_speed, stamp=None):
+    """Analog velocity setpoint from a client; engages streaming when no action runs.
+
+    ``stamp`` is the time.time() capture time used to drop stale setpoints.
+    Returns the outcome: 'accepted', 'coalesced', 'stale' or 'busy'.
+    """
+    global is_moving, movement_direction
+    if executor.is_busy():
+        result = 'busy'
+    else:
+        result = velocity_stream.update(vx, vy, yaw_speed, stamp)
+        if result != 'stale' and not control.streaming:
+            is_moving = False
+            movement_direction = 0
+            velocity_stream.engage(_written)
+            control.stream(velocity_stream)
+            print("[Action] Velocity streaming engaged")
+    metrics.VELOCITY_SETPOINTS.inc(result)
+    return result
+
+# ========== Setpoint Helpers ==========
 
-        udp.SetSend(cmd)
-        udp.Send()
+def send_body_height(height, duration_ms=1000):
+    """Command a body height; returns once HighState reaches it (``duration_ms`` is the timeout)."""
+    sp = STAND._replace(bodyHeight=height)
+    control.publish(sp)
+    return wait_converged(sp, duration_ms / 1000)
 
 def send_euler(roll=0.0, pitch=0.0, yaw=0.0, duration_ms=500):
-    """Send body orientation (euler angles) command to robot."""
-    t0 = time.time()
-    while (time.time() - t0) * 1000 < duration_ms:
-        time.sleep(0.002)
-        udp.Recv()
-        udp.GetRecv(state)
-
-        _init_cmd_fields()
-        cmd.mode = 1               # forced stand
-        cmd.euler = [roll, pitch, yaw]
-
-        udp.SetSend(cmd)
-        udp.Send()
+    """Command a body orientation; returns once HighState reaches it (``duration_ms`` is the timeout)."""
+    sp = STAND._replace(euler=(roll, pitch, yaw))
+    control.publish(sp)
+    return wait_converged(sp, duration_ms / 1000)
 
 def send_movement(vx=0.0, vy=0.0, vyaw=0.0, duration_ms=1000):
-    """Send movement command to robot."""
-    t0 = time.time()
-    while (time.time() - t0) * 1000 < duration_ms:
-        time.sleep(0.002)
-        udp.Recv()
-        udp.GetRecv(state)
-
-        _init_cmd_fields()
-        cmd.mode = 2               # continuous walk
-        cmd.gaitType = 1           # trot gait
-        cmd.velocity = [vx, vy]
-        cmd.yawSpeed = vyaw
-
-        udp.SetSend(cmd)
-        udp.Send()
+    """Walk (trot) at the given velocity for ``duration_ms``, then stand still."""
+    control.publish(WALK._replace(velocity=(vx, vy), yawSpeed=vyaw))
+    executor.sleep(duration_ms / 1000)
+    control.publish(STAND)
 
 def send_stop(duration_ms=500):
-    """Send stop command to robot (forced stand, zero velocity)."""
-    t0 = time.time()
-    while (time.time() - t0) * 1000 < duration_ms:
-        time.sleep(0.002)
-        udp.Recv()
-        udp.GetRecv(state)
-
-        _init_cmd_fields()
-        cmd.mode = 1               # forced stand
-
-        udp.SetSend(cmd)
-        udp.Send()
+    """Stop the robot (forced stand, zero velocity); returns once it has stopped or on timeout."""
+    control.publish(STAND)
+    return wait_converged(STAND, duration_ms / 1000)
 
 def reset_pose(duration_ms=1000):
     """Reset robot pose to neutral (body height=0, euler=0)."""
@@ -112,62 +669,44 @@ def reset_pose(duration_ms=1000):
     send_euler(0.0, 0.0, 0.0, duration_ms)
     print("[Action] Reset completed.")
 
-def continuous_movement_loop():
-    """连续运动循环 - 在独立线程中运行"""
-    global is_moving, movement_direction, current_speed, stop_movement
-    
-    while not stop_movement:
-        if is_moving and movement_direction != 0:
-            try:
-                time.sleep(0.002)
-                udp.Recv()
-                udp.GetRecv(state)
-
-                _init_cmd_fields()
-                cmd.mode = 2               # continuous walk
-                cmd.gaitType = 1           # trot gait
-                cmd.velocity = [current_speed * movement_direction, 0]
+def play_choreography(name):
+    """Play a precompiled reaction on the control loop until it ends (cancellable)."""
+    stop_continuous_movement()
+    program = REACTIONS[name]
+    control.play(program)
+    try:
+        executor.sleep(program.settle_time)
+        # 最后一个关键帧之后只是保持姿态：收敛即完成，剩余时长作为超时
+        wait_converged(program.setpoints[-1], program.duration - program.settle_time)
+    except ActionCancelled:
+        control.halt()  # 被抢占：停在当前姿态，不再继续播放
+        raise
 
-                udp.SetSend(cmd)
-                udp.Send()
-            except Exception as e:
-                print(f"[Error] Movement loop error: {e}")
-                break
-        else:
-            time.sleep(0.01)  # 短暂等待，避免占用过多CPU
+def _publish_movement():
+    control.publish(WALK._replace(velocity=(current_speed * movement_direction, 0.0)))
 
 def start_continuous_movement(direction):
-    """开始连续运动"""
-    global is_moving, movement_direction, movement_thread, stop_movement
+    """开始连续运动（控制循环持续发送，直到发布新的设定点）"""
+    global is_moving, movement_direction
     
-    with lock:
-        if is_busy:
-            print("[Warning] Robot is busy. Cannot start movement.")
-            return
-        
-        # 停止之前的运动
-        stop_continuous_movement()
-        
-        is_moving = True
-        movement_direction = direction
-        stop_movement = False
-        
-        # 启动运动线程
-        movement_thread = threading.Thread(target=continuous_movement_loop, daemon=True)
-        movement_thread.start()
-        
-        direction_text = "forward" if direction == 1 else "backward"
-        print(f"[Action] Starting continuous {direction_text} movement at speed {current_speed}")
+    # 停止之前的运动
+    stop_continuous_movement()
+    
+    is_moving = True
+    movement_direction = direction
+    _publish_movement()
+    
+    direction_text = "forward" if direction == 1 else "backward"
+    print(f"[Action] Starting continuous {direction_text} movement at speed {current_speed}")
 
 def stop_continuous_movement():
-    """停止连续运动"""
-    global is_moving, movement_direction, stop_movement
+    """停止连续运动（包括模拟量速度流）"""
+    global is_moving, movement_direction
     
-    if is_moving:
+    if is_moving or control.streaming:
         print("[Action] Stopping continuous movement...")
         is_moving = False
         movement_direction = 0
-        stop_movement = True
         
         # 发送停止命令
         send_stop(200)
@@ -175,55 +714,39 @@ def stop_continuous_movement():
 
 # ========== Original API Functions ==========
 
+@action(PRIORITY_MOTION)
 def stand():
     """Command the robot to stand."""
-    global is_busy
-    with lock:
-        if is_busy:
-            print("[Warning] Robot is busy. Ignoring 'stand' command.")
-            return
-        is_busy = True
-
-    try:
-        # 先停止任何连续运动
-        stop_continuous_movement()
-        
-        print("[Action] Robot dog is standing...")
-        send_body_height(0.15, duration_ms=2000)
-        print("[Action] Standing completed.")
-        reset_pose(1000)
-    finally:
-        is_busy = False
+    # 先停止任何连续运动
+    stop_continuous_movement()
+    
+    print("[Action] Robot dog is standing...")
+    send_body_height(0.15, duration_ms=2000)
+    print("[Action] Standing completed.")
+    reset_pose(1000)
 
+@action(PRIORITY_MOTION)
 def sit():
     """Command the robot to sit."""
-    global is_busy
-    with lock:
-        if is_busy:
-            print("[Warning] Robot is busy. Ignoring 'sit' command.")
-            return
-        is_busy = True
-
-    try:
-        # 先停止任何连续运动
-        stop_continuous_movement()
-        
-        print("[Action] Robot dog is sitting...")
-        send_body_height(-0.2, duration_ms=2000)
-        print("[Action] Sitting completed.")
-        reset_pose(1000)
-    finally:
-        is_busy = False
+    # 先停止任何连续运动
+    stop_continuous_movement()
+    
+    print("[Action] Robot dog is sitting...")
+    send_body_height(-0.2, duration_ms=2000)
+    print("[Action] Sitting completed.")
+    reset_pose(1000)
 
+@action(PRIORITY_MOTION)
 def move_forward():
     """开始连续前进"""
     start_continuous_movement(1)
 
+@action(PRIORITY_MOTION)
 def move_backward():
     """开始连续后退"""
     start_continuous_movement(-1)
 
-def speed_up():
+def speed_up(origin=None):
     """Increase robot movement speed."""
     global current_speed
     old_speed = current_speed
@@ -232,10 +755,11 @@ def speed_up():
     
     # 如果正在运动，速度变化会立即生效
     if is_moving:
+        _publish_movement()
         direction_text = "forward" if movement_direction == 1 else "backward"
         print(f"[Action] Now moving {direction_text} at new speed {current_speed}")
 
-def speed_down():
+def speed_down(origin=None):
     """Decrease robot movement speed."""
     global current_speed
     old_speed = current_speed
@@ -244,192 +768,73 @@ def speed_down():
     
     # 如果正在运动，速度变化会立即生效
     if is_moving:
+        _publish_movement()
         direction_text = "forward" if movement_direction == 1 else "backward"
         print(f"[Action] Now moving {direction_text} at new speed {current_speed}")
 
+@action(PRIORITY_STOP)
 def stop():
-    """Command the robot to stop movement and stand."""
-    global is_busy
-    
+    """Command the robot to stop movement and stand (preempts any running action)."""
     print("[Action] Robot dog is stopping...")
     stop_continuous_movement()
-    
-    with lock:
-        is_busy = False  # 允许立即中断任何动作
-    
     print("[Action] Stop completed.")
 
+def safety_stop(origin=None):
+    """Dead-man stop: publish STAND at once, then preempt whatever action is running.
+
+    Called from the server's heartbeat watchdog, so it never waits for the
+    executor; the next control tick already sends the stand setpoint.
+    """
+    global is_moving, movement_direction
+    is_moving = False
+    movement_direction = 0
+    control.publish(STAND)  # 同时结束速度流和正在播放的编排
+    stop(origin=origin)
+
 def unknown():
     """Handle unknown command."""
     print("[Warning] Received unknown gesture. No action taken.")
 
 # ========== New Emotion Response Functions ==========
 
+@action(PRIORITY_EMOTION)
 def angry_reaction():
     """生气反应：后退两步然后坐下"""
-    global is_busy
-    with lock:
-        if is_busy:
-            print("[Warning] Robot is busy. Ignoring 'angry_reaction' command.")
-            return
-        is_busy = True
-
-    try:
-        print("[Emotion] Angry reaction: backing away and sitting...")
-        
-        # 停止任何连续运动
-        stop_continuous_movement()
-        
-        # 后退两步
-        send_movement(vx=-0.3, duration_ms=2000)  # 后退2秒
-        time.sleep(0.5)  # 短暂停顿
-        
-        # 坐下
-        send_body_height(-0.2, duration_ms=2000)
-        print("[Emotion] Angry reaction completed.")
-        
-    finally:
-        is_busy = False
+    print("[Emotion] Angry reaction: backing away and sitting...")
+    play_choreography('angry_reaction')
+    print("[Emotion] Angry reaction completed.")
 
+@action(PRIORITY_EMOTION)
 def sad_reaction():
     """悲伤反应：靠近两步然后坐下"""
-    global is_busy
-    with lock:
-        if is_busy:
-            print("[Warning] Robot is busy. Ignoring 'sad_reaction' command.")
-            return
-        is_busy = True
-
-    try:
-        print("[Emotion] Sad reaction: approaching and sitting...")
-        
-        # 停止任何连续运动
-        stop_continuous_movement()
-        
-        # 靠近两步
-        send_movement(vx=0.2, duration_ms=2000)  # 前进2秒
-        time.sleep(0.5)  # 短暂停顿
-        
-        # 坐下
-        send_body_height(-0.2, duration_ms=2000)
-        print("[Emotion] Sad reaction completed.")
-        
-    finally:
-        is_busy = False
+    print("[Emotion] Sad reaction: approaching and sitting...")
+    play_choreography('sad_reaction')
+    print("[Emotion] Sad reaction completed.")
 
+@action(PRIORITY_EMOTION)
 def happy_reaction():
     """高兴反应：左右摇摆身体"""
-    global is_busy
-    with lock:
-        if is_busy:
-            print("[Warning] Robot is busy. Ignoring 'happy_reaction' command.")
-            return
-        is_busy = True
-
-    try:
-        print("[Emotion] Happy reaction: body swaying...")
-        
-        # 停止任何连续运动
-        stop_continuous_movement()
-        
-        # 确保站立状态
-        send_body_height(0.0, duration_ms=500)
-        
-        # 左右摇摆身体（通过roll角度）
-        sway_cycles = 3  # 摇摆3次
-        sway_angle = 0.35  # 摇摆角度（弧度）
-        
-        for i in range(sway_cycles):
-            # 向左摇摆
-            send_euler(roll=sway_angle, duration_ms=800)
-            time.sleep(0.2)
-            
-            # 向右摇摆
-            send_euler(roll=-sway_angle, duration_ms=800)
-            time.sleep(0.2)
-        
-        # 回到中性位置
-        send_euler(roll=0.0, duration_ms=500)
-        print("[Emotion] Happy reaction completed.")
-        
-    finally:
-        is_busy = False
+    print("[Emotion] Happy reaction: body swaying...")
+    play_choreography('happy_reaction')
+    print("[Emotion] Happy reaction completed.")
 
+@action(PRIORITY_EMOTION)
 def fear_reaction():
     """害怕反应：快速后退并蹲低"""
-    global is_busy
-    with lock:
-        if is_busy:
-            print("[Warning] Robot is busy. Ignoring 'fear_reaction' command.")
-            return
-        is_busy = True
-
-    try:
-        print("[Emotion] Fear reaction: retreating and crouching...")
-        
-        # 停止任何连续运动
-        stop_continuous_movement()
-        
-        # 快速后退
-        send_movement(vx=-0.4, duration_ms=1500)  # 快速后退1.5秒
-        time.sleep(0.3)
-        
-        # 蹲得很低
-        send_body_height(-0.25, duration_ms=1500)
-        print("[Emotion] Fear reaction completed.")
-        
-    finally:
-        is_busy = False
+    print("[Emotion] Fear reaction: retreating and crouching...")
+    play_choreography('fear_reaction')
+    print("[Emotion] Fear reaction completed.")
 
+@action(PRIORITY_EMOTION)
 def surprise_reaction():
     """惊讶反应：快速站立"""
-    global is_busy
-    with lock:
-        if is_busy:
-            print("[Warning] Robot is busy. Ignoring 'surprise_reaction' command.")
-            return
-        is_busy = True
-
-    try:
-        print("[Emotion] Surprise reaction: quick standing...")
-        
-        # 停止任何连续运动
-        stop_continuous_movement()
-        
-        # 快速站立到较高位置
-        send_body_height(0.2, duration_ms=1000)  # 快速站高
-        time.sleep(0.5)
-        
-        # 回到正常高度
-        send_body_height(0.0, duration_ms=1000)
-        print("[Emotion] Surprise reaction completed.")
-        
-    finally:
-        is_busy = False
+    print("[Emotion] Surprise reaction: quick standing...")
+    play_choreography('surprise_reaction')
+    print("[Emotion] Surprise reaction completed.")
 
+@action(PRIORITY_EMOTION)
 def disgust_reaction():
     """厌恶反应：转身避开"""
-    global is_busy
-    with lock:
-        if is_busy:
-            print("[Warning] Robot is busy. Ignoring 'disgust_reaction' command.")
-            return
-        is_busy = True
-
-    try:
-        print("[Emotion] Disgust reaction: turning away...")
-        
-        # 停止任何连续运动
-        stop_continuous_movement()
-        
-        # 转身（yaw旋转）
-        send_movement(vyaw=1.0, duration_ms=2000)  # 转身2秒
-        time.sleep(0.5)
-        
-        # 稍微后退
-        send_movement(vx=-0.2, duration_ms=1000)
-        print("[Emotion] Disgust reaction completed.")
-        
-    finally:
-        is_busy = False
-        
\ No newline at end of file
+    print("[Emotion] Disgust reaction: turning away...")
+    play_choreography('disgust_reaction')
+    print("[Emotion] Disgust reaction completed.")
@@ -1,25 +1,41 @@
 import cv2
 import mediapipe as mp
+import os
 import socket
 import time
+from collections import namedtuple
+
+from face_gestures import CHIN, FACE_GESTURES, FACE_LANDMARKS, NOSE_TIP, CooldownGate, NodShakeDetector
+from frame_bus import open_camera
+from gesture_protocol import GestureSender, SOURCE_FACE
+from landmark_sequences import NONE_LABEL, LandmarkRecorder, parse_label, read_labels
+from vision_pipeline import StaticOverlay, VisionPipeline
 
 HOST = '127.0.0.1'
 PORT = 8888
+USE_BINARY_PROTOCOL = True  # False: 发送换行分隔的文本手势
+RENDER_FPS = 30  # 显示刷新上限，与推理频率无关
+# 无显示器部署：不绘制、不调用 imshow/waitKey（GESTURE_HEADLESS=1，Ctrl+C 退出）
+HEADLESS = os.environ.get('GESTURE_HEADLESS', '0') not in ('', '0')
+# 录制模式：GESTURE_RECORD=文件.npz，按 1-3 选择标签开始录制，0 暂停；用 gesture_eval.py 离线评估
+RECORD_PATH = os.environ.get('GESTURE_RECORD')
+RECORD_LABELS = list(FACE_GESTURES) + [NONE_LABEL]
 
 sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 sock.connect((HOST, PORT))
 print("[Face Client] Connected to server.")
+sender = GestureSender(sock, SOURCE_FACE, binary=USE_BINARY_PROTOCOL)
 
 mp_face = mp.solutions.face_mesh
 face_mesh = mp_face.FaceMesh(static_image_mode=False, max_num_faces=1, refine_landmarks=True)
 mp_drawing = mp.solutions.drawing_utils
 
-cap = cv2.VideoCapture(0)
-last_nose_y = None
-last_jaw_x = None
-last_sent = None
-gesture_cooldown = 1.0  # 减少冷却时间
-last_time_sent = time.time()
+cap = open_camera(0)  # 优先连接共享帧总线（frame_bus.py），否则直接打开摄像头
+detector = NodShakeDetector()  # 点头/摇头检测（face_gestures.py）
+gate = CooldownGate(1.0, time.time())  # 减少冷却时间
+recorder = LandmarkRecorder(RECORD_PATH, 'face', FACE_LANDMARKS) if RECORD_PATH else None
+# 当前录制的标签，None 表示暂停；无显示器时由 GESTURE_RECORD_LABEL（编号或名称）给出初始值，之后从标准输入切换
+record_label = parse_label(os.environ.get('GESTURE_RECORD_LABEL', '0'), RECORD_LABELS) if recorder else None
 
 # 用于显示效果的变量
 displayed_gesture = None
@@ -27,35 +43,8 @@ display_start_time = None
 display_duration = 2.0  # 显示持续时间（秒）
 debug_mode = False
 
-# 改进的手势检测参数
-nose_threshold = 0.015  # 降低阈值，提高敏感度
-jaw_threshold = 0.02
-history_length = 5  # 保存历史数据用于更稳定的检测
-
-# 历史数据
-nose_history = []
-jaw_history = []
-
-def smooth_detection(current_value, history, threshold, gesture_type):
-    """使用历史数据进行平滑检测"""
-    history.append(current_value)
-    if len(history) > history_length:
-        history.pop(0)
-    
-    if len(history) < 3:
-        return False
-    
-    if gesture_type == 'yes':
-        # 检测连续的向下运动（点头）
-        recent_changes = [history[i] - history[i-1] for i in range(1, len(history))]
-        positive_changes = [change for change in recent_changes if change > threshold]
-        return len(positive_changes) >= 2  # 至少2次连续向下运动
-    
-    elif gesture_type == 'no':
-        # 检测左右摆动（摇头）
-        recent_changes = [abs(history[i] - history[i-1]) for i in range(1, len(history))]
-        large_changes = [change for change in recent_changes if change > threshold]
-        return len(large_changes) >= 2  # 至少2次大幅度左右运动
+# 推理阶段交给渲染阶段的快照
+FaceView = namedtuple('FaceView', 'frame gesture')
 
 # 修改手势到命令的映射
 def map_gesture_to_command(gesture):
@@ -66,131 +55,173 @@ def map_gesture_to_command(gesture):
     }
     return gesture_map.get(gesture)
 
-while cap.isOpened():
-    success, frame = cap.read()
-    if not success:
-        break
-    
-    frame = cv2.flip(frame, 1)
+def process_frame(frame, capture_time):
+    """推理阶段：FaceMesh + 点头/摇头检测 + 发送，返回交给渲染阶段的快照"""
+    global displayed_gesture, display_start_time
+
+    # 帧已在采集端镜像；来自共享内存的帧是只读视图，绘制前由渲染阶段复制
     rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
     result = face_mesh.process(rgb)
     
     gesture = None
     current_time = time.time()
+    lm = result.multi_face_landmarks[0].landmark if result.multi_face_landmarks else None
     
-    if result.multi_face_landmarks:
-        lm = result.multi_face_landmarks[0].landmark
-        nose_y = lm[1].y  # 鼻尖
-        jaw_x = lm[152].x  # 下巴
+    if lm:
+        nose_y = lm[NOSE_TIP].y  # 鼻尖
+        jaw_x = lm[CHIN].x  # 下巴
         
         # 使用改进的检测方法
-        if smooth_detection(nose_y, nose_history, nose_threshold, 'yes'):
-            gesture = 'yes'
-        elif smooth_detection(jaw_x, jaw_history, jaw_threshold, 'no'):
-            gesture = 'no'
+        gesture = detector.update(nose_y, jaw_x)
         
         # 调试信息
-        if debug_mode and len(nose_history) > 1:
+        if debug_mode and len(detector.nose_history) > 1:
+            nose_history, jaw_history = detector.nose_history, detector.jaw_history
             nose_change = nose_y - nose_history[-2] if len(nose_history) > 1 else 0
             jaw_change = abs(jaw_x - jaw_history[-2]) if len(jaw_history) > 1 else 0
             print(f"Nose change: {nose_change:.4f}, Jaw change: {jaw_change:.4f}")
+
+    if recorder and record_label:
+        points = [(lm[i].x, lm[i].y, lm[i].z) for i in FACE_LANDMARKS] if lm else None
+        recorder.add(capture_time, points, record_label)
     
+    # 每帧调用，按间隔限速；推理线程卡住时心跳随之停止，服务器会让机器人停下
+    sender.heartbeat()
+
     # 发送手势到服务器
-    if gesture and gesture != last_sent and current_time - last_time_sent > gesture_cooldown:
+    if gate.update(gesture, current_time):
         command = map_gesture_to_command(gesture)
         if command:
-            sock.sendall(command.encode())
+            sender.send(command, capture_time)
             print(f"[Face Client] Sent gesture: {gesture} -> {command}")
-            last_sent = gesture
-            last_time_sent = current_time
             
             # 设置显示效果
             displayed_gesture = f"{gesture} -> {command}"
             display_start_time = current_time
-    
-    # 确定当前显示的手势和颜色
-    current_display_gesture = None
-    text_color = (128, 128, 128)  # 默认灰色
-    
-    if displayed_gesture and display_start_time:
-        if current_time - display_start_time < display_duration:
-            # 在显示持续时间内，显示绿色
-            current_display_gesture = displayed_gesture
-            text_color = (0, 255, 0)  # 绿色
-        else:
-            # 超过显示时间，清除显示
-            displayed_gesture = None
-            display_start_time = None
-    
-    # 如果没有显示的手势，显示当前检测状态
-    if not current_display_gesture:
-        current_display_gesture = gesture if gesture else "None"
-        if gesture:
-            text_color = (0, 255, 255)  # 黄色表示检测到但未发送
-        else:
-            text_color = (128, 128, 128)  # 灰色表示无检测
-    
-    # 显示手势信息
-    gesture_text = f"Gesture: {current_display_gesture}"
-    cv2.putText(frame, gesture_text, (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, text_color, 2)
-    
-    # 显示说明文字 - 更新为新的映射
-    instructions = [
-        "Face Gestures:",
-        "Nod (Yes): Move Forward",
-        "Shake head (No): Move Backward",
-        "",
-        "Hand gestures available too:",
-        "Open hand = Forward",
-        "Fist = Backward", 
-        "Thumbs up = Stand",
-        "Thumbs down = Sit",
-        "Point up = Stop",
-        "",
-        "Instructions:",
-        "- Face the camera clearly",
-        "- Make deliberate movements",
-        "- Hold gesture for 1-2 sec",
-        "",
-        "Colors:",
-        "Green = Action sent",
-        "Yellow = Detected",
-        "Gray = No gesture"
-    ]
-    
-    for i, instruction in enumerate(instructions):
-        if instruction == "":  # 空行
-            continue
-        color = (255, 255, 255)
-        if "Green" in instruction:
-            color = (0, 255, 0)
-        elif "Yellow" in instruction:
-            color = (0, 255, 255)
-        elif "Gray" in instruction:
-            color = (128, 128, 128)
-        elif "Nod" in instruction:
-            color = (0, 255, 0)  # 绿色
-        elif "Shake head" in instruction:
-            color = (0, 0, 255)  # 红色
-            
-        cv2.putText(frame, instruction, (400, 50 + i * 22), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
-    
-    # 显示连接状态
-    cv2.putText(frame, "Connected to server", (20, 80), 
-               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
-    
-    # 显示冷却状态
-    time_since_last = current_time - last_time_sent
-    if time_since_last < gesture_cooldown:
-        cooldown_text = f"Cooldown: {gesture_cooldown - time_since_last:.1f}s"
-        cv2.putText(frame, cooldown_text, (20, 110), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1)
-    
-    cv2.imshow("Face Gesture Client", frame)
-    if cv2.waitKey(5) & 0xFF == 27:  # ESC键退出
-        break
 
-cap.release()
-sock.close()
-cv2.destroyAllWindows()
+    return FaceView(frame, gesture)
+
+# 手势说明（静态，只渲染一次）
+INSTRUCTIONS = [
+    "Face Gestures:",
+    "Nod (Yes): Move Forward",
+    "Shake head (No): Move Backward",
+    "",
+    "Hand gestures available too:",
+    "Open hand = Forward",
+    "Fist = Backward",
+    "Thumbs up = Stand",
+    "Thumbs down = Sit",
+    "Point up = Stop",
+    "",
+    "Instructions:",
+    "- Face the camera clearly",
+    "- Make deliberate movements",
+    "- Hold gesture for 1-2 sec",
+    "",
+    "Colors:",
+    "Green = Action sent",
+    "Yellow = Detected",
+    "Gray = No gesture"
+]
+
+def instruction_color(instruction):
+    """说明文字的颜色（只在构建静态叠加层时调用一次）"""
+    color = (255, 255, 255)
+    if "Green" in instruction:
+        color = (0, 255, 0)
+    elif "Yellow" in instruction:
+        color = (0, 255, 255)
+    elif "Gray" in instruction:
+        color = (128, 128, 128)
+    elif "Nod" in instruction:
+        color = (0, 255, 0)  # 绿色
+    elif "Shake head" in instruction:
+        color = (0, 0, 255)  # 红色
+    return color
+
+overlay = StaticOverlay()
+overlay.add_lines([(line, instruction_color(line)) for line in INSTRUCTIONS], (400, 50), 22, 0.4)
+overlay.add_lines([("Connected to server", (0, 255, 0))], (20, 80), scale=0.5)
+
+def render_frame(view):
+    """渲染阶段（主线程）：绘制并显示最新快照；view 为 None 时只处理按键。返回 False 退出"""
+    if view is not None:
+        frame = view.frame if view.frame.flags.writeable else view.frame.copy()
+        current_time = time.time()
+        
+        # 确定当前显示的手势和颜色
+        current_display_gesture = None
+        text_color = (128, 128, 128)  # 默认灰色
+    
+        if displayed_gesture and display_start_time:
+            if current_time - display_start_time < display_duration:
+                # 在显示持续时间内，显示绿色
+                current_display_gesture = displayed_gesture
+                text_color = (0, 255, 0)  # 绿色
+    
+        # 如果没有显示的手势，显示当前检测状态
+        if not current_display_gesture:
+            current_display_gesture = view.gesture if view.gesture else "None"
+            if view.gesture:
+                text_color = (0, 255, 255)  # 黄色表示检测到但未发送
+            else:
+                text_color = (128, 128, 128)  # 灰色表示无检测
+    
+        # 显示手势信息
+        gesture_text = f"Gesture: {current_display_gesture}"
+        cv2.putText(frame, gesture_text, (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, text_color, 2)
+    
+        # 静态说明文字和连接状态：启动时渲染一次，每帧一次掩码拷贝
+        overlay.apply(frame)
+    
+        # 录制状态
+        if recorder:
+            record_text = f"REC {record_label} ({len(recorder.labels)} frames)" if record_label else \
+                "REC paused: " + " ".join(f"{i}={label}" for i, label in enumerate(RECORD_LABELS, 1))
+            cv2.putText(frame, record_text, (20, 140),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255) if record_label else (128, 128, 128), 1)
+    
+        # 显示冷却状态
+        time_since_last = current_time - gate.last_time_sent
+        if time_since_last < gate.cooldown:
+            cooldown_text = f"Cooldown: {gate.cooldown - time_since_last:.1f}s"
+            cv2.putText(frame, cooldown_text, (20, 110), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1)
+    
+        cv2.imshow("Face Gesture Client", frame)
+
+    # 渲染频率由流水线控制，这里只轮询按键
+    key = cv2.waitKey(1) & 0xFF
+    if key == 27:  # ESC键退出
+        return False
+    if recorder and ord('0') <= key <= ord('9'):
+        set_record_label(parse_label(chr(key), RECORD_LABELS))
+    return True
+
+def set_record_label(label):
+    global record_label
+    record_label = label
+    print(f"[Face Client] Recording {record_label}" if record_label else "[Face Client] Recording paused")
+
+# 无显示器录制：没有按键，从标准输入切换标签
+if recorder and HEADLESS:
+    print(f"[Face Client] Recording {record_label or 'paused'}; type a label (" +
+          " ".join(f"{i}={label}" for i, label in enumerate(RECORD_LABELS, 1)) + ", 0 pauses) and Enter")
+    read_labels(RECORD_LABELS, set_record_label)
+
+# 采集、推理、渲染分为三个阶段，阶段之间只保留最新的一项
+pipeline = VisionPipeline(cap, process_frame, None if HEADLESS else render_frame, RENDER_FPS, name='face')
+try:
+    pipeline.run()
+except KeyboardInterrupt:
+    pass
+finally:
+    print(f"[Face Client] {pipeline.summary()}")
+    if recorder:
+        counts = recorder.counts()
+        print(f"[Face Client] Recorded {counts}; {recorder.path} now holds {recorder.save()} frames")
+    cap.release()
+    sock.close()
+    if not HEADLESS:
+        cv2.destroyAllWindows()
@@ -0,0 +1,72 @@
+"""Nod / head-shake detection from two FaceMesh landmarks.
+
+Moved out of face_client.py so the same logic runs live and offline
+(gesture_eval.py); it only needs the nose tip y and chin x per frame.
+"""
+
+NOSE_TIP = 1
+CHIN = 152
+FACE_LANDMARKS = (NOSE_TIP, CHIN)  # 录制时保存的 FaceMesh 关键点
+
+NOSE_THRESHOLD = 0.015  # 降低阈值，提高敏感度
+JAW_THRESHOLD = 0.02
+HISTORY_LENGTH = 5  # 保存历史数据用于更稳定的检测
+FACE_GESTURES = ('yes', 'no')
+
+
+def smooth_detection(current_value, history, threshold, gesture_type, history_length=HISTORY_LENGTH):
+    """使用历史数据进行平滑检测"""
+    history.append(current_value)
+    if len(history) > history_length:
+        history.pop(0)
+
+    if len(history) < 3:
+        return False
+
+    if gesture_type == 'yes':
+        # 检测连续的向下运动（点头）
+        recent_changes = [history[i] - history[i-1] for i in range(1, len(history))]
+        positive_changes = [change for change in recent_changes if change > threshold]
+        return len(positive_changes) >= 2  # 至少2次连续向下运动
+
+    elif gesture_type == 'no':
+        # 检测左右摆动（摇头）
+        recent_changes = [abs(history[i] - history[i-1]) for i in range(1, len(history))]
+        large_changes = [change for change in recent_changes if change > threshold]
+        return len(large_changes) >= 2  # 至少2次大幅度左右运动
+
+
+class NodShakeDetector:
+    """Per-frame nod ('yes') / shake ('no') detection over short histories."""
+
+    def __init__(self, nose_threshold=NOSE_THRESHOLD, jaw_threshold=JAW_THRESHOLD, history_length=HISTORY_LENGTH):
+        self.nose_threshold = nose_threshold
+        self.jaw_threshold = jaw_threshold
+        self.history_length = history_length
+        self.nose_history = []
+        self.jaw_history = []
+
+    def update(self, nose_y, jaw_x):
+        """Feed one frame's nose tip y and chin x; returns 'yes', 'no' or None."""
+        if smooth_detection(nose_y, self.nose_history, self.nose_threshold, 'yes', self.history_length):
+            return 'yes'
+        # 与原逻辑一致：检测到点头的帧不记录下巴位置
+        if smooth_detection(jaw_x, self.jaw_history, self.jaw_threshold, 'no', self.history_length):
+            return 'no'
+        return None
+
+
+class CooldownGate:
+    """The clients' original send rule: a gesture different from the last sent, ``cooldown`` s apart."""
+
+    def __init__(self, cooldown=1.0, now=0.0):
+        self.cooldown = cooldown
+        self.last_sent = None
+        self.last_time_sent = now
+
+    def update(self, gesture, now):
+        if gesture and gesture != self.last_sent and now - self.last_time_sent > self.cooldown:
+            self.last_sent = gesture
+            self.last_time_sent = now
+            return gesture
+        return None
@@ -0,0 +1,269 @@
+"""Shared-memory camera frame bus for the vision clients.
+
+One producer owns the camera, decodes and mirrors each frame once and writes
+it into a ``multiprocessing.shared_memory`` ring. hand_client.py,
+face_client.py (and any other model) attach as readers and get zero-copy
+NumPy views of the newest frame; a slow reader simply skips ahead.
+
+    python frame_bus.py                # terminal 1: camera -> shared memory
+    python hand_client.py              # attaches automatically if the bus exists
+
+Layout (all little-endian, native NumPy dtypes):
+    header  int64[8]   magic, version, slots, height, width, channels, latest seq, producer pid
+    seqs    int64[N]   sequence number stored in each slot (-1 while being written)
+    stamps  float64[N] capture time.time() of each slot
+    frames  uint8[N, H, W, C]
+"""
+
+import argparse
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+BUS_NAME = 'gesture_frames'
+BUS_MAGIC = 0x47465242  # 'GFRB'
+BUS_VERSION = 1
+DEFAULT_SLOTS = 4
+
+H_MAGIC, H_VERSION, H_SLOTS, H_HEIGHT, H_WIDTH, H_CHANNELS, H_LATEST, H_PID = range(8)
+HEADER_BYTES = 64
+
+
+def _layout(buf, slots, height, width, channels):
+    header = np.ndarray((8,), np.int64, buf, 0)
+    seqs = np.ndarray((slots,), np.int64, buf, HEADER_BYTES)
+    stamps = np.ndarray((slots,), np.float64, buf, HEADER_BYTES + 8 * slots)
+    frames_offset = (HEADER_BYTES + 16 * slots + 63) // 64 * 64
+    frames = np.ndarray((slots, height, width, channels), np.uint8, buf, frames_offset)
+    return header, seqs, stamps, frames
+
+
+def _bus_size(slots, height, width, channels):
+    return (HEADER_BYTES + 16 * slots + 63) // 64 * 64 + slots * height * width * channels
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # 进程存在，只是属于别的用户
+    return True
+
+
+class FrameBusWriter:
+    """Producer side: owns and unlinks the shared memory block."""
+
+    def __init__(self, shape, slots=DEFAULT_SLOTS, name=BUS_NAME):
+        height, width, channels = shape
+        self.slots = slots
+        self.shm = shared_memory.SharedMemory(name=name, create=True,
+                                              size=_bus_size(slots, height, width, channels))
+        self.header, self.seqs, self.stamps, self.frames = _layout(
+            self.shm.buf, slots, height, width, channels)
+        self.seqs[:] = -1
+        self.header[:] = [BUS_MAGIC, BUS_VERSION, slots, height, width, channels, -1, os.getpid()]
+        self.seq = -1
+
+    def write(self, frame, timestamp=None, flip=False):
+        """Copy one frame into the next slot (optionally mirrored on the way in)."""
+        self.seq += 1
+        slot = self.seq % self.slots
+        self.seqs[slot] = -1  # 标记为写入中，读者会丢弃该槽
+        if flip:
+            self.frames[slot] = frame[:, ::-1]
+        else:
+            self.frames[slot] = frame
+        self.stamps[slot] = time.time() if timestamp is None else timestamp
+        self.seqs[slot] = self.seq
+        self.header[H_LATEST] = self.seq
+        return self.seq
+
+    def close(self):
+        self.header[H_LATEST] = -1
+        del self.header, self.seqs, self.stamps, self.frames
+        self.shm.close()
+        self.shm.unlink()
+
+
+class FrameBusReader:
+    """Consumer side: zero-copy views of the newest frame."""
+
+    def __init__(self, name=BUS_NAME):
+        self.shm = shared_memory.SharedMemory(name=name, create=False)
+        header = np.ndarray((8,), np.int64, self.shm.buf, 0)
+        if header[H_PID] != os.getpid():
+            # 只读取不拥有：避免 resource_tracker 在本进程退出时删除共享内存
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        if header[H_MAGIC] != BUS_MAGIC or header[H_VERSION] != BUS_VERSION:
+            del header
+            self.shm.close()
+            raise ValueError(f"shared memory '{name}' is not a frame bus v{BUS_VERSION}")
+        pid = int(header[H_PID])
+        if not _process_alive(pid):
+            # 生产者崩溃后留下的共享内存：不会再有新帧
+            del header
+            self.shm.close()
+            raise ValueError(f"frame bus '{name}' was left behind by producer {pid}, which has exited")
+        slots, height, width, channels = (int(v) for v in header[H_SLOTS:H_CHANNELS + 1])
+        self.slots = slots
+        self.header, self.seqs, self.stamps, self.frames = _layout(
+            self.shm.buf, slots, height, width, channels)
+        self.last_seq = -1
+        self.skipped = 0
+
+    def latest(self):
+        """Return (seq, timestamp, read-only view) of the newest frame, or None."""
+        seq = int(self.header[H_LATEST])
+        if seq < 0:
+            return None
+        slot = seq % self.slots
+        timestamp = float(self.stamps[slot])
+        if self.seqs[slot] != seq:
+            return None  # 正在被覆盖
+        view = self.frames[slot].view()
+        view.flags.writeable = False
+        return seq, timestamp, view
+
+    def is_current(self, seq):
+        """True while the slot holding ``seq`` has not been overwritten."""
+        return int(self.seqs[seq % self.slots]) == seq
+
+    def wait_next(self, timeout=1.0, poll=0.001):
+        """Block until a frame newer than the last one returned is available."""
+        deadline = time.monotonic() + timeout
+        while True:
+            item = self.latest()
+            if item is not None and item[0] > self.last_seq:
+                if self.last_seq >= 0:
+                    self.skipped += item[0] - self.last_seq - 1
+                self.last_seq = item[0]
+                return item
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(poll)
+
+    def close(self):
+        del self.header, self.seqs, self.stamps, self.frames
+        self.shm.close()
+
+
+# ========== cv2.VideoCapture-style sources used by the clients ==========
+
+class BusCapture:
+    """Reads mirrored frames from the bus; ``read()`` returns a read-only view.
+
+    The view stays valid only until the producer reuses its slot: check
+    ``is_current(seq)`` with the ``seq`` of the read, and copy a frame that
+    is kept for later (VisionPipeline does both).
+    """
+
+    def __init__(self, reader, timeout=1.0):
+        self.reader = reader
+        self.timeout = timeout
+        self.capture_time = None
+        self.seq = None  # 最近一次 read() 的帧序号
+        self._open = True
+
+    def isOpened(self):
+        return self._open
+
+    def read(self):
+        item = self.reader.wait_next(self.timeout)
+        if item is None:
+            self._open = False  # 生产者已退出
+            return False, None
+        self.seq, self.capture_time, frame = item
+        return True, frame
+
+    def is_current(self, seq):
+        """True while frame ``seq`` has not been overwritten by the producer."""
+        return self.reader is not None and self.reader.is_current(seq)
+
+    def release(self):
+        if self.reader is not None:
+            print(f"[Frame Bus] Reader skipped {self.reader.skipped} frames")
+            self.reader.close()
+            self.reader = None
+            self._open = False
+
+
+class DirectCapture:
+    """Fallback when no bus is running: own the camera and mirror locally."""
+
+    def __init__(self, device=0):
+        import cv2
+        self._cv2 = cv2
+        self.cap = cv2.VideoCapture(device)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # 不在驱动里排队旧帧，只要最新的
+        self.capture_time = None
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        success, frame = self.cap.read()
+        self.capture_time = time.time()
+        if not success:
+            return False, None
+        return True, self._cv2.flip(frame, 1)
+
+    def release(self):
+        self.cap.release()
+
+
+def open_camera(device=0, name=BUS_NAME):
+    """Attach to the frame bus if a producer is running, else open the camera."""
+    try:
+        capture = BusCapture(FrameBusReader(name))
+        print(f"[Frame Bus] Attached to shared frame bus '{name}'")
+        return capture
+    except FileNotFoundError:
+        return DirectCapture(device)
+    except ValueError as e:
+        print(f"[Frame Bus] {e}; opening the camera directly")
+        return DirectCapture(device)
+
+
+def main():
+    import cv2
+
+    parser = argparse.ArgumentParser(description="Camera -> shared-memory frame bus producer")
+    parser.add_argument('--device', type=int, default=0)
+    parser.add_argument('--slots', type=int, default=DEFAULT_SLOTS)
+    parser.add_argument('--name', default=BUS_NAME)
+    args = parser.parse_args()
+
+    cap = cv2.VideoCapture(args.device)
+    success, frame = cap.read()
+    if not success:
+        print("[Frame Bus] Cannot read from camera")
+        return
+
+    writer = FrameBusWriter(frame.shape, args.slots, args.name)
+    print(f"[Frame Bus] Publishing {frame.shape[1]}x{frame.shape[0]} frames to '{args.name}' "
+          f"({args.slots} slots)")
+    count, t0 = 0, time.monotonic()
+    try:
+        while cap.isOpened():
+            success, frame = cap.read()
+            if not success:
+                break
+            writer.write(frame, time.time(), flip=True)  # 只在这里镜像一次
+            count += 1
+            if time.monotonic() - t0 >= 5.0:
+                print(f"[Frame Bus] {count / (time.monotonic() - t0):.1f} fps, seq {writer.seq}")
+                count, t0 = 0, time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cap.release()
+        writer.close()
+        print("[Frame Bus] Closed.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""Per-source deduplication and time-windowed fusion of hand/face gestures.
+
+Every source (one client connection + its source id) is deduplicated on its
+own, so the hand and face clients no longer suppress each other's repeats.
+Accepted votes are collected for at most ``window`` seconds after the first
+one, or until every connected source has voted (a lone client is not
+delayed at all). Only each source's latest vote counts; agreeing votes are
+fused into one command and conflicting votes are resolved by
+``SOURCE_PRIORITY``. Tokens in ``IMMEDIATE_TOKENS`` (stop) skip the window
+and discard pending votes.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from gesture_protocol import SOURCE_FACE, SOURCE_HAND, SOURCE_UNKNOWN
+
+ARBITRATION_WINDOW = 0.15  # 秒，仲裁带来的最大额外延迟
+IMMEDIATE_TOKENS = {'pointing_up'}  # 停止命令不等待窗口
+
+SOURCE_NAMES = {SOURCE_UNKNOWN: 'text', SOURCE_HAND: 'hand', SOURCE_FACE: 'face'}
+# 冲突时优先级高的来源获胜
+SOURCE_PRIORITY = {'hand': 2, 'face': 1, 'text': 0}
+
+Vote = namedtuple('Vote', 'token source_key source_name arrival')
+Decision = namedtuple('Decision', 'token kind votes rejected latency')
+
+
+class GestureArbiter:
+    """Collects votes and calls ``on_decision(Decision)`` from its own thread.
+
+    ``kind`` is one of 'single', 'fused', 'conflict' or 'immediate';
+    ``latency`` is the time from the first vote to the decision.
+
+    With ``threaded=False`` no timer thread is started: callers pass explicit
+    ``arrival`` times to ``submit()`` and close windows with ``advance(now)``,
+    which makes arbitration deterministic in virtual time (journal replay).
+    """
+
+    def __init__(self, on_decision, window=ARBITRATION_WINDOW, source_priority=None,
+                 immediate_tokens=IMMEDIATE_TOKENS, threaded=True):
+        self.on_decision = on_decision
+        self.window = window
+        self.source_priority = dict(SOURCE_PRIORITY if source_priority is None else source_priority)
+        self.immediate_tokens = set(immediate_tokens)
+
+        self.counts = {'single': 0, 'fused': 0, 'conflict': 0, 'immediate': 0, 'duplicate': 0}
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+
+        self._cond = threading.Condition()
+        self._last_token = {}  # source_key -> 最近一次被接受的手势
+        self._active = set()   # 已连接（投过票、尚未 forget）的来源
+        self._votes = []
+        self._deadline = None
+        if threaded:
+            threading.Thread(target=self._run, name='gesture-arbiter', daemon=True).start()
+
+    def submit(self, token, source_key, source_id=SOURCE_UNKNOWN, arrival=None):
+        """Offer one gesture; returns False if it was a per-source duplicate.
+
+        ``arrival`` is a time.monotonic() value (or virtual time when not threaded).
+        """
+        now = time.monotonic() if arrival is None else arrival
+        source_name = SOURCE_NAMES.get(source_id, 'text')
+        vote = Vote(token, source_key, source_name, now)
+
+        with self._cond:
+            if self._last_token.get(source_key) == token:
+                self.counts['duplicate'] += 1
+                print(f"[Ignored] Gesture '{token}' from {source_name} {source_key} (duplicate)")
+                return False
+            self._last_token[source_key] = token
+            self._active.add(source_key)
+
+            if token in self.immediate_tokens or self.window <= 0:
+                kind = 'immediate' if token in self.immediate_tokens else 'single'
+                dropped = self._votes
+                self._votes = []
+                self._deadline = None
+                decision = self._record(Decision(token, kind, [vote], dropped, now - vote.arrival))
+            else:
+                self._votes.append(vote)
+                if self._deadline is None:
+                    self._deadline = now + self.window
+                    self._cond.notify()
+                if not self._all_voted():
+                    return True
+                decision = self._close_window(now)  # 没有别的来源可等：不必等到窗口结束
+
+        self.on_decision(decision)
+        return True
+
+    def advance(self, now):
+        """Close the open window if its deadline is at or before ``now``."""
+        with self._cond:
+            if self._deadline is None or now < self._deadline:
+                return
+            decision = self._close_window(self._deadline)
+        self.on_decision(decision)
+
+    def forget(self, source_key):
+        """Drop per-source state when a connection closes."""
+        with self._cond:
+            self._last_token.pop(source_key, None)
+            self._active.discard(source_key)
+
+    def stats(self):
+        with self._cond:
+            decided = sum(v for k, v in self.counts.items() if k != 'duplicate')
+            return dict(self.counts,
+                        latency_mean_ms=self.latency_sum / decided * 1000 if decided else 0.0,
+                        latency_max_ms=self.latency_max * 1000)
+
+    def _record(self, decision):
+        self.counts[decision.kind] += 1
+        self.latency_sum += decision.latency
+        if decision.latency > self.latency_max:
+            self.latency_max = decision.latency
+        return decision
+
+    def _all_voted(self):
+        return self._active <= {vote.source_key for vote in self._votes}
+
+    def _resolve(self, votes, now):
+        latest = {}
+        for vote in votes:
+            latest[vote.source_key] = vote  # 同一来源在窗口内改变主意：只算最后一票
+        by_token = {}
+        for vote in latest.values():
+            by_token.setdefault(vote.token, []).append(vote)
+
+        def rank(token):
+            group = by_token[token]
+            best = max(self.source_priority.get(v.source_name, 0) for v in group)
+            return (best, len(group), -group[0].arrival)
+
+        winner = max(by_token, key=rank)
+        accepted = by_token[winner]
+        rejected = [v for v in latest.values() if v.token != winner]
+        if rejected:
+            kind = 'conflict'
+        elif len({v.source_name for v in accepted}) > 1:
+            kind = 'fused'
+        else:
+            kind = 'single'
+        return Decision(winner, kind, accepted, rejected, now - votes[0].arrival)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._deadline is None or time.monotonic() < self._deadline:
+                    timeout = None if self._deadline is None else self._deadline - time.monotonic()
+                    self._cond.wait(timeout)
+                decision = self._close_window(time.monotonic())
+            self.on_decision(decision)
+
+    def _close_window(self, now):
+        votes = self._votes
+        self._votes = []
+        self._deadline = None
+        return self._record(self._resolve(votes, now))
+
+
+def describe(decision):
+    """One-line human readable summary of a decision."""
+    sources = '+'.join(sorted({v.source_name for v in decision.votes}))
+    text = f"{decision.token} [{decision.kind}: {sources}] after {decision.latency * 1000:.0f} ms"
+    if decision.rejected:
+        text += " (overrode " + ', '.join(f"{v.source_name}:{v.token}" for v in decision.rejected) + ")"
+    return text
@@ -0,0 +1,244 @@
+"""Offline evaluation of the hand and face gesture logic on recorded sequences.
+
+Recordings (landmark_sequences.py format, written by the clients with
+GESTURE_RECORD=file.npz) are streamed through the same classification and
+decision code the clients run, as fast as the CPU allows, with the
+recorded timestamps driving the time-based parts. Hands go through
+hand_client's path: batch classification, HandTracker and HandArbiter
+(the recorded hand counts as the dominant one):
+
+    python gesture_eval.py recordings/*.npz
+    python gesture_eval.py recordings/*.npz --model hand_model.npz
+    python gesture_eval.py --synthetic /tmp/sequences     # write synthetic sequences and evaluate them
+
+For every classifier it reports per-frame accuracy and the confusion
+matrix (frames with a detection), and CPU time per frame. For every
+decision rule a client uses (the face client's 1 s cooldown; for hands each
+GestureDecoder preset, next to the old 1 s cooldown as a baseline) it
+reports commands per labeled segment: hits, false commands and the
+decision latency in frames and milliseconds from the start of the segment.
+"""
+
+import argparse
+import os
+import time
+from collections import Counter
+
+import numpy as np
+
+from face_gestures import CHIN, FACE_GESTURES, FACE_LANDMARKS, NOSE_TIP, CooldownGate, NodShakeDetector
+from gesture_model import GestureModel
+from hand_gestures import DECODER_PRESETS, GESTURES, classify_batch, extract_features, one_hot, synthetic_hand
+from hand_tracking import DOMINANT_HAND, POLICIES, HandArbiter, make_tracker
+from landmark_sequences import HAND_LANDMARKS, NONE_LABEL, Sequence, load_sequence, save_sequence
+
+
+# ========== Per-frame classifiers ==========
+# 每个分类器是一个工厂：返回 step(batch) → (每只手的手势 or None, 每只手每类得分)
+# batch 为 (hands, K, 3)，录制每帧最多一只手/一张脸，未检测到时为空
+
+def hand_rules():
+    def step(batch):
+        return classify_batch(extract_features(batch))
+    return GESTURES, step
+
+
+def hand_model(model):
+    def step(batch):
+        scores = model.scores(batch)
+        return [model.label(row)[0] for row in scores], scores
+    return model.classes, step
+
+
+def face_detector(landmark_ids):
+    detector = NodShakeDetector()
+    nose, chin = list(landmark_ids).index(NOSE_TIP), list(landmark_ids).index(CHIN)
+
+    def step(batch):
+        if not len(batch):
+            return [], np.zeros((0, len(FACE_GESTURES)))  # 与客户端一致：没有人脸时不更新历史
+        gesture = detector.update(float(batch[0, nose, 1]), float(batch[0, chin, 0]))
+        return [gesture], one_hot(gesture, FACE_GESTURES)[None]
+    return FACE_GESTURES, step
+
+
+# ========== Evaluation ==========
+
+def segments(labels):
+    """Runs of equal labels → list of (start, end, label)."""
+    bounds = [0] + [i for i in range(1, len(labels)) if labels[i] != labels[i - 1]] + [len(labels)]
+    return [(start, end, labels[start]) for start, end in zip(bounds, bounds[1:])]
+
+
+def classify_sequence(sequence, step):
+    """Run ``step`` on every frame → ([(batch, gestures, scores)] per frame, CPU seconds)."""
+    points = sequence.points.astype(np.float64)
+    present = sequence.present.tolist()
+    frames = []
+    cpu = time.process_time()
+    for i, detected in enumerate(present):
+        batch = points[i:i + 1] if detected else points[i:i]
+        gestures, scores = step(batch)
+        frames.append((batch, gestures, scores.copy()))  # 模型返回的是复用的缓冲区
+    return frames, time.process_time() - cpu
+
+
+def hand_decisions(preset, classes, frames, timestamps, policy):
+    """What hand_client sends for each frame: per-track decoders, then the arbiter policy."""
+    tracker = make_tracker(preset, classes)
+    arbiter = HandArbiter(policy)
+    handedness = [(DOMINANT_HAND, 1.0)]  # 录制只保存客户端选中的那只手，不保存左右手
+    decisions = []
+    for (batch, gestures, scores), now in zip(frames, timestamps):
+        emissions = tracker.update(batch, handedness[:len(batch)], scores, gestures, now)
+        accepted = [d.gesture for d in arbiter.decide(emissions, tracker.visible()) if d.accepted]
+        decisions.append(accepted[0] if accepted else None)
+    return decisions
+
+
+def frame_report(name, sequence, gestures, classes):
+    """Per-frame accuracy and confusion over labeled frames with a detection."""
+    truth, predicted = [], []
+    for label, detected, gesture in zip(sequence.labels.tolist(), sequence.present.tolist(), gestures):
+        if detected and label:
+            truth.append(label)
+            predicted.append(gesture or NONE_LABEL)
+    if not truth:
+        print(f"[Eval] {name}: no labeled frames with a detection")
+        return
+    accuracy = sum(t == p for t, p in zip(truth, predicted)) / len(truth)
+    print(f"[Eval] {name}: frame accuracy {accuracy:.1%} on {len(truth)} frames")
+    names = [c for c in classes if c != NONE_LABEL] + [NONE_LABEL]
+    names += sorted(set(truth) - set(names))
+    counts = Counter(zip(truth, predicted))
+    width = max(len(n) for n in names) + 1
+    print("[Eval]   " + "truth \\ predicted".ljust(width + 2) + "".join(n[:11].rjust(12) for n in names))
+    for t in names:
+        if any(t == label for label in truth):
+            print(f"[Eval]   {t:{width + 2}s}" + "".join(f"{counts[(t, p)]:12d}" for p in names))
+
+
+def decision_report(name, sequence, decisions):
+    """Commands per labeled segment; ``decisions`` is the emitted gesture (or None) per frame."""
+    timestamps = sequence.timestamps.tolist()
+    hits, false, latency_frames, latency_ms, wanted = 0, 0, [], [], 0
+    for start, end, label in segments(sequence.labels.tolist()):
+        expected = label not in ('', NONE_LABEL)
+        wanted += expected
+        fired = False
+        for i in range(start, end):
+            emitted = decisions[i]
+            if emitted is None or emitted == NONE_LABEL:
+                continue
+            if expected and emitted == label and not fired:
+                fired = True
+                hits += 1
+                latency_frames.append(i - start)
+                latency_ms.append((timestamps[i] - timestamps[start]) * 1000)
+            else:
+                false += 1
+    mean_frames = sum(latency_frames) / len(latency_frames) if latency_frames else 0.0
+    mean_ms = sum(latency_ms) / len(latency_ms) if latency_ms else 0.0
+    print(f"[Eval]   {name:14s} hits {hits:4d}/{wanted} ({hits / max(1, wanted):6.1%}), false commands "
+          f"{false:4d}, latency {mean_frames:5.1f} frames / {mean_ms:4.0f} ms")
+
+
+def evaluate(path, sequence, classifiers, presets=(), policy='dominant'):
+    """Frame and decision reports; ``presets`` are the hand decoder presets to try after the cooldown."""
+    frames = len(sequence.labels)
+    duration = sequence.timestamps[-1] - sequence.timestamps[0] if frames > 1 else 0.0
+    print(f"[Eval] {path}: {sequence.kind}, {frames} frames ({duration:.1f} s), "
+          f"{int(sequence.present.sum())} with a detection, labels {dict(Counter(sequence.labels.tolist()))}")
+    timestamps = sequence.timestamps.tolist()
+    for name, (classes, step) in classifiers:
+        classified, cpu = classify_sequence(sequence, step)
+        gestures = [hand_gestures[0] if hand_gestures else None for _, hand_gestures, _ in classified]
+        frame_report(name, sequence, gestures, classes)
+
+        rules = [('cooldown 1.0s', None)] + [(preset, preset) for preset in presets]
+        for rule, preset in rules:
+            start = time.process_time()
+            if preset is None:
+                gate = CooldownGate(1.0, timestamps[0])  # 与客户端一致：启动时刻开始冷却
+                decisions = [gate.update(g, t) for g, t in zip(gestures, timestamps)]
+            else:
+                decisions = hand_decisions(preset, classes, classified, timestamps, policy)
+            decide = time.process_time() - start
+            decision_report(rule, sequence, decisions)
+            print(f"[Eval]   {'':14s} CPU {(cpu + decide) / frames * 1e6:.1f} us/frame "
+                  f"(classify {cpu / frames * 1e6:.1f}, decide {decide / frames * 1e6:.1f})")
+
+
+# ========== Synthetic sequences ==========
+
+def synthetic_sequence(kind, rng, segments_count=60, fps=30.0, flip=0.05):
+    """Labeled synthetic session: held hand poses, or nods / shakes / a still head."""
+    labels = list(GESTURES if kind == 'hand' else FACE_GESTURES) + [NONE_LABEL]
+    frame_labels, label = [], None
+    for _ in range(segments_count):
+        label = labels[(labels.index(label) + rng.integers(1, len(labels))) % len(labels)] if label else NONE_LABEL
+        frame_labels += [label] * int(rng.uniform(0.6, 1.5) * fps)
+    frames = len(frame_labels)
+    timestamps = np.arange(frames) / fps + rng.normal(0.0, 0.002, frames)
+    ids = HAND_LANDMARKS if kind == 'hand' else FACE_LANDMARKS
+    points = np.full((frames, len(ids), 3), np.nan)
+    present = np.ones(frames, bool)
+    wrist = None
+    for i, label in enumerate(frame_labels):
+        if kind == 'hand':
+            if label == NONE_LABEL:
+                present[i] = False
+                wrist = None
+                continue
+            if wrist is None:
+                wrist = np.array((0.5, 0.75)) + rng.uniform(-0.1, 0.1, 2)  # 手出现的位置
+            wrist += rng.normal(0.0, 0.003, 2)  # 手在画面里缓慢移动，HandTracker 才能跟住
+            shown = GESTURES[rng.integers(len(GESTURES))] if rng.random() < flip else label  # 偶发误检
+            hand = synthetic_hand(shown, rng)
+            hand[:, :2] += wrist - hand[0, :2]
+            points[i] = hand
+        else:
+            phase = 2 * np.pi * 2.0 * timestamps[i]  # 2 Hz 点头/摇头
+            nose_y = 0.5 + (0.05 * np.sin(phase) if label == 'yes' else 0.0) + rng.normal(0.0, 0.002)
+            chin_x = 0.5 + (0.05 * np.sin(phase) if label == 'no' else 0.0) + rng.normal(0.0, 0.002)
+            points[i] = ((0.5, nose_y, 0.0), (chin_x, nose_y + 0.15, 0.0))
+    return Sequence(kind, ids, timestamps + 1.7e9, present, points, np.array(frame_labels))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate gesture logic on recorded landmark sequences")
+    parser.add_argument('recordings', nargs='*', help="landmark_sequences .npz files")
+    parser.add_argument('--model', default=None, help="also evaluate a trained hand model (gesture_model.py)")
+    parser.add_argument('--synthetic', default=None, metavar='DIR',
+                        help="write synthetic hand and face sequences to DIR and evaluate them too")
+    parser.add_argument('--policy', choices=POLICIES, default='dominant',
+                        help="HandArbiter policy, as HAND_POLICY in hand_client.py")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    paths = list(args.recordings)
+    if args.synthetic:
+        os.makedirs(args.synthetic, exist_ok=True)
+        rng = np.random.default_rng(args.seed)
+        for kind in ('hand', 'face'):
+            path = os.path.join(args.synthetic, f'{kind}_synthetic.npz')
+            save_sequence(path, synthetic_sequence(kind, rng))
+            paths.append(path)
+    if not paths:
+        parser.error("no recordings given (or use --synthetic DIR)")
+    model = GestureModel.load(args.model) if args.model else None
+
+    for path in paths:
+        sequence = load_sequence(path)
+        if sequence.kind == 'hand':
+            classifiers = [('rules', hand_rules())]
+            if model:
+                classifiers.append(('model', hand_model(model)))
+            evaluate(path, sequence, classifiers, DECODER_PRESETS, args.policy)
+        else:
+            # face_client 只用冷却时间，不经过 GestureDecoder
+            evaluate(path, sequence, [('nod/shake', face_detector(sequence.landmark_ids))])
+
+
+if __name__ == '__main__':
+    main()
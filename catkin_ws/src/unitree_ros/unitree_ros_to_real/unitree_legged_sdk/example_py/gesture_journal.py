@@ -0,0 +1,239 @@
+"""Append-only binary journal of received gestures, plus a replay driver.
+
+server.py --journal PATH appends one record per received token (with its
+dedup decision) and one per dispatched dog_control function. Replay feeds the
+recorded tokens back through the server's arbitration/dispatch path:
+
+    python gesture_journal.py session.gjl                 # real time
+    python gesture_journal.py session.gjl --speed 10      # 10x
+    python gesture_journal.py session.gjl --speed 0       # as fast as possible
+    python gesture_journal.py session.gjl --backend sdk   # drive the real robot
+    python gesture_journal.py session.gjl --dump          # print records
+
+File layout: JOURNAL_MAGIC + version byte, then records of
+RECORD_HEADER (kind, time.time(), source id, IP family, packed address,
+port, token length, function length) followed by the token and function
+name bytes.
+
+Replay runs on the simulated robot unless ``--backend`` says otherwise
+(``sim``, or ``sim-virtual`` at speed 0).
+"""
+
+import argparse
+import os
+import socket
+import struct
+import threading
+import time
+from collections import namedtuple
+
+JOURNAL_MAGIC = b'GJRN'
+JOURNAL_VERSION = 1
+RECORD_HEADER = struct.Struct('<BdBB16sHBB')
+
+KIND_ACCEPTED = 1   # 收到并通过去重的手势
+KIND_DUPLICATE = 2  # 收到但被去重丢弃的手势
+KIND_DISPATCH = 3   # 仲裁后实际调用的 dog_control 函数
+TOKEN_KINDS = (KIND_ACCEPTED, KIND_DUPLICATE)
+
+JournalRecord = namedtuple('JournalRecord', 'kind timestamp source addr token function')
+
+
+def _pack_addr(addr):
+    host, port = addr[0], addr[1]
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    packed = socket.inet_pton(family, host)
+    return (6 if family == socket.AF_INET6 else 4), packed.ljust(16, b'\0'), port
+
+
+def _unpack_addr(family, packed, port):
+    if family == 6:
+        return (socket.inet_ntop(socket.AF_INET6, packed), port)
+    return (socket.inet_ntop(socket.AF_INET, packed[:4]), port)
+
+
+class JournalWriter:
+    """Thread-safe buffered appender.
+
+    A background thread flushes every ``flush_interval`` s, so an idle server
+    still gets its last records on disk; dispatch records flush immediately.
+    """
+
+    def __init__(self, path, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.records = 0
+        self._lock = threading.Lock()
+        self._file = open(path, 'ab', buffering=64 * 1024)
+        if self._file.tell() == 0:
+            self._file.write(JOURNAL_MAGIC + bytes([JOURNAL_VERSION]))
+        self._dirty = False
+        self._closed = threading.Event()
+        threading.Thread(target=self._flush_loop, name='journal-flush', daemon=True).start()
+
+    def record(self, kind, addr, source, token, function='', timestamp=None):
+        family, packed, port = _pack_addr(addr)
+        token_bytes = token.encode()[:255]
+        function_bytes = function.encode()[:255]
+        data = RECORD_HEADER.pack(kind, time.time() if timestamp is None else timestamp, source,
+                                  family, packed, port, len(token_bytes), len(function_bytes))
+        with self._lock:
+            self._file.write(data + token_bytes + function_bytes)
+            self.records += 1
+            self._dirty = True
+            if kind == KIND_DISPATCH:  # 动作记录很少，立即落盘：被杀掉时也不丢
+                self._file.flush()
+                self._dirty = False
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.flush_interval):
+            with self._lock:
+                if self._dirty and not self._file.closed:
+                    self._file.flush()
+                    self._dirty = False
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            self._file.close()
+        print(f"[Journal] {self.records} records written to {self.path}")
+
+
+def read_journal(path):
+    """Yield JournalRecord tuples from a journal file."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(JOURNAL_MAGIC)] != JOURNAL_MAGIC:
+        raise ValueError(f"{path} is not a gesture journal")
+    version = data[len(JOURNAL_MAGIC)]
+    if version != JOURNAL_VERSION:
+        raise ValueError(f"unsupported journal version {version}")
+
+    offset = len(JOURNAL_MAGIC) + 1
+    view = memoryview(data)
+    while offset + RECORD_HEADER.size <= len(data):
+        kind, timestamp, source, family, packed, port, token_len, function_len = \
+            RECORD_HEADER.unpack_from(view, offset)
+        offset += RECORD_HEADER.size
+        end = offset + token_len + function_len
+        if end > len(data):
+            break  # 末尾被截断的记录（写入时崩溃）
+        token = bytes(view[offset:offset + token_len]).decode()
+        function = bytes(view[offset + token_len:end]).decode()
+        offset = end
+        yield JournalRecord(kind, timestamp, source, _unpack_addr(family, packed, port), token, function)
+
+
+def _advance_robot(dog_control, limit):
+    """Run the virtual robot clock up to ``limit``: a running action stops there, idle time ticks the loop."""
+    clock, control = dog_control.clock, dog_control.control
+    clock.hold(limit)
+    while dog_control.executor.is_busy():
+        if clock.wait_held(0.001):
+            return  # 动作停在 limit 处，等下一条记录
+    while clock.time() + control.period <= limit + 1e-9:
+        clock.sleep(control.period)
+        control.tick()
+
+
+def replay(path, speed=1.0, window=None, backend=None):
+    """Feed the journal's tokens through server.py's arbitration and dispatch.
+
+    ``speed`` scales inter-arrival gaps and the arbitration window so fusion
+    behaves as recorded. ``speed=0`` runs as fast as possible with the
+    arbiter and the simulated robot both in virtual time driven by the
+    recorded timestamps, which makes the decision sequence and the actions'
+    preemptions deterministic. ``backend`` defaults to ``sim`` (``sim-virtual``
+    at speed 0); ``sdk`` replays onto the real robot. Returns a summary dict.
+    """
+    if backend is None:
+        backend = 'sim-virtual' if speed <= 0 else 'sim'
+    os.environ['ROBOT_BACKEND'] = backend  # dog_control 在导入时创建后端
+    import dog_control
+    import robot_backend
+    import server
+    from gesture_arbiter import ARBITRATION_WINDOW
+    from gesture_protocol import GestureMessage
+
+    records = list(read_journal(path))
+    tokens = [r for r in records if r.kind in TOKEN_KINDS]
+    recorded = [r.token for r in records if r.kind == KIND_DISPATCH]
+    if window is None:
+        window = ARBITRATION_WINDOW
+    if dog_control.backend.name != backend:
+        dog_control.use_backend(robot_backend.create_backend(backend))
+    virtual = speed <= 0
+    if not virtual:
+        window = window / speed
+    drive_robot = virtual and dog_control.clock.virtual
+
+    replayed = []
+
+    def on_decision(decision):
+        replayed.append(decision.token)
+        server.execute_decision(decision, virtual_time=virtual)
+
+    arbiter = server.make_arbiter(on_decision, window, None, threaded=not virtual)
+    sources = set()
+    t0 = tokens[0].timestamp if tokens else 0.0
+    offset = dog_control.clock.time() - t0  # 记录时间 → 机器人虚拟时钟
+    start = time.monotonic()
+    for record in tokens:
+        msg = GestureMessage(record.token, record.source, None, None, None)
+        if virtual:
+            if drive_robot:
+                _advance_robot(dog_control, record.timestamp + offset)
+            arbiter.advance(record.timestamp)
+            server.submit_gestures(arbiter, [msg], record.addr, sources, arrival=record.timestamp)
+            continue
+        delay = start + (record.timestamp - t0) / speed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        server.submit_gestures(arbiter, [msg], record.addr, sources)
+
+    if virtual:
+        arbiter.advance(float('inf'))
+        if drive_robot:
+            dog_control.clock.hold(None)  # 最后的动作自由跑完
+    else:
+        time.sleep(window * 2)  # 等待最后一个仲裁窗口关闭
+    elapsed = time.monotonic() - start
+    dog_control.executor.wait_idle()
+
+    recorded_span = tokens[-1].timestamp - t0 if tokens else 0.0
+    return {
+        'tokens': len(tokens),
+        'elapsed_s': elapsed,
+        'recorded_span_s': recorded_span,
+        'effective_speed': recorded_span / elapsed if elapsed > 0 else float('inf'),
+        'decisions': len(replayed),
+        'matches_recording': replayed == recorded,
+        'arbiter': arbiter.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay or dump a gesture journal")
+    parser.add_argument('journal')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="1 = real time, N = N times faster, 0 = as fast as possible")
+    parser.add_argument('--window', type=float, default=None,
+                        help="arbitration window used while recording (seconds)")
+    parser.add_argument('--backend', choices=('sim', 'sim-virtual', 'sdk'), default=None,
+                        help="robot backend (default: sim, sim-virtual with --speed 0)")
+    parser.add_argument('--dump', action='store_true', help="print records instead of replaying")
+    args = parser.parse_args()
+
+    if args.dump:
+        kinds = {KIND_ACCEPTED: 'accepted', KIND_DUPLICATE: 'duplicate', KIND_DISPATCH: 'dispatch'}
+        for r in read_journal(args.journal):
+            extra = f" -> {r.function}" if r.function else ''
+            print(f"{r.timestamp:.6f} {kinds.get(r.kind, r.kind):9s} {r.addr} src={r.source} {r.token}{extra}")
+        return
+
+    summary = replay(args.journal, args.speed, args.window, args.backend)
+    print(f"[Replay] {summary}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Trainable hand gesture classifier over normalized landmarks.
+
+The rules in hand_gestures.py need a new predicate for every gesture; this
+model is learned from recorded frames instead. Recording and training:
+
+    GESTURE_RECORD=recordings/me.npz python hand_client.py   # 1-6 pick the label, 0 pauses
+    python gesture_model.py recordings/*.npz -o hand_model.npz
+    python gesture_model.py --synthetic 3000 -o hand_model.npz   # try it without a camera
+
+Recordings use the landmark_sequences.py format; training takes the
+frames with a hand. The label ``none`` marks frames that should not
+trigger anything. Adding a
+gesture means recording frames with a new label and retraining; hand_client
+loads ``hand_model.npz`` when it exists and falls back to the rules.
+
+Landmarks are made translation- and scale-invariant (wrist at the origin,
+wrist → middle finger MCP = 1) and fed to a softmax regression. The input
+standardization is folded into the weights, so inference is one matrix
+multiply into a preallocated buffer that scores every class at once (every
+hand at once for up to ``max_hands`` hands).
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from hand_gestures import GESTURES, synthetic_hand
+from landmark_sequences import NONE_LABEL, load_recordings
+
+N_INPUTS = 42        # 21 个关键点的归一化 (x, y)
+SCALE_JOINT = 9      # 中指 mcp：手腕到它的距离作为长度单位
+
+
+def normalize_landmarks(points, out=None):
+    """(..., 21, 3) landmarks → (..., N_INPUTS) wrist-relative, palm-scaled (x, y)."""
+    xy = np.asarray(points)[..., :2]
+    relative = xy - xy[..., :1, :]
+    scale = np.sqrt((relative[..., SCALE_JOINT, :] ** 2).sum(axis=-1))[..., None, None]
+    normalized = (relative / np.maximum(scale, 1e-6)).reshape(xy.shape[:-2] + (N_INPUTS,))
+    if out is None:
+        return normalized
+    out[...] = normalized
+    return out
+
+
+class GestureModel:
+    """Softmax regression; ``weights`` is (N_INPUTS + 1, classes), the last row is the bias."""
+
+    def __init__(self, classes, weights, min_confidence=0.6, max_hands=2):
+        self.classes = tuple(classes)
+        self.weights = np.ascontiguousarray(weights, dtype=np.float64)
+        self.min_confidence = min_confidence
+        self._input = np.ones((max_hands, N_INPUTS + 1))       # 末列恒为 1（偏置）
+        self._scores = np.empty((max_hands, len(self.classes)))
+
+    def scores(self, points):
+        """Class probabilities for one hand (21, 3) or a batch (hands, 21, 3).
+
+        Up to ``max_hands`` hands the result is a preallocated buffer, overwritten
+        by the next call; larger batches (training, evaluation) get a new array.
+        """
+        points = np.asarray(points)
+        hands = 1 if points.ndim == 2 else len(points)
+        if points.ndim <= 3 and hands <= len(self._input):
+            inputs = self._input[:hands]
+            normalize_landmarks(points, inputs[0, :N_INPUTS] if points.ndim == 2 else inputs[:, :N_INPUTS])
+            scores = np.dot(inputs, self.weights, out=self._scores[:hands])
+        else:
+            inputs = np.ones(points.shape[:-2] + (N_INPUTS + 1,))
+            normalize_landmarks(points, inputs[..., :N_INPUTS])
+            scores = inputs @ self.weights
+        scores -= scores.max(axis=-1, keepdims=True)
+        np.exp(scores, out=scores)
+        scores /= scores.sum(axis=-1, keepdims=True)
+        return scores[0] if points.ndim == 2 else scores
+
+    def predict(self, points):
+        """(gesture or None, confidence) for one hand; ``none`` and low confidence give None."""
+        return self.label(self.scores(points))
+
+    def label(self, scores):
+        """(gesture or None, confidence) from one hand's ``scores``."""
+        best = int(scores.argmax())
+        confidence = float(scores[best])
+        if confidence < self.min_confidence or self.classes[best] == NONE_LABEL:
+            return None, confidence
+        return self.classes[best], confidence
+
+    def save(self, path):
+        np.savez(path, classes=np.array(self.classes), weights=self.weights,
+                 min_confidence=self.min_confidence)
+
+    @classmethod
+    def load(cls, path, max_hands=2):
+        with np.load(path) as data:
+            return cls(data['classes'].tolist(), data['weights'], float(data['min_confidence']), max_hands)
+
+
+def train(points, labels, epochs=300, learning_rate=0.5, l2=1e-4, min_confidence=0.6):
+    """Fit a GestureModel on (N, 21, 3) landmarks and N string labels (full-batch gradient descent)."""
+    classes = sorted(set(labels))
+    targets = np.zeros((len(labels), len(classes)))
+    targets[np.arange(len(labels)), [classes.index(label) for label in labels]] = 1.0
+
+    inputs = normalize_landmarks(points)
+    mean, std = inputs.mean(axis=0), inputs.std(axis=0)
+    std[std < 1e-6] = 1.0  # 手腕坐标恒为 0
+    inputs = np.hstack([(inputs - mean) / std, np.ones((len(inputs), 1))])
+
+    weights = np.zeros((N_INPUTS + 1, len(classes)))
+    for _ in range(epochs):
+        logits = inputs @ weights
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        gradient = inputs.T @ (probabilities - targets) / len(inputs)
+        gradient[:-1] += l2 * weights[:-1]
+        weights -= learning_rate * gradient
+
+    # 把标准化折叠进权重：((x - mean) / std) @ W + b == x @ (W / std) + (b - (mean / std) @ W)
+    folded = weights[:-1] / std[:, None]
+    bias = weights[-1] - (mean / std) @ weights[:-1]
+    return GestureModel(classes, np.vstack([folded, bias]), min_confidence)
+
+
+def synthetic_recording(frames, rng, noise=0.004):
+    """Labeled synthetic hands with random rotation, scale and position (no camera needed)."""
+    choices = list(GESTURES) + [NONE_LABEL]
+    labels = np.array([choices[i] for i in rng.integers(0, len(choices), frames)])
+    points = np.empty((frames, 21, 3))
+    for i, label in enumerate(labels.tolist()):
+        hand = synthetic_hand(None if label == NONE_LABEL else label, rng, noise)
+        angle = rng.uniform(-0.3, 0.3)
+        rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+        center = hand[0, :2]  # 绕手腕旋转、缩放，再整体平移
+        hand[:, :2] = (hand[:, :2] - center) @ rotation.T * rng.uniform(0.6, 1.4)
+        hand[:, :2] += center + rng.uniform(-0.15, 0.15, 2)
+        points[i] = hand
+    return points, labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the landmark gesture classifier")
+    parser.add_argument('recordings', nargs='*', help=".npz recordings from GESTURE_RECORD")
+    parser.add_argument('-o', '--output', default='hand_model.npz')
+    parser.add_argument('--synthetic', type=int, default=0, metavar='FRAMES',
+                        help="add synthetic hands (hand_gestures.synthetic_hand)")
+    parser.add_argument('--holdout', type=float, default=0.2, help="fraction kept for evaluation")
+    parser.add_argument('--epochs', type=int, default=300)
+    parser.add_argument('--l2', type=float, default=1e-4)
+    parser.add_argument('--min-confidence', type=float, default=0.6)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    sets = [load_recordings(args.recordings)] if args.recordings else []
+    if args.synthetic:
+        sets.append(synthetic_recording(args.synthetic, rng))
+    if not sets:
+        parser.error("no recordings given (or use --synthetic N)")
+    points = np.concatenate([p for p, _ in sets])
+    labels = np.concatenate([label for _, label in sets])
+
+    order = rng.permutation(len(labels))
+    split = int(len(order) * (1 - args.holdout))
+    fit, held = order[:split], order[split:]
+    start = time.perf_counter()
+    model = train(points[fit], labels[fit].tolist(), args.epochs, l2=args.l2, min_confidence=args.min_confidence)
+    print(f"[Model] trained on {len(fit)} frames, classes {', '.join(model.classes)} "
+          f"({time.perf_counter() - start:.1f} s)")
+
+    if len(held):
+        predicted = np.array(model.classes)[model.scores(points[held]).argmax(axis=1)]
+        truth = labels[held]
+        print(f"[Model] holdout accuracy {np.mean(predicted == truth):.1%} on {len(held)} frames")
+        for name in model.classes:
+            mask = truth == name
+            if mask.any():
+                print(f"[Model]   {name:12s} {np.mean(predicted[mask] == name):6.1%} ({mask.sum()} frames)")
+
+    hand = points[0].astype(np.float64)
+    runs = 2000
+    start = time.perf_counter()
+    for _ in range(runs):
+        model.predict(hand)
+    print(f"[Model] inference {(time.perf_counter() - start) / runs * 1e6:.1f} us/hand "
+          f"({model.weights.shape[0]}x{model.weights.shape[1]} weights)")
+
+    model.save(args.output)
+    print(f"[Model] saved {args.output}")
+
+
+if __name__ == '__main__':
+    main()
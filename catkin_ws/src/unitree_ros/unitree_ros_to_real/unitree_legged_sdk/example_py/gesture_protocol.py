@@ -0,0 +1,347 @@
+"""Wire format shared by server.py and the gesture clients.
+
+Text protocol: every token is terminated by ``FRAME_DELIMITER`` so back-to-back
+sends never coalesce (``open`` + ``fist`` used to arrive as ``openfist``).
+
+Binary protocol: fixed-size structs carrying a sequence number and the camera
+capture timestamp, negotiated per connection by a leading HELLO. Version 2
+adds analog velocity setpoints (VELOCITY opcode + VELOCITY payload).
+"""
+
+import math
+import struct
+import threading
+import time
+from collections import namedtuple
+
+FRAME_DELIMITER = b'\n'
+MAX_BUFFER = 4096  # 单个连接未完成帧的最大缓存字节数
+
+
+def encode_token(token):
+    """Encode one gesture token as a delimited frame."""
+    return token.encode() + FRAME_DELIMITER
+
+
+class TokenFramer:
+    """Incremental per-connection framer.
+
+    ``feed()`` appends received bytes and returns every complete token. Only
+    the new bytes are scanned for delimiters, and each frame is decoded once.
+    A partial frame stays buffered until the rest arrives; if it grows beyond
+    ``max_buffer`` it is discarded and counted in ``overflows``.
+    """
+
+    def __init__(self, max_buffer=MAX_BUFFER):
+        self.buffer = bytearray()
+        self.max_buffer = max_buffer
+        self.overflows = 0
+        self._scan_from = 0
+
+    def feed(self, data):
+        tokens = []
+        buf = self.buffer
+        buf.extend(data)
+
+        start = 0
+        idx = buf.find(FRAME_DELIMITER, self._scan_from)
+        while idx != -1:
+            # 一帧内允许用空白分隔多个词（兼容 netcat 等手工输入）
+            for word in bytes(buf[start:idx]).split():
+                token = word.decode('ascii', errors='ignore').lower()
+                if token:  # 纯非 ASCII 的词解码后为空，不能当作手势
+                    tokens.append(token)
+            start = idx + 1
+            idx = buf.find(FRAME_DELIMITER, start)
+
+        if start:
+            del buf[:start]
+        self._scan_from = len(buf)
+
+        if len(buf) > self.max_buffer:
+            self.overflows += 1
+            print(f"[Warning] Frame buffer overflow ({len(buf)} bytes), dropping partial frame")
+            buf.clear()
+            self._scan_from = 0
+
+        return tokens
+
+    def flush(self):
+        """Return the trailing unterminated frame (used when the peer closes)."""
+        tokens = [w.decode('ascii', errors='ignore').lower() for w in bytes(self.buffer).split()]
+        tokens = [t for t in tokens if t]
+        self.buffer.clear()
+        self._scan_from = 0
+        return tokens
+
+
+# ========== Binary protocol (v1) ==========
+#
+# A binary client opens the connection with HELLO (magic byte + version);
+# anything else is treated as the text protocol above. After the hello every
+# message is a fixed-size MESSAGE struct:
+#
+#   opcode      uint8    gesture token, see OPCODES
+#   source      uint8    SOURCE_HAND / SOURCE_FACE / ...
+#   seq         uint32   per-connection monotonic sequence number (wraps)
+#   capture_ts  float64  time.time() of the camera frame that produced it
+#   confidence  float32  NaN when the classifier has no score
+#
+# Version 2: a MESSAGE with opcode OP_VELOCITY is followed by a VELOCITY
+# payload (vx, vy in m/s, yaw speed in rad/s; confidence unused).
+#
+# HEARTBEAT (any version) is a plain MESSAGE whose confidence field carries
+# the client's heartbeat interval in seconds; it decodes as HEARTBEAT_TOKEN.
+
+BINARY_MAGIC = 0xA7  # 不可能出现在文本手势中的首字节
+PROTOCOL_VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+HELLO = struct.Struct('<BB')
+MESSAGE = struct.Struct('<BBIdf')
+VELOCITY = struct.Struct('<fff')
+OP_VELOCITY = 0x80
+OP_HEARTBEAT = 0x81
+HEARTBEAT_TOKEN = 'heartbeat'
+
+SOURCE_UNKNOWN = 0
+SOURCE_HAND = 1
+SOURCE_FACE = 2
+
+OPCODES = {
+    'open': 1,
+    'fist': 2,
+    'pointing_up': 3,
+    'yes': 4,
+    'no': 5,
+    'angry_reaction': 6,
+    'sad_reaction': 7,
+    'happy_reaction': 8,
+    'faster': 9,
+    'slower': 10,
+    HEARTBEAT_TOKEN: OP_HEARTBEAT,
+}
+TOKENS = {code: token for token, code in OPCODES.items()}
+
+GestureMessage = namedtuple('GestureMessage', 'token source seq capture_ts confidence')
+VelocityMessage = namedtuple('VelocityMessage', 'source seq capture_ts vx vy yaw_speed')
+
+
+def encode_hello(version=PROTOCOL_VERSION):
+    return HELLO.pack(BINARY_MAGIC, version)
+
+
+def encode_message(token, source, seq, capture_ts, confidence=None):
+    """Pack one gesture into a MESSAGE frame."""
+    return MESSAGE.pack(OPCODES[token], source, seq & 0xFFFFFFFF, capture_ts,
+                        math.nan if confidence is None else confidence)
+
+
+def encode_velocity(source, seq, capture_ts, vx, vy, yaw_speed):
+    """Pack one analog velocity setpoint (protocol v2)."""
+    return (MESSAGE.pack(OP_VELOCITY, source, seq & 0xFFFFFFFF, capture_ts, math.nan)
+            + VELOCITY.pack(vx, vy, yaw_speed))
+
+
+class BinaryFramer:
+    """Incremental decoder for MESSAGE frames (and v2 VELOCITY payloads)."""
+
+    def __init__(self, version=PROTOCOL_VERSION):
+        self.version = version
+        self.buffer = bytearray()
+        self.unknown_opcodes = 0
+
+    def feed(self, data):
+        buf = self.buffer
+        buf.extend(data)
+        if self.version >= 2 and OP_VELOCITY in buf:
+            return self._feed_mixed()  # 可能含变长消息（字节也可能只是出现在时间戳里）
+        usable = len(buf) - len(buf) % MESSAGE.size
+        if not usable:
+            return []
+
+        messages = []
+        for opcode, source, seq, capture_ts, confidence in MESSAGE.iter_unpack(memoryview(buf)[:usable]):
+            messages.append(self._gesture(opcode, source, seq, capture_ts, confidence))
+        del buf[:usable]
+        return messages
+
+    def _feed_mixed(self):
+        buf = self.buffer
+        view = memoryview(buf)
+        messages = []
+        offset = 0
+        while len(buf) - offset >= MESSAGE.size:
+            opcode, source, seq, capture_ts, confidence = MESSAGE.unpack_from(view, offset)
+            if opcode != OP_VELOCITY:
+                messages.append(self._gesture(opcode, source, seq, capture_ts, confidence))
+                offset += MESSAGE.size
+                continue
+            if len(buf) - offset < MESSAGE.size + VELOCITY.size:
+                break
+            vx, vy, yaw_speed = VELOCITY.unpack_from(view, offset + MESSAGE.size)
+            messages.append(VelocityMessage(source, seq, capture_ts, vx, vy, yaw_speed))
+            offset += MESSAGE.size + VELOCITY.size
+        view.release()
+        del buf[:offset]
+        return messages
+
+    def _gesture(self, opcode, source, seq, capture_ts, confidence):
+        token = TOKENS.get(opcode)
+        if token is None:
+            self.unknown_opcodes += 1
+            token = f'opcode_{opcode}'
+        return GestureMessage(token, source, seq, capture_ts, None if confidence != confidence else confidence)
+
+
+class LinkStats:
+    """Per-connection sequence and transit-latency bookkeeping."""
+
+    def __init__(self):
+        self.received = 0
+        self.dropped = 0
+        self.reordered = 0
+        self.transit_count = 0
+        self.transit_sum = 0.0
+        self.transit_max = 0.0
+        self._expected = {}  # source -> 下一个期望的 seq
+
+    def observe(self, msg, arrival):
+        """Record one message; returns its transit latency in seconds (or None)."""
+        self.received += 1
+        if msg.seq is None:
+            return None
+
+        expected = self._expected.get(msg.source)
+        if expected is None or msg.seq == expected:
+            self._expected[msg.source] = (msg.seq + 1) & 0xFFFFFFFF
+        else:
+            gap = (msg.seq - expected) & 0xFFFFFFFF
+            if gap < 0x80000000:
+                self.dropped += gap
+                self._expected[msg.source] = (msg.seq + 1) & 0xFFFFFFFF
+            else:
+                self.reordered += 1  # 迟到的旧消息，不回退期望值
+
+        transit = arrival - msg.capture_ts
+        self.transit_count += 1
+        self.transit_sum += transit
+        if transit > self.transit_max:
+            self.transit_max = transit
+        return transit
+
+    def summary(self):
+        text = f"{self.received} msgs"
+        if self.transit_count:
+            avg_ms = self.transit_sum / self.transit_count * 1000
+            text += (f", {self.dropped} dropped, {self.reordered} reordered, "
+                     f"transit avg {avg_ms:.1f} ms max {self.transit_max * 1000:.1f} ms")
+        return text
+
+
+class ConnectionDecoder:
+    """Negotiates text vs binary from the first bytes of a connection.
+
+    ``feed()`` returns GestureMessage tuples either way; text tokens carry
+    ``seq``/``capture_ts``/``confidence`` of None. Binary v2 connections may
+    also yield VelocityMessage tuples.
+    """
+
+    def __init__(self):
+        self.mode = None  # None: 尚未协商, 'text', 'binary'
+        self.version = None
+        self.stats = LinkStats()
+        self._pending = b''
+        self._text = None
+        self._binary = None
+
+    def feed(self, data, arrival=None):
+        if self.mode is None:
+            data = self._negotiate(self._pending + data)
+            if self.mode is None:
+                return []
+
+        if self.mode == 'binary':
+            messages = self._binary.feed(data)
+        else:
+            messages = [GestureMessage(t, SOURCE_UNKNOWN, None, None, None) for t in self._text.feed(data)]
+
+        if messages:
+            if arrival is None:
+                arrival = time.time()
+            for msg in messages:
+                self.stats.observe(msg, arrival)
+        return messages
+
+    def flush(self):
+        if self.mode == 'text':
+            return [GestureMessage(t, SOURCE_UNKNOWN, None, None, None) for t in self._text.flush()]
+        return []
+
+    def _negotiate(self, data):
+        if not data:
+            return data
+        if data[0] != BINARY_MAGIC:
+            self.mode = 'text'
+            self._text = TokenFramer()
+            return data
+        if len(data) < HELLO.size:
+            self._pending = data
+            return b''
+
+        _, version = HELLO.unpack_from(data)
+        if version not in SUPPORTED_VERSIONS:
+            raise ValueError(f"unsupported binary protocol version {version}")
+        self.mode = 'binary'
+        self.version = version
+        self._binary = BinaryFramer(version)
+        self._pending = b''
+        return data[HELLO.size:]
+
+
+class GestureSender:
+    """Client-side helper: sends gestures in binary (default) or text form."""
+
+    def __init__(self, sock, source, binary=True, heartbeat_interval=0.05):
+        self.sock = sock
+        self.source = source
+        self.binary = binary
+        self.seq = 0
+        self.heartbeat_interval = heartbeat_interval
+        self._last_heartbeat = 0.0
+        self._lock = threading.Lock()  # 心跳可能来自其他线程，消息不能交错
+        if binary:
+            sock.sendall(encode_hello())
+
+    def send(self, token, capture_ts=None, confidence=None):
+        if not self.binary:
+            with self._lock:
+                self.sock.sendall(encode_token(token))
+            return
+        if capture_ts is None:
+            capture_ts = time.time()
+        with self._lock:
+            self.sock.sendall(encode_message(token, self.source, self.seq, capture_ts, confidence))
+            self.seq = (self.seq + 1) & 0xFFFFFFFF
+
+    def heartbeat(self, now=None):
+        """Send a heartbeat if ``heartbeat_interval`` has passed; call it every frame.
+
+        Sending from the main loop (not a timer thread) means a hung client
+        stops beating too, so the server's dead-man stop covers it.
+        """
+        now = time.monotonic() if now is None else now
+        if now - self._last_heartbeat < self.heartbeat_interval:
+            return False
+        self._last_heartbeat = now
+        self.send(HEARTBEAT_TOKEN, confidence=self.heartbeat_interval)
+        return True
+
+    def send_velocity(self, vx, vy, yaw_speed, capture_ts=None):
+        """Stream an analog velocity setpoint (binary protocol only)."""
+        if not self.binary:
+            raise ValueError("velocity streaming needs the binary protocol")
+        if capture_ts is None:
+            capture_ts = time.time()
+        with self._lock:
+            self.sock.sendall(encode_velocity(self.source, self.seq, capture_ts, vx, vy, yaw_speed))
+            self.seq = (self.seq + 1) & 0xFFFFFFFF
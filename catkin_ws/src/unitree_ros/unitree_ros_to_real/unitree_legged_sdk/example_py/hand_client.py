@@ -1,25 +1,76 @@
 import cv2
 import mediapipe as mp
+import os
 import socket
 import time
 import math
+from collections import namedtuple
+
 import numpy as np
 
+from frame_bus import open_camera
+from gesture_model import GestureModel
+from gesture_protocol import GestureSender, SOURCE_HAND
+from landmark_sequences import NONE_LABEL, LandmarkRecorder, parse_label, read_labels
+from hand_gestures import GESTURES, classify_batch, extract_features, gesture_flags, landmarks_to_array, palm_center
+from hand_tracking import DOMINANT_HAND, HandArbiter, make_tracker
+from vision_pipeline import AdaptiveInput, StaticOverlay, VisionPipeline
+
 HOST = '127.0.0.1'
 PORT = 8888
+USE_BINARY_PROTOCOL = True  # False: 发送换行分隔的文本手势
+RENDER_FPS = 30  # 显示刷新上限，与推理频率无关
+# 手势确认：'fast' 延迟最低、'strict' 误触发最少（见 hand_gestures.py --decoder）
+DECODER_PRESET = 'balanced'
+# 多只手：每只手独立跟踪和确认，由策略决定谁能发命令（见 hand_tracking.py）
+MAX_HANDS = 2
+HAND_POLICY = 'dominant'   # 'dominant' | 'agree' | 'per_hand' | 'any'
+# 训练好的模型（gesture_model.py）存在时取代规则判断
+MODEL_PATH = os.environ.get('GESTURE_MODEL', 'hand_model.npz')
+# 录制模式：GESTURE_RECORD=文件.npz，按 1-6 选择标签开始录制，0 暂停；退出时追加保存
+# 录制的序列可用于训练（gesture_model.py）和离线评估（gesture_eval.py）
+RECORD_PATH = os.environ.get('GESTURE_RECORD')
+RECORD_LABELS = list(GESTURES) + [NONE_LABEL]  # 新手势：在这里加标签，录制后重新训练
+# 无显示器部署：不绘制、不调用 imshow/waitKey（GESTURE_HEADLESS=1，Ctrl+C 退出）
+HEADLESS = os.environ.get('GESTURE_HEADLESS', '0') not in ('', '0')
+
+# 模型输入自适应：裁剪到上一帧的手部区域、按耗时预算降低分辨率、无手时降低推理频率
+ROI_TRACKING = True
+ADAPTIVE_RESOLUTION = True
+INFERENCE_BUDGET = 0.015   # 秒，单帧模型耗时目标
+IDLE_SKIPPING = True
+IDLE_AFTER = 1.0           # 秒，多久没看到手进入空闲
+IDLE_FPS = 5.0             # 空闲时的推理频率；新出现的手最多延迟 1/IDLE_FPS 秒
+
+# 模拟量速度模式（需要二进制协议，按 V 切换）：张开手掌时按手掌位移连续发送 vx/yaw
+ANALOG_VELOCITY = False
+ANALOG_DEADZONE = 0.03     # 归一化图像坐标
+ANALOG_FULL_SCALE = 0.15   # 位移达到此值时为最大速度
+ANALOG_MAX_VX = 0.5        # m/s
+ANALOG_MAX_YAW = 1.0       # rad/s
 
 sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 sock.connect((HOST, PORT))
 print("[Hand Client] Connected to server.")
+sender = GestureSender(sock, SOURCE_HAND, binary=USE_BINARY_PROTOCOL)
 
 mp_hands = mp.solutions.hands
-hands = mp_hands.Hands(min_detection_confidence=0.8, min_tracking_confidence=0.8)
+hands = mp_hands.Hands(max_num_hands=MAX_HANDS, min_detection_confidence=0.8, min_tracking_confidence=0.8)
 mp_drawing = mp.solutions.drawing_utils
+model_input = AdaptiveInput(roi=ROI_TRACKING, adaptive=ADAPTIVE_RESOLUTION, idle=IDLE_SKIPPING,
+                            budget=INFERENCE_BUDGET, idle_after=IDLE_AFTER, idle_fps=IDLE_FPS)
+
+model = GestureModel.load(MODEL_PATH, MAX_HANDS) if os.path.exists(MODEL_PATH) else None
+if model:
+    print(f"[Hand Client] Using trained model {MODEL_PATH}: {', '.join(model.classes)}")
+recorder = LandmarkRecorder(RECORD_PATH) if RECORD_PATH else None
+# 当前录制的标签，None 表示暂停；无显示器时由 GESTURE_RECORD_LABEL（编号或名称）给出初始值，之后从标准输入切换
+record_label = parse_label(os.environ.get('GESTURE_RECORD_LABEL', '0'), RECORD_LABELS) if recorder else None
 
-cap = cv2.VideoCapture(0)
-last_sent = None
-gesture_cooldown = 1.0  # 减少冷却时间
-last_time_sent = time.time()
+cap = open_camera(0)  # 优先连接共享帧总线（frame_bus.py），否则直接打开摄像头
+# 每只手按证据累积确认手势（取代固定冷却时间），仲裁器按策略决定发送哪只手的手势
+tracker = make_tracker(DECODER_PRESET, model.classes if model else GESTURES)
+arbiter = HandArbiter(HAND_POLICY, DOMINANT_HAND)
 debug_mode = False
 
 # 用于显示效果的变量
@@ -27,205 +78,27 @@ displayed_gesture = None
 display_start_time = None
 display_duration = 2.0  # 显示持续时间（秒）
 
-def calculate_angle(a, b, c):
-    """计算三点之间的角度"""
-    a = np.array([a.x, a.y])
-    b = np.array([b.x, b.y])
-    c = np.array([c.x, c.y])
-    
-    radians = np.arctan2(c[1] - b[1], c[0] - b[0]) - np.arctan2(a[1] - b[1], a[0] - b[0])
-    angle = np.abs(radians * 180.0 / np.pi)
-    
-    if angle > 180.0:
-        angle = 360 - angle
-        
-    return angle
-
-def finger_is_extended(landmarks, finger_indices):
-    """检查手指是否伸直 - 基于角度计算"""
-    mcp, pip, dip, tip = finger_indices
-    angle = calculate_angle(landmarks[mcp], landmarks[pip], landmarks[tip])
-    return angle > 160  # 角度大于160度认为是伸直
-
-def thumb_is_extended_up(landmarks):
-    """检查拇指是否向上伸直"""
-    thumb_cmc = landmarks[1]
-    thumb_mcp = landmarks[2] 
-    thumb_ip = landmarks[3]
-    thumb_tip = landmarks[4]
-    
-    # 拇指向上：tip的y坐标应该小于mcp的y坐标
-    vertical_check = thumb_tip.y < thumb_mcp.y - 0.05
-    
-    # 角度检查：拇指应该是伸直的
-    angle = calculate_angle(thumb_mcp, thumb_ip, thumb_tip)
-    straight_check = angle > 150
-    
-    # 方向检查：拇指应该指向上方
-    direction_vector_y = thumb_mcp.y - thumb_tip.y
-    direction_check = direction_vector_y > 0.08
-    
-    return vertical_check and straight_check and direction_check
+# 模拟量速度状态
+palm_reference = None  # 张开手掌时的初始位置，位移相对它计算
+analog_hand = None     # 正在控制速度的手（轨迹 id）
+streaming = False
+analog_command = (0.0, 0.0)
 
-def thumb_is_extended_down(landmarks):
-    """检查拇指是否向下伸直"""
-    thumb_mcp = landmarks[2]
-    thumb_ip = landmarks[3] 
-    thumb_tip = landmarks[4]
-    
-    # 拇指向下：tip的y坐标应该大于mcp的y坐标
-    vertical_check = thumb_tip.y > thumb_mcp.y + 0.05
-    
-    # 角度检查
-    angle = calculate_angle(thumb_mcp, thumb_ip, thumb_tip)
-    straight_check = angle > 150
-    
-    # 方向检查
-    direction_vector_y = thumb_tip.y - thumb_mcp.y  
-    direction_check = direction_vector_y > 0.08
-    
-    return vertical_check and straight_check and direction_check
-
-def is_fist(landmarks):
-    """检测握拳 - 所有手指都弯曲"""
-    finger_indices = [
-        [5, 6, 7, 8],    # 食指
-        [9, 10, 11, 12], # 中指  
-        [13, 14, 15, 16], # 无名指
-        [17, 18, 19, 20]  # 小指
-    ]
-    
-    # 检查所有手指都弯曲
-    all_fingers_bent = True
-    for finger in finger_indices:
-        if finger_is_extended(landmarks, finger):
-            all_fingers_bent = False
-            break
-    
-    # 拇指检查 - 拇指应该贴在其他手指上（不向上也不向下伸直）
-    thumb_not_up = not thumb_is_extended_up(landmarks)
-    thumb_not_down = not thumb_is_extended_down(landmarks)
-    thumb_check = thumb_not_up and thumb_not_down
-    
-    # 额外检查：所有指尖都应该接近手掌
-    fingertips = [8, 12, 16, 20]
-    palm_center = landmarks[0]  # 手腕作为参考
-    tips_close_to_palm = all(
-        abs(landmarks[tip].y - palm_center.y) < 0.15 for tip in fingertips
-    )
-    
-    return all_fingers_bent and thumb_check and tips_close_to_palm
-
-def is_open(landmarks):
-    """检测张开手掌 - 所有手指都伸直分开"""
-    finger_indices = [
-        [5, 6, 7, 8],    # 食指
-        [9, 10, 11, 12], # 中指
-        [13, 14, 15, 16], # 无名指  
-        [17, 18, 19, 20]  # 小指
-    ]
-    
-    # 检查所有手指都伸直
-    all_fingers_extended = all(
-        finger_is_extended(landmarks, finger) for finger in finger_indices
-    )
-    
-    # 拇指也要伸直（但不一定向上）
-    thumb_angle = calculate_angle(landmarks[2], landmarks[3], landmarks[4])
-    thumb_extended = thumb_angle > 140
-    
-    # 检查手指分开程度
-    fingertips = [4, 8, 12, 16, 20]
-    spread_distances = []
-    for i in range(len(fingertips) - 1):
-        dist = abs(landmarks[fingertips[i]].x - landmarks[fingertips[i+1]].x)
-        spread_distances.append(dist)
-    
-    fingers_spread = all(dist > 0.03 for dist in spread_distances)
-    
-    return all_fingers_extended and thumb_extended and fingers_spread
+hand_batch = np.empty((MAX_HANDS, 21, 3))  # 每帧复用的关键点数组，所有手一起分类
 
-def is_thumbs_up(landmarks):
-    """检测竖拇指 - 只有拇指向上，其他手指弯曲"""
-    # 拇指必须向上伸直
-    thumb_up = thumb_is_extended_up(landmarks)
-    
-    # 其他四指必须弯曲
-    finger_indices = [
-        [5, 6, 7, 8],    # 食指
-        [9, 10, 11, 12], # 中指
-        [13, 14, 15, 16], # 无名指
-        [17, 18, 19, 20]  # 小指
-    ]
-    
-    other_fingers_bent = all(
-        not finger_is_extended(landmarks, finger) for finger in finger_indices
-    )
-    
-    # 额外检查：拇指应该是最高的点
-    thumb_tip = landmarks[4]
-    other_fingertips = [8, 12, 16, 20]
-    thumb_highest = all(
-        thumb_tip.y < landmarks[tip].y - 0.03 for tip in other_fingertips
-    )
-    
-    return thumb_up and other_fingers_bent and thumb_highest
+# 推理阶段交给渲染阶段的快照；hands 为每只手的 (id, 左右手, 手势, 证据最强的手势, 证据, 手腕位置)
+HandView = namedtuple('HandView', 'frame landmarks gesture hands')
 
-def is_thumbs_down(landmarks):
-    """检测拇指向下 - 只有拇指向下，其他手指弯曲"""
-    # 拇指必须向下伸直
-    thumb_down = thumb_is_extended_down(landmarks)
-    
-    # 其他四指必须弯曲
-    finger_indices = [
-        [5, 6, 7, 8],    # 食指
-        [9, 10, 11, 12], # 中指
-        [13, 14, 15, 16], # 无名指
-        [17, 18, 19, 20]  # 小指
-    ]
-    
-    other_fingers_bent = all(
-        not finger_is_extended(landmarks, finger) for finger in finger_indices
-    )
-    
-    # 额外检查：拇指应该是最低的点
-    thumb_tip = landmarks[4]
-    other_fingertips = [8, 12, 16, 20]
-    thumb_lowest = all(
-        thumb_tip.y > landmarks[tip].y + 0.03 for tip in other_fingertips
-    )
-    
-    return thumb_down and other_fingers_bent and thumb_lowest
-
-def is_pointing_up(landmarks):
-    """检测竖食指 - 只有食指向上，其他手指弯曲"""
-    # 食指必须伸直向上
-    index_extended = finger_is_extended(landmarks, [5, 6, 7, 8])
-    index_tip = landmarks[8]
-    index_mcp = landmarks[5]
-    index_pointing_up = index_tip.y < index_mcp.y - 0.05
-    
-    # 其他手指必须弯曲（包括拇指）
-    other_finger_indices = [
-        [9, 10, 11, 12], # 中指
-        [13, 14, 15, 16], # 无名指
-        [17, 18, 19, 20]  # 小指
-    ]
-    
-    other_fingers_bent = all(
-        not finger_is_extended(landmarks, finger) for finger in other_finger_indices
-    )
-    
-    # 拇指不能向上伸直
-    thumb_not_up = not thumb_is_extended_up(landmarks)
-    
-    # 食指应该是最高的点
-    other_fingertips = [4, 12, 16, 20]
-    index_highest = all(
-        index_tip.y < landmarks[tip].y - 0.03 for tip in other_fingertips
-    )
-    
-    return index_extended and index_pointing_up and other_fingers_bent and thumb_not_up and index_highest
+def palm_velocity(center, reference):
+    """手掌位移 → (vx, yaw)：向上移前进、向下移后退，左右移转向"""
+    def scale(d):
+        magnitude = (abs(d) - ANALOG_DEADZONE) / (ANALOG_FULL_SCALE - ANALOG_DEADZONE)
+        return math.copysign(min(1.0, magnitude), d) if magnitude > 0 else 0.0
+
+    dx = center[0] - reference[0]
+    dy = reference[1] - center[1]  # 图像 y 轴向下
+    # 画面已镜像：手向右移 x 增大，对应向右转（yawSpeed 为负）
+    return scale(dy) * ANALOG_MAX_VX, -scale(dx) * ANALOG_MAX_YAW
 
 # 修改手势到命令的映射
 def map_gesture_to_command(gesture):
@@ -239,149 +112,249 @@ def map_gesture_to_command(gesture):
     }
     return gesture_map.get(gesture)
 
-while cap.isOpened():
-    success, frame = cap.read()
-    if not success:
-        break
-    
-    frame = cv2.flip(frame, 1)
-    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    result = hands.process(rgb)
-    
+def process_frame(frame, capture_time):
+    """推理阶段：MediaPipe + 分类 + 发送，返回交给渲染阶段的快照"""
+    global palm_reference, analog_hand, streaming, analog_command
+    global displayed_gesture, display_start_time
+
+    # 帧已在采集端镜像；来自共享内存的帧是只读视图，绘制前由渲染阶段复制
     gesture = None
-    confidence_scores = {}
+    hand_landmarks = None
+    handedness = []
     current_time = time.time()
-    
-    if result.multi_hand_landmarks:
-        for hl in result.multi_hand_landmarks:
-            # 绘制手部关键点
-            mp_drawing.draw_landmarks(frame, hl, mp_hands.HAND_CONNECTIONS)
-            
-            # 计算每种手势的置信度（用于调试）
-            confidence_scores = {
-                'fist': is_fist(hl.landmark),
-                'open': is_open(hl.landmark),
-                'thumbs_up': is_thumbs_up(hl.landmark),
-                'thumbs_down': is_thumbs_down(hl.landmark),
-                'pointing_up': is_pointing_up(hl.landmark)
-            }
-            
-            # 严格的优先级检测 - 最特殊的手势优先
-            if confidence_scores['pointing_up']:
-                gesture = 'pointing_up'
-            elif confidence_scores['thumbs_up']:
-                gesture = 'thumbs_up'
-            elif confidence_scores['thumbs_down']:
-                gesture = 'thumbs_down'
-            elif confidence_scores['fist']:
-                gesture = 'fist'
-            elif confidence_scores['open']:
-                gesture = 'open'
-            
-            # 调试信息
-            if debug_mode:
-                print(f"Gesture confidence: {confidence_scores}")
-                if gesture:
-                    print(f"Detected gesture: {gesture}")
-    
-    # 发送手势到服务器
-    if gesture and gesture != last_sent and current_time - last_time_sent > gesture_cooldown:
-        command = map_gesture_to_command(gesture)
-        if command:
-            sock.sendall(command.encode())
-            print(f"[Hand Client] Sent gesture: {gesture} -> {command}")
-            last_sent = gesture
-            last_time_sent = current_time
+
+    planned = model_input.plan(frame)  # None：空闲降频，本帧不运行模型
+    if planned is not None:
+        image, region = planned
+        start = time.perf_counter()
+        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        result = hands.process(rgb)
+        hand_landmarks = result.multi_hand_landmarks
+        elapsed = time.perf_counter() - start
+        points = None
+        if hand_landmarks:
+            hand_landmarks = hand_landmarks[:MAX_HANDS]
+            handedness = [(h.classification[0].label, h.classification[0].score)
+                          for h in result.multi_handedness[:MAX_HANDS]]
+            for hl in hand_landmarks:
+                model_input.to_frame(hl.landmark, region)  # 裁剪/缩放坐标 → 整帧归一化坐标
+            points = np.array([(p.x, p.y) for hl in hand_landmarks for p in hl.landmark])
+        model_input.observe(points, elapsed, region, frame.shape)
+
+    # 所有手一次分类：关键点写入预分配的批量数组，特征/得分各是一次数组运算
+    batch = hand_batch[:len(hand_landmarks) if hand_landmarks else 0]
+    for i, hl in enumerate(hand_landmarks or ()):
+        landmarks_to_array(hl.landmark, batch[i])
+    if model:
+        scores = model.scores(batch)  # 一次矩阵乘法得到每只手所有类别的概率（预分配缓冲区，下一帧覆盖）
+        gestures = [model.label(row)[0] for row in scores]
+    else:
+        features = extract_features(batch)
+        gestures, scores = classify_batch(features)
+
+    # 调试信息
+    if debug_mode and len(batch):
+        for i, hand_gesture in enumerate(gestures):
+            if model:
+                confidence_scores = dict(zip(model.classes, np.round(scores[i], 2).tolist()))
+            else:
+                confidence_scores = dict(zip(GESTURES, gesture_flags(features[i]).tolist()))
+            print(f"Hand {i} gesture confidence: {confidence_scores}")
+            if hand_gesture:
+                print(f"Hand {i} detected gesture: {hand_gesture}")
+
+    # 只有模型运行过的帧才是新证据；空闲跳过的帧不改变判断
+    decisions = []
+    if planned is not None:
+        emissions = tracker.update(batch, handedness, scores, gestures, capture_time)
+        decisions = arbiter.decide(emissions, tracker.visible())
+    visible = tracker.visible()
+    # 主手：策略允许它发出当前手势的第一只手，显示和模拟量速度都跟随它
+    lead = next((t for t in visible if t.gesture and arbiter.allows(t, t.gesture, visible)[0]), None)
+    gesture = lead.gesture if lead else None
+
+    # 录制模型运行过的每一帧（包括没有手的帧），保留时间戳供离线评估
+    # 录的是仲裁器选中的主手；还没有主手时（手势未识别）取最早出现的那只手
+    if recorder and record_label and planned is not None:
+        subject = lead or (visible[0] if visible else None)
+        recorder.add(capture_time, subject.points if subject else None, record_label)
+
+    # 模拟量速度：张开手掌期间每帧发送最新设定点，服务器只保留最新值
+    if ANALOG_VELOCITY and gesture == 'open':
+        center = palm_center(lead.points)
+        if palm_reference is None or analog_hand != lead.id:
+            palm_reference, analog_hand = center, lead.id  # 换了一只手：重新以它的位置为参考
+        analog_command = palm_velocity(center, palm_reference)
+        sender.send_velocity(analog_command[0], 0.0, analog_command[1], capture_time)
+        streaming = True
+    elif streaming:
+        sender.send_velocity(0.0, 0.0, 0.0, capture_time)  # 手掌离开：立即要求停下
+        streaming = False
+        palm_reference = analog_hand = None
+        analog_command = (0.0, 0.0)
+
+    # 每帧调用，按间隔限速；推理线程卡住时心跳随之停止，服务器会让机器人停下
+    sender.heartbeat()
+
+    # 每只手的确认结果都报告；只发送策略接受的（模拟量模式下张开手掌不再发送 open）
+    for decision in decisions:
+        hand = f"hand #{decision.track_id} ({decision.handedness})"
+        command = map_gesture_to_command(decision.gesture)
+        if not decision.accepted:
+            print(f"[Hand Client] {hand} {decision.gesture} ignored: {decision.reason}")
+        elif command and not (ANALOG_VELOCITY and decision.gesture == 'open'):
+            sender.send(command, capture_time)
+            print(f"[Hand Client] {hand} sent gesture: {decision.gesture} -> {command} ({decision.reason})")
             
             # 设置显示效果
-            displayed_gesture = f"{gesture} -> {command}"
+            displayed_gesture = f"{decision.gesture} -> {command}"
             display_start_time = current_time
-    
-    # 确定当前显示的手势和颜色
-    current_display_gesture = None
-    text_color = (128, 128, 128)  # 默认灰色
-    
-    if displayed_gesture and display_start_time:
-        if current_time - display_start_time < display_duration:
-            # 在显示持续时间内，显示绿色
-            current_display_gesture = displayed_gesture
-            text_color = (0, 255, 0)  # 绿色
-        else:
-            # 超过显示时间，清除显示
-            displayed_gesture = None
-            display_start_time = None
-    
-    # 如果没有显示的手势，显示当前检测状态
-    if not current_display_gesture:
-        current_display_gesture = gesture if gesture else "None"
-        if gesture:
-            text_color = (0, 255, 255)  # 黄色表示检测到但未发送
-        else:
-            text_color = (128, 128, 128)  # 灰色表示无检测
-    
-    # 显示主要手势信息
-    gesture_text = f"Gesture: {current_display_gesture}"
-    cv2.putText(frame, gesture_text, (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, text_color, 2)
-    
-    # 显示手势说明 - 更新为新的映射
-    instructions = [
-        "Hand Gestures:",
-        "Open Hand: Move Forward",
-        "Fist: Move Backward", 
-        "Thumbs Up: Stand",
-        "Thumbs Down: Sit",
-        "Point Up: Stop Movement",
-        "",
-        "Instructions:",
-        "- Show clear gestures",
-        "- Hold for 1-2 seconds",
-        "- Good lighting helps",
-        "",
-        "Colors:",
-        "Green = Action sent",
-        "Yellow = Detected", 
-        "Gray = No gesture"
-    ]
-    
-    for i, instruction in enumerate(instructions):
-        if instruction == "":  # 空行
-            continue
-        color = (255, 255, 255)
-        if "Green" in instruction:
-            color = (0, 255, 0)
-        elif "Yellow" in instruction:
-            color = (0, 255, 255)
-        elif "Gray" in instruction:
-            color = (128, 128, 128)
-        elif "Open Hand" in instruction:
-            color = (0, 255, 0)  # 绿色
-        elif "Fist" in instruction:
-            color = (0, 0, 255)  # 红色
-        elif "Thumbs Up" in instruction:
-            color = (255, 255, 0)  # 青色
-        elif "Thumbs Down" in instruction:
-            color = (0, 165, 255)  # 橙色
-        elif "Point Up" in instruction:
-            color = (128, 0, 128)  # 紫色
-            
-        cv2.putText(frame, instruction, (400, 50 + i * 20), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 1)
-    
-    # 显示连接状态
-    cv2.putText(frame, "Connected to server", (20, 80), 
-               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
-    
-    # 显示冷却状态
-    time_since_last = current_time - last_time_sent
-    if time_since_last < gesture_cooldown:
-        cooldown_text = f"Cooldown: {gesture_cooldown - time_since_last:.1f}s"
-        cv2.putText(frame, cooldown_text, (20, 110), 
+
+    hand_states = [(t.id, t.handedness, t.gesture) + t.decoder.confidence() + (tuple(t.points[0, :2].tolist()),)
+                   for t in visible]
+    return HandView(frame, hand_landmarks, gesture, hand_states)
+
+# 手势说明（静态，只渲染一次）
+INSTRUCTIONS = [
+    "Hand Gestures:",
+    "Open Hand: Move Forward",
+    "Fist: Move Backward",
+    "Thumbs Up: Stand",
+    "Thumbs Down: Sit",
+    "Point Up: Stop Movement",
+    "",
+    "Instructions:",
+    "- Show clear gestures",
+    "- Hold until it turns green",
+    "- Good lighting helps",
+    "",
+    "Colors:",
+    "Green = Action sent",
+    "Yellow = Detected",
+    "Gray = No gesture"
+]
+
+def instruction_color(instruction):
+    """说明文字的颜色（只在构建静态叠加层时调用一次）"""
+    color = (255, 255, 255)
+    if "Green" in instruction:
+        color = (0, 255, 0)
+    elif "Yellow" in instruction:
+        color = (0, 255, 255)
+    elif "Gray" in instruction:
+        color = (128, 128, 128)
+    elif "Open Hand" in instruction:
+        color = (0, 255, 0)  # 绿色
+    elif "Fist" in instruction:
+        color = (0, 0, 255)  # 红色
+    elif "Thumbs Up" in instruction:
+        color = (255, 255, 0)  # 青色
+    elif "Thumbs Down" in instruction:
+        color = (0, 165, 255)  # 橙色
+    elif "Point Up" in instruction:
+        color = (128, 0, 128)  # 紫色
+    return color
+
+overlay = StaticOverlay()
+overlay.add_lines([(line, instruction_color(line)) for line in INSTRUCTIONS], (400, 50), 20, 0.45)
+overlay.add_lines([("Connected to server", (0, 255, 0))], (20, 80), scale=0.5)
+
+def render_frame(view):
+    """渲染阶段（主线程）：绘制并显示最新快照；view 为 None 时只处理按键。返回 False 退出"""
+    global ANALOG_VELOCITY
+    if view is not None:
+        frame = view.frame if view.frame.flags.writeable else view.frame.copy()
+        current_time = time.time()
+        
+        # 绘制手部关键点
+        for hl in view.landmarks or ():
+            mp_drawing.draw_landmarks(frame, hl, mp_hands.HAND_CONNECTIONS)
+        
+        # 确定当前显示的手势和颜色
+        current_display_gesture = None
+        text_color = (128, 128, 128)  # 默认灰色
+    
+        if displayed_gesture and display_start_time:
+            if current_time - display_start_time < display_duration:
+                # 在显示持续时间内，显示绿色
+                current_display_gesture = displayed_gesture
+                text_color = (0, 255, 0)  # 绿色
+    
+        # 如果没有显示的手势，显示当前检测状态
+        if not current_display_gesture:
+            current_display_gesture = view.gesture if view.gesture else "None"
+            if view.gesture:
+                text_color = (0, 255, 255)  # 黄色表示检测到但未发送
+            else:
+                text_color = (128, 128, 128)  # 灰色表示无检测
+    
+        # 显示主要手势信息
+        gesture_text = f"Gesture: {current_display_gesture}"
+        cv2.putText(frame, gesture_text, (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, text_color, 2)
+    
+        # 静态说明文字和连接状态：启动时渲染一次，每帧一次掩码拷贝
+        overlay.apply(frame)
+    
+        # 显示模拟量速度状态
+        if ANALOG_VELOCITY:
+            analog_text = f"Analog (V): vx={analog_command[0]:+.2f} yaw={analog_command[1]:+.2f}"
+            cv2.putText(frame, analog_text, (20, 140),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0) if streaming else (128, 128, 128), 1)
+
+        # 录制状态
+        if recorder:
+            record_text = f"REC {record_label} ({len(recorder.labels)} frames)" if record_label else \
+                "REC paused: " + " ".join(f"{i}={label}" for i, label in enumerate(RECORD_LABELS, 1))
+            cv2.putText(frame, record_text, (20, 170),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255) if record_label else (128, 128, 128), 1)
+
+        # 每只手：id、左右手、当前手势和最强手势的证据（达到阈值时确认）
+        height, width = frame.shape[:2]
+        for hand_id, side, hand_gesture, top_gesture, evidence, (x, y) in view.hands:
+            hand_text = f"#{hand_id} {side}: {hand_gesture or '-'} ({top_gesture} {evidence:.2f})"
+            cv2.putText(frame, hand_text, (int(x * width) - 60, int(y * height) + 25),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1)
+        policy_text = f"Policy: {HAND_POLICY} ({len(view.hands)} hands)"
+        cv2.putText(frame, policy_text, (20, 110),
                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1)
     
-    cv2.imshow("Hand Gesture Client", frame)
-    if cv2.waitKey(5) & 0xFF == 27:  # ESC键退出
-        break
+        cv2.imshow("Hand Gesture Client", frame)
+
+    key = cv2.waitKey(1) & 0xFF  # 渲染频率由流水线控制，这里只轮询按键
+    if key == 27:  # ESC键退出
+        return False
+    if key in (ord('v'), ord('V')) and USE_BINARY_PROTOCOL:
+        ANALOG_VELOCITY = not ANALOG_VELOCITY
+        print(f"[Hand Client] Analog velocity mode {'on' if ANALOG_VELOCITY else 'off'}")
+    if recorder and ord('0') <= key <= ord('9'):
+        set_record_label(parse_label(chr(key), RECORD_LABELS))
+    return True
+
+def set_record_label(label):
+    global record_label
+    record_label = label
+    print(f"[Hand Client] Recording {record_label}" if record_label else "[Hand Client] Recording paused")
+
+# 无显示器录制：没有按键，从标准输入切换标签
+if recorder and HEADLESS:
+    print(f"[Hand Client] Recording {record_label or 'paused'}; type a label (" +
+          " ".join(f"{i}={label}" for i, label in enumerate(RECORD_LABELS, 1)) + ", 0 pauses) and Enter")
+    read_labels(RECORD_LABELS, set_record_label)
 
-cap.release()
-sock.close()
-cv2.destroyAllWindows()
+# 采集、推理、渲染分为三个阶段，阶段之间只保留最新的一项
+pipeline = VisionPipeline(cap, process_frame, None if HEADLESS else render_frame, RENDER_FPS, name='hand')
+try:
+    pipeline.run()
+except KeyboardInterrupt:
+    pass
+finally:
+    print(f"[Hand Client] {pipeline.summary()}")
+    print(f"[Hand Client] {model_input.summary()}")
+    print(f"[Hand Client] {tracker.summary()}; {arbiter.summary()}")
+    if recorder:
+        counts = recorder.counts()
+        print(f"[Hand Client] Recorded {counts}; {recorder.path} now holds {recorder.save()} frames")
+    cap.release()
+    sock.close()
+    if not HEADLESS:
+        cv2.destroyAllWindows()
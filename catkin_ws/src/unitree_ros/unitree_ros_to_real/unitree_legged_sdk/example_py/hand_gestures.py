@@ -0,0 +1,494 @@
+"""Hand gesture classification from the 21 MediaPipe hand landmarks.
+
+The landmarks are converted once per frame into a (21, 3) array and
+``extract_features`` computes every joint angle, fingertip height and
+fingertip spread the predicates need in one NumPy pass. ``gesture_flags``
+then evaluates all gestures against that feature vector at once; both work
+on a leading batch axis too, e.g. (hands, 21, 3). ``GestureDecoder`` turns
+the per-frame results into commands by accumulating evidence over time.
+
+Only NumPy is needed, so the classifier can be benchmarked without a camera:
+
+    python hand_gestures.py                 # per-frame timing vs. the per-landmark functions
+    python hand_gestures.py --frames 50000
+    python hand_gestures.py --decoder       # decoder presets vs. the old 1 s cooldown
+"""
+
+import argparse
+import math
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+# 检测优先级：最特殊的手势优先
+GESTURES = ('pointing_up', 'thumbs_up', 'thumbs_down', 'fist', 'open')
+
+WRIST = 0
+THUMB = (1, 2, 3, 4)        # cmc, mcp, ip, tip
+FINGERS = ((5, 6, 7, 8),    # 食指 mcp, pip, dip, tip
+           (9, 10, 11, 12),   # 中指
+           (13, 14, 15, 16),  # 无名指
+           (17, 18, 19, 20))  # 小指
+TIPS = (4, 8, 12, 16, 20)
+
+# 角度三元组 (a, b, c)：在 b 处的夹角。四指用 mcp-pip-tip，拇指用 mcp-ip-tip
+ANGLE_JOINTS = tuple((f[0], f[1], f[3]) for f in FINGERS) + ((2, 3, 4),)
+Y_JOINTS = TIPS + (2, 5, WRIST)  # 特征中直接取 y 坐标的关键点
+
+
+def _landmark_rows():
+    """(22, 21) 矩阵：乘以 (21, 2) 关键点一次得到全部边向量、指尖 x 差和所需 y。"""
+    def row(*terms):
+        r = np.zeros(21)
+        for joint, weight in terms:
+            r[joint] += weight
+        return r
+    rows = []
+    for a, b, c in ANGLE_JOINTS:                         # 0-9: a - b, c - b
+        rows += [row((a, 1), (b, -1)), row((c, 1), (b, -1))]
+    rows += [row((TIPS[i + 1], 1), (TIPS[i], -1)) for i in range(4)]  # 10-13: 相邻指尖 x 差
+    rows += [row((joint, 1)) for joint in Y_JOINTS]      # 14-21: y
+    return np.array(rows)
+
+LANDMARK_ROWS = _landmark_rows()
+
+# 特征向量布局
+F_ANGLE = slice(0, 5)       # 食指、中指、无名指、小指、拇指的角度（度）
+F_TIP_Y = slice(5, 10)      # 拇指、食指、中指、无名指、小指指尖的 y
+F_THUMB_MCP_Y = 10
+F_INDEX_MCP_Y = 11
+F_WRIST_Y = 12
+F_SPREAD = slice(13, 17)    # 相邻指尖的水平距离
+N_FEATURES = 17
+
+EXTENDED_ANGLE = 160        # 手指伸直的角度阈值
+THUMB_STRAIGHT_ANGLE = 150
+THUMB_OPEN_ANGLE = 140
+THUMB_RISE = 0.08           # 拇指指尖相对 mcp 的竖直距离
+POINT_RISE = 0.05           # 食指指尖高于 mcp 的距离
+TIP_MARGIN = 0.03           # "最高/最低指尖" 的余量
+FIST_REACH = 0.15           # 握拳时指尖到手腕的最大竖直距离
+MIN_SPREAD = 0.03           # 张开手掌时相邻指尖的最小水平距离
+
+_TIP_Y = list(range(5, 10))
+_FINGER_NAMES = ('index', 'middle', 'ring', 'pinky')
+
+# 每个条件是特征的线性组合：sum(weight * feature) > threshold
+CONDITIONS = (
+    [(f'{name}_extended', {i: 1}, EXTENDED_ANGLE) for i, name in enumerate(_FINGER_NAMES)]
+    + [('thumb_straight', {4: 1}, THUMB_STRAIGHT_ANGLE),
+       ('thumb_open', {4: 1}, THUMB_OPEN_ANGLE),
+       ('thumb_rise_up', {F_THUMB_MCP_Y: 1, _TIP_Y[0]: -1}, THUMB_RISE),
+       ('thumb_rise_down', {_TIP_Y[0]: 1, F_THUMB_MCP_Y: -1}, THUMB_RISE),
+       ('index_above_mcp', {F_INDEX_MCP_Y: 1, _TIP_Y[1]: -1}, POINT_RISE)]
+    + [(f'index_above_{j}', {t: 1, _TIP_Y[1]: -1}, TIP_MARGIN)
+       for j, t in zip(('thumb',) + _FINGER_NAMES[1:], [_TIP_Y[0]] + _TIP_Y[2:])]
+    + [(f'thumb_above_{j}', {t: 1, _TIP_Y[0]: -1}, TIP_MARGIN) for j, t in zip(_FINGER_NAMES, _TIP_Y[1:])]
+    + [(f'thumb_below_{j}', {_TIP_Y[0]: 1, t: -1}, TIP_MARGIN) for j, t in zip(_FINGER_NAMES, _TIP_Y[1:])]
+    # |tip - wrist| < reach 拆成两个单边条件
+    + [(f'{j}_near_wrist_{side}', {t: sign, F_WRIST_Y: -sign}, -FIST_REACH)
+       for j, t in zip(_FINGER_NAMES, _TIP_Y[1:]) for side, sign in (('above', 1), ('below', -1))]
+    + [(f'spread_{i}', {F_SPREAD.start + i: 1}, MIN_SPREAD) for i in range(4)]
+)
+# 由线性条件组合出的合取条件（拇指向上/向下），排在 CONDITIONS 之后
+COMPOUND = (('thumb_up', ('thumb_straight', 'thumb_rise_up')),
+            ('thumb_down', ('thumb_straight', 'thumb_rise_down')))
+
+_BENT = tuple(f'!{name}_extended' for name in _FINGER_NAMES)
+# 每个手势需要的条件，'!' 表示必须不成立
+RULES = {
+    'pointing_up': ('index_extended', 'index_above_mcp', '!thumb_up') + _BENT[1:]
+                   + tuple(f'index_above_{j}' for j in ('thumb',) + _FINGER_NAMES[1:]),
+    'thumbs_up': ('thumb_up',) + _BENT + tuple(f'thumb_above_{j}' for j in _FINGER_NAMES),
+    'thumbs_down': ('thumb_down',) + _BENT + tuple(f'thumb_below_{j}' for j in _FINGER_NAMES),
+    'fist': ('!thumb_up', '!thumb_down') + _BENT
+            + tuple(f'{j}_near_wrist_{side}' for j in _FINGER_NAMES for side in ('above', 'below')),
+    'open': tuple(f'{name}_extended' for name in _FINGER_NAMES) + ('thumb_open',)
+            + tuple(f'spread_{i}' for i in range(4)),
+}
+
+
+def _build_tables():
+    names = [c[0] for c in CONDITIONS] + [c[0] for c in COMPOUND]
+    weights = np.zeros((N_FEATURES, len(CONDITIONS)))
+    for column, (_, terms, _) in enumerate(CONDITIONS):
+        for feature, weight in terms.items():
+            weights[feature, column] = weight
+    thresholds = np.array([c[2] for c in CONDITIONS])
+    compound = tuple(np.array([names.index(parts[i]) for _, parts in COMPOUND]) for i in range(2))
+    # 规则矩阵：必须成立 +1、必须不成立 -1；得分等于"必须成立"的个数时手势成立
+    rules = np.zeros((len(names), len(GESTURES)))
+    for column, gesture in enumerate(GESTURES):
+        for term in RULES[gesture]:
+            rules[names.index(term.lstrip('!')), column] = -1 if term.startswith('!') else 1
+    return weights, thresholds, compound, rules, (rules > 0).sum(axis=0)
+
+CONDITION_WEIGHTS, CONDITION_THRESHOLDS, COMPOUND_INDEX, RULE_MATRIX, RULE_REQUIRED = _build_tables()
+
+
+def landmarks_to_array(landmarks, out=None):
+    """MediaPipe landmark list → (21, 3) float array (x, y, z)."""
+    if out is None:
+        out = np.empty((len(landmarks), 3))
+    out.flat[:] = [c for p in landmarks for c in (p.x, p.y, p.z)]
+    return out
+
+
+def extract_features(points):
+    """(..., 21, 3) landmarks → (..., N_FEATURES) feature vectors."""
+    # 权重只有 ±1/0，矩阵乘法与逐点相减结果完全相同
+    linear = LANDMARK_ROWS @ np.asarray(points)[..., :2]
+    # 与 calculate_angle 相同的公式，一次算出全部 5 个关节
+    direction = np.arctan2(linear[..., :10, 1], linear[..., :10, 0])
+    angle = np.abs((direction[..., 1::2] - direction[..., 0::2]) * 180.0 / np.pi)
+    return np.concatenate([np.minimum(angle, 360 - angle), linear[..., 14:, 1],
+                           np.abs(linear[..., 10:14, 0])], axis=-1)
+
+
+def gesture_flags(features):
+    """(..., N_FEATURES) → (..., len(GESTURES)) booleans, one column per gesture.
+
+    Every rule is evaluated at once: one matmul for the linear conditions,
+    one for the rule table.
+    """
+    conditions = features @ CONDITION_WEIGHTS > CONDITION_THRESHOLDS
+    first, second = COMPOUND_INDEX
+    conditions = np.concatenate([conditions, conditions[..., first] & conditions[..., second]], axis=-1)
+    return conditions @ RULE_MATRIX == RULE_REQUIRED
+
+
+def classify(features):
+    """Highest-priority gesture for one hand, or None."""
+    for gesture, hit in zip(GESTURES, gesture_flags(features).tolist()):
+        if hit:
+            return gesture
+    return None
+
+
+def classify_batch(features):
+    """(hands, N_FEATURES) → (gestures, scores): highest-priority gesture per hand and its one-hot rows."""
+    flags = gesture_flags(features)
+    first = flags.argmax(axis=-1)  # 第一个成立的手势即优先级最高的
+    hit = flags[np.arange(len(flags)), first]
+    scores = np.zeros(flags.shape)
+    scores[hit, first[hit]] = 1.0
+    return [GESTURES[i] if h else None for i, h in zip(first.tolist(), hit.tolist())], scores
+
+
+def palm_center(points):
+    """手掌中心：手腕和四个掌指关节的平均位置 (x, y)"""
+    x, y = points[[0, 5, 9, 13, 17], :2].mean(axis=0)
+    return float(x), float(y)
+
+
+# ========== Temporal decoding ==========
+
+# 证据时间常数（秒）、触发阈值、释放阈值：越快越容易被噪声触发
+DECODER_PRESETS = {
+    'fast': (0.08, 0.6, 0.3),
+    'balanced': (0.12, 0.7, 0.3),
+    'strict': (0.2, 0.85, 0.4),
+}
+
+
+def one_hot(gesture, classes=GESTURES):
+    """Per-frame score vector for a single classified gesture (or None)."""
+    scores = np.zeros(len(classes))
+    if gesture is not None:
+        scores[classes.index(gesture)] = 1.0
+    return scores
+
+
+class GestureDecoder:
+    """Accumulates per-gesture evidence over frames and emits on confidence.
+
+    Evidence is an exponential moving average of the per-frame scores with
+    time constant ``tau``, so it does not depend on the frame rate; a frame
+    that arrives after a long gap counts as at most ``max_dt`` seconds. A
+    gesture is emitted when its evidence reaches ``on`` and is the largest,
+    and stays latched until its evidence drops below ``off``. A clean
+    gesture therefore fires after about ``-tau * ln(1 - on)`` seconds, a
+    noisy one later or not at all, a single stray frame never, and the same
+    gesture can fire again once it has been released. ``classes`` names the
+    score columns (e.g. a trained GestureModel's classes).
+    """
+
+    def __init__(self, tau=0.12, on=0.7, off=0.3, max_dt=0.1, history=1000, classes=GESTURES):
+        if not 0.0 <= off < on <= 1.0:
+            raise ValueError(f"need 0 <= off < on <= 1, got off={off} on={on}")
+        self.tau = tau
+        self.on = on
+        self.off = off
+        self.max_dt = max_dt
+        self.classes = tuple(classes)
+        self.evidence = np.zeros(len(self.classes))
+        self.active = None   # 当前锁存的手势索引
+        self.emitted = 0
+        self.latency = deque(maxlen=history)  # 秒，手势首次出现 → 发出
+        self._onset = [None] * len(self.classes)
+        self._last = None
+
+    @classmethod
+    def preset(cls, name, classes=GESTURES):
+        tau, on, off = DECODER_PRESETS[name]
+        return cls(tau, on, off, classes=classes)
+
+    def reset(self):
+        self.evidence[:] = 0.0
+        self.active = None
+        self._onset = [None] * len(self.classes)
+        self._last = None
+
+    def update(self, scores, now):
+        """Feed one frame's scores (aligned with ``classes``); returns the emitted gesture or None."""
+        dt = self.max_dt if self._last is None else min(max(0.0, now - self._last), self.max_dt)
+        self._last = now
+        self.evidence += (1.0 - math.exp(-dt / self.tau)) * (scores - self.evidence)
+
+        evidence = self.evidence.tolist()
+        for i, score in enumerate(scores.tolist()):
+            if score > 0.5 and self._onset[i] is None:
+                self._onset[i] = now       # 证据开始积累
+            elif evidence[i] < self.off and score <= 0.5:
+                self._onset[i] = None      # 证据已消退，下一次重新计时
+
+        if self.active is not None and evidence[self.active] < self.off:
+            self.active = None  # 释放后同一手势可以再次触发
+        best = max(range(len(evidence)), key=evidence.__getitem__)
+        if evidence[best] < self.on or best == self.active:
+            return None
+        self.active = best
+        self.emitted += 1
+        if self._onset[best] is not None:
+            self.latency.append(now - self._onset[best])
+        return self.classes[best]
+
+    def confidence(self):
+        """(gesture, evidence) of the strongest gesture right now."""
+        best = int(self.evidence.argmax())
+        return self.classes[best], float(self.evidence[best])
+
+    def stats(self):
+        latency = sorted(self.latency)
+        mean = sum(latency) / len(latency) * 1000 if latency else 0.0
+        p95 = latency[min(len(latency) - 1, int(0.95 * len(latency)))] * 1000 if latency else 0.0
+        return {'emitted': self.emitted, 'latency_ms_mean': mean, 'latency_ms_p95': p95}
+
+    def summary(self):
+        s = self.stats()
+        return (f"decoder emitted {s['emitted']} gestures, decision latency "
+                f"{s['latency_ms_mean']:.0f} ms (p95 {s['latency_ms_p95']:.0f})")
+
+
+# ========== Per-landmark reference (the original hand_client predicates) ==========
+# 仅用于基准对比和一致性检查
+
+def _calculate_angle(a, b, c):
+    a = np.array([a.x, a.y])
+    b = np.array([b.x, b.y])
+    c = np.array([c.x, c.y])
+    radians = np.arctan2(c[1] - b[1], c[0] - b[0]) - np.arctan2(a[1] - b[1], a[0] - b[0])
+    angle = np.abs(radians * 180.0 / np.pi)
+    if angle > 180.0:
+        angle = 360 - angle
+    return angle
+
+def _finger_is_extended(landmarks, finger):
+    mcp, pip, dip, tip = finger
+    return _calculate_angle(landmarks[mcp], landmarks[pip], landmarks[tip]) > 160
+
+def _thumb_is_extended_up(landmarks):
+    mcp, ip, tip = landmarks[2], landmarks[3], landmarks[4]
+    return (tip.y < mcp.y - 0.05 and _calculate_angle(mcp, ip, tip) > 150
+            and mcp.y - tip.y > 0.08)
+
+def _thumb_is_extended_down(landmarks):
+    mcp, ip, tip = landmarks[2], landmarks[3], landmarks[4]
+    return (tip.y > mcp.y + 0.05 and _calculate_angle(mcp, ip, tip) > 150
+            and tip.y - mcp.y > 0.08)
+
+def _is_fist(landmarks):
+    return (not any(_finger_is_extended(landmarks, f) for f in FINGERS)
+            and not _thumb_is_extended_up(landmarks) and not _thumb_is_extended_down(landmarks)
+            and all(abs(landmarks[tip].y - landmarks[0].y) < 0.15 for tip in TIPS[1:]))
+
+def _is_open(landmarks):
+    return (all(_finger_is_extended(landmarks, f) for f in FINGERS)
+            and _calculate_angle(landmarks[2], landmarks[3], landmarks[4]) > 140
+            and all(abs(landmarks[TIPS[i]].x - landmarks[TIPS[i + 1]].x) > 0.03 for i in range(4)))
+
+def _is_thumbs_up(landmarks):
+    return (_thumb_is_extended_up(landmarks)
+            and all(not _finger_is_extended(landmarks, f) for f in FINGERS)
+            and all(landmarks[4].y < landmarks[tip].y - 0.03 for tip in TIPS[1:]))
+
+def _is_thumbs_down(landmarks):
+    return (_thumb_is_extended_down(landmarks)
+            and all(not _finger_is_extended(landmarks, f) for f in FINGERS)
+            and all(landmarks[4].y > landmarks[tip].y + 0.03 for tip in TIPS[1:]))
+
+def _is_pointing_up(landmarks):
+    return (_finger_is_extended(landmarks, FINGERS[0]) and landmarks[8].y < landmarks[5].y - 0.05
+            and all(not _finger_is_extended(landmarks, f) for f in FINGERS[1:])
+            and not _thumb_is_extended_up(landmarks)
+            and all(landmarks[8].y < landmarks[tip].y - 0.03 for tip in (4, 12, 16, 20)))
+
+REFERENCE_PREDICATES = (_is_pointing_up, _is_thumbs_up, _is_thumbs_down, _is_fist, _is_open)
+
+def reference_classify(landmarks):
+    """Original per-frame path: all five predicates, then the priority order."""
+    scores = [predicate(landmarks) for predicate in REFERENCE_PREDICATES]
+    for gesture, hit in zip(GESTURES, scores):
+        if hit:
+            return gesture
+    return None
+
+
+# ========== Synthetic hands (benchmarks without a camera) ==========
+
+Landmark = namedtuple('Landmark', 'x y z')
+
+_FINGER_BASES = ((0.42, 0.60), (0.48, 0.58), (0.54, 0.59), (0.60, 0.62))
+_THUMB_POSES = {  # 拇指 ip, tip 相对 mcp (0.40, 0.68) 的位置
+    'open': ((-0.04, -0.04), (-0.08, -0.08)),
+    'up': ((0.0, -0.06), (0.0, -0.12)),
+    'down': ((0.0, 0.06), (0.0, 0.12)),
+    'tucked': ((0.04, -0.02), (0.07, -0.02)),
+}
+_POSES = {  # gesture: (伸直的手指, 拇指姿态)
+    'open': ((True, True, True, True), 'open'),
+    'fist': ((False, False, False, False), 'tucked'),
+    'thumbs_up': ((False, False, False, False), 'up'),
+    'thumbs_down': ((False, False, False, False), 'down'),
+    'pointing_up': ((True, False, False, False), 'tucked'),
+}
+
+
+def synthetic_hand(gesture, rng, noise=0.004):
+    """(21, 3) landmarks for ``gesture`` (a GESTURES name, or None for random points)."""
+    if gesture is None:
+        return rng.uniform(0.2, 0.8, (21, 3))
+    extended, thumb = _POSES[gesture]
+    points = np.zeros((21, 3))
+    points[WRIST, :2] = (0.5, 0.75)
+    points[1, :2] = (0.45, 0.72)
+    points[2, :2] = (0.40, 0.68)
+    for joint, offset in zip((3, 4), _THUMB_POSES[thumb]):
+        points[joint, :2] = points[2, :2] + offset
+    for i, (finger, base) in enumerate(zip(FINGERS, _FINGER_BASES)):
+        mcp = np.array(base)
+        if extended[i]:
+            dx = (i - 1.5) * 0.01  # 手指呈扇形张开
+            offsets = ((dx, -0.05), (2 * dx, -0.085), (3 * dx, -0.115))
+        else:
+            offsets = ((0.0, -0.04), (0.01, -0.02), (0.01, 0.03))
+        points[finger[0], :2] = mcp
+        for joint, offset in zip(finger[1:], offsets):
+            points[joint, :2] = mcp + offset
+    shift = rng.uniform(-0.1, 0.1, 2)
+    points[:, :2] += shift + rng.normal(0.0, noise, (21, 2))
+    return points
+
+
+def _cooldown_decoder(cooldown=1.0):
+    """The original hand_client rule: send on any frame that differs from the last sent, 1 s apart."""
+    state = {'last': None, 'time': -math.inf}
+
+    def update(gesture, now):
+        if gesture and gesture != state['last'] and now - state['time'] > cooldown:
+            state['last'], state['time'] = gesture, now
+            return gesture
+        return None
+    return update
+
+
+def decoder_benchmark(rng, flip, segments=400, fps=30.0):
+    """Replay noisy per-frame labels of held gestures through each decision rule.
+
+    Every segment holds a different gesture (or no hand) than the last for 0.4-1.5 s; each frame is
+    replaced by a random other label with probability ``flip``. An emission
+    of the held gesture is a hit (latency from segment start), anything else
+    or a second emission in the same segment is a false command.
+    """
+    choices = list(GESTURES) + [None]
+    frames, label = [], None
+    for index in range(segments):
+        label = choices[(choices.index(label) + rng.integers(1, len(choices))) % len(choices)]  # 与上一段不同
+        frames += [(index, label)] * int(rng.uniform(0.4, 1.5) * fps)
+    noisy = [choices[rng.integers(len(choices))] if rng.random() < flip else label for _, label in frames]
+    held = sum(1 for i in range(segments) if any(idx == i and label for idx, label in frames))
+
+    rules = [('cooldown 1.0s', _cooldown_decoder())]
+    for name in DECODER_PRESETS:
+        decoder = GestureDecoder.preset(name)
+        rules.append((name, lambda gesture, now, d=decoder: d.update(one_hot(gesture), now)))
+
+    print(f"[Decoder] {segments} held segments ({held} with a gesture), {len(frames)} frames "
+          f"at {fps:.0f} fps, {flip:.0%} of frames misclassified")
+    for name, update in rules:
+        hits, false, latency, fired = 0, 0, [], set()
+        start = None
+        for n, ((index, label), observed) in enumerate(zip(frames, noisy)):
+            now = n / fps
+            if n == 0 or frames[n - 1][0] != index:
+                start = now
+            emitted = update(observed, now)
+            if emitted is None:
+                continue
+            if emitted == label and index not in fired:
+                hits += 1
+                latency.append(now - start)
+                fired.add(index)
+            else:
+                false += 1
+        mean = sum(latency) / len(latency) * 1000 if latency else 0.0
+        print(f"[Decoder] {name:14s} hits {hits:4d}/{held} ({hits / max(1, held):5.1%}), "
+              f"false commands {false:4d}, latency {mean:4.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame hand classification benchmark")
+    parser.add_argument('--frames', type=int, default=20000)
+    parser.add_argument('--noise', type=float, default=0.004, help="landmark noise (normalized units)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--decoder', action='store_true', help="benchmark the temporal decoder instead")
+    parser.add_argument('--flip', type=float, default=0.1, help="decoder: per-frame misclassification rate")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.decoder:
+        decoder_benchmark(rng, args.flip)
+        return
+    labels = [GESTURES[i] if i < len(GESTURES) else None
+              for i in rng.integers(0, len(GESTURES) + 1, args.frames)]
+    hands = [[Landmark(*p) for p in synthetic_hand(label, rng, args.noise).tolist()] for label in labels]
+
+    start = time.perf_counter()
+    reference = [reference_classify(hand) for hand in hands]
+    reference_time = time.perf_counter() - start
+
+    buf = np.empty((21, 3))
+    start = time.perf_counter()
+    vectorized = [classify(extract_features(landmarks_to_array(hand, buf))) for hand in hands]
+    vectorized_time = time.perf_counter() - start
+
+    points = np.array([[tuple(p) for p in hand] for hand in hands])
+    start = time.perf_counter()
+    flags = gesture_flags(extract_features(points))
+    batched_time = time.perf_counter() - start
+    batched = [GESTURES[row.argmax()] if row.any() else None for row in flags]
+
+    agree = sum(r == v == b for r, v, b in zip(reference, vectorized, batched))
+    correct = sum(r == label for r, label in zip(reference, labels))
+    print(f"[Hand] {args.frames} frames, reference matches synthetic label on {correct / args.frames:.1%}")
+    print(f"[Hand] per-landmark predicates: {reference_time / args.frames * 1e6:7.1f} us/frame")
+    print(f"[Hand] vectorized features:     {vectorized_time / args.frames * 1e6:7.1f} us/frame "
+          f"({reference_time / vectorized_time:.1f}x)")
+    print(f"[Hand] one batch of all frames: {batched_time / args.frames * 1e6:7.2f} us/frame "
+          f"(features + flags, excluding landmark conversion)")
+    print(f"[Hand] agreement {agree}/{args.frames}")
+
+
+if __name__ == '__main__':
+    main()
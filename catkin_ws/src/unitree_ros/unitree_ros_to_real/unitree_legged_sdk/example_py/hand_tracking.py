@@ -0,0 +1,206 @@
+"""Stable per-hand identities and the policy that decides which hand commands.
+
+MediaPipe returns the hands of a frame in no particular order, so
+``HandTracker`` matches them to the previous frame's hands by palm
+position (greedy nearest match, a handedness mismatch costs extra) and
+gives each track its own GestureDecoder: two hands, or two operators,
+accumulate evidence separately instead of overwriting each other.
+
+``HandArbiter`` turns the per-hand emissions into commands under one
+explicit policy:
+
+    dominant   only the dominant hand commands (a hand alone in view always does)
+    agree      a command needs every visible hand, at least two, on the same gesture
+    per_hand   each hand has its own command set (e.g. right moves, left sets posture)
+    any        every hand commands
+
+The stop gesture (``pointing_up``) is accepted from any hand under every
+policy. The trained model's ``none`` class is never a command.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from hand_gestures import GestureDecoder
+from landmark_sequences import NONE_LABEL
+
+POLICIES = ('dominant', 'agree', 'per_hand', 'any')
+DOMINANT_HAND = 'Right'
+STOP_GESTURE = 'pointing_up'  # 任何策略下任何一只手都能让机器人停下
+# per_hand 策略：右手控制移动，左手控制姿态
+HAND_COMMAND_SETS = {
+    'Right': ('open', 'fist', 'pointing_up'),
+    'Left': ('thumbs_up', 'thumbs_down', 'pointing_up'),
+}
+
+PALM_JOINTS = [0, 5, 9, 13, 17]  # 手腕和四个掌指关节
+
+HandDecision = namedtuple('HandDecision', 'track_id handedness gesture accepted reason')
+
+
+class HandTrack:
+    """One hand followed across frames."""
+
+    def __init__(self, track_id, center, decoder, now):
+        self.id = track_id
+        self.center = center
+        self.decoder = decoder
+        self.first_seen = now
+        self.last_seen = now
+        self.points = None        # 本帧的关键点（调用方数组的视图，只在本帧有效）
+        self.gesture = None       # 本帧的分类结果
+        self.visible = False      # 本帧是否检测到
+        self._handedness = 0.0    # >0 右手，<0 左手；平滑 MediaPipe 偶尔的左右误判
+
+    @property
+    def handedness(self):
+        return 'Right' if self._handedness >= 0 else 'Left'
+
+    @property
+    def active(self):
+        """Gesture this hand's decoder has latched, or None."""
+        return None if self.decoder.active is None else self.decoder.classes[self.decoder.active]
+
+    def vote_handedness(self, label, score):
+        self._handedness = 0.7 * self._handedness + (score if label == 'Right' else -score)
+
+
+class HandTracker:
+    """Assigns detected hands to tracks and runs each track's decoder."""
+
+    def __init__(self, decoder_factory, max_distance=0.2, max_missing=0.5, handedness_cost=0.1):
+        self.decoder_factory = decoder_factory  # () -> GestureDecoder
+        self.max_distance = max_distance        # 归一化图像坐标，超过即视为新的手
+        self.max_missing = max_missing          # 秒，消失多久后删除轨迹
+        self.handedness_cost = handedness_cost
+        self.tracks = []
+        self.created = 0
+        self._finished = []  # 已删除轨迹的 decoder，用于统计
+
+    def update(self, points, handedness, scores, gestures, now):
+        """Feed one inferred frame; returns [(track, emitted gesture or None)] for every live track.
+
+        ``points`` is (hands, 21, 3); ``handedness`` a (label, score) per hand;
+        ``scores`` the (hands, classes) per-frame scores; ``gestures`` the per-hand classes.
+        """
+        centers = points[:, PALM_JOINTS, :2].mean(axis=1) if len(points) else np.empty((0, 2))
+        pairs = []
+        for t, track in enumerate(self.tracks):
+            distance = np.sqrt(((centers - track.center) ** 2).sum(axis=1)).tolist()
+            for h, d in enumerate(distance):
+                if handedness[h][0] != track.handedness:
+                    d += self.handedness_cost
+                pairs.append((d, t, h))
+        pairs.sort()
+
+        assigned = {}
+        used_tracks = set()
+        for cost, t, h in pairs:
+            if cost > self.max_distance:
+                break
+            if t not in used_tracks and h not in assigned:
+                assigned[h] = self.tracks[t]
+                used_tracks.add(t)
+        for h in range(len(points)):
+            if h not in assigned:
+                self.created += 1
+                track = HandTrack(self.created, centers[h], self.decoder_factory(), now)
+                self.tracks.append(track)
+                assigned[h] = track
+
+        results = []
+        for track in self.tracks:
+            track.visible = False
+        for h, track in assigned.items():
+            track.center = centers[h]
+            track.points = points[h]
+            track.gesture = gestures[h]
+            track.visible = True
+            track.last_seen = now
+            track.vote_handedness(*handedness[h])
+            results.append((track, track.decoder.update(scores[h], now)))
+        for track in self.tracks:
+            if not track.visible:
+                track.gesture = None
+                track.decoder.update(np.zeros(len(track.decoder.classes)), now)  # 短暂丢失：证据衰减
+
+        alive = []
+        for track in self.tracks:
+            if now - track.last_seen > self.max_missing:
+                self._finished.append(track.decoder)
+            else:
+                alive.append(track)
+        self.tracks = sorted(alive, key=lambda track: track.id)
+        return sorted(results, key=lambda result: result[0].id)
+
+    def visible(self):
+        return [track for track in self.tracks if track.visible]
+
+    def summary(self):
+        decoders = self._finished + [track.decoder for track in self.tracks]
+        latency = sorted(value for decoder in decoders for value in decoder.latency)
+        emitted = sum(decoder.emitted for decoder in decoders)
+        mean = sum(latency) / len(latency) * 1000 if latency else 0.0
+        return (f"tracked {self.created} hands, {emitted} gestures emitted, "
+                f"decision latency {mean:.0f} ms")
+
+
+class HandArbiter:
+    """Decides which per-hand emissions become commands; see the module docstring."""
+
+    def __init__(self, policy='dominant', dominant=DOMINANT_HAND, command_sets=None):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown hand policy {policy!r}, expected one of {', '.join(POLICIES)}")
+        self.policy = policy
+        self.dominant = dominant
+        self.command_sets = command_sets or HAND_COMMAND_SETS
+        self.accepted = 0
+        self.rejected = 0
+
+    def allows(self, track, gesture, visible):
+        """Whether ``track`` may command ``gesture`` now → (allowed, reason)."""
+        if gesture == STOP_GESTURE:
+            return True, 'stop from any hand'
+        if self.policy == 'dominant':
+            if track.handedness == self.dominant:
+                return True, 'dominant hand'
+            if len(visible) == 1:
+                return True, 'only hand in view'
+            return False, f'not the {self.dominant.lower()} hand'
+        if self.policy == 'per_hand':
+            if gesture in self.command_sets.get(track.handedness, ()):
+                return True, f'{track.handedness.lower()} hand set'
+            return False, f'not in the {track.handedness.lower()} hand set'
+        if self.policy == 'agree':
+            if len(visible) < 2:
+                return False, 'needs two hands'
+            if all(other.active == gesture for other in visible):
+                return True, 'hands agree'
+            return False, 'hands disagree'
+        return True, 'any hand'
+
+    def decide(self, emissions, visible):
+        """[(track, emitted)] → [HandDecision] for every emission."""
+        decisions = []
+        sent = set()
+        for track, gesture in emissions:
+            if gesture is None or gesture == NONE_LABEL:
+                continue  # 模型的 none 类不是命令
+            allowed, reason = self.allows(track, gesture, visible)
+            if allowed and gesture in sent:
+                allowed, reason = False, 'already sent by another hand'  # 两只手同一帧确认同一手势
+            if allowed:
+                sent.add(gesture)
+            self.accepted += allowed
+            self.rejected += not allowed
+            decisions.append(HandDecision(track.id, track.handedness, gesture, allowed, reason))
+        return decisions
+
+    def summary(self):
+        return f"policy {self.policy}: {self.accepted} hand gestures accepted, {self.rejected} rejected"
+
+
+def make_tracker(preset, classes):
+    """Tracker whose per-hand decoders use a GestureDecoder preset."""
+    return HandTracker(lambda: GestureDecoder.preset(preset, classes))
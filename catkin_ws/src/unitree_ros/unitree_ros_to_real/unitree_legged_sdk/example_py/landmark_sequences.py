@@ -0,0 +1,132 @@
+"""On-disk format for recorded landmark sequences.
+
+One recording is an uncompressed .npz holding every inferred frame of a
+client session, so it can be replayed offline (gesture_eval.py) or used
+for training (gesture_model.py):
+
+    kind          str              'hand' or 'face'
+    landmark_ids  int16[K]         model landmark index of each stored row
+    timestamps    float64[N]       capture time of the frame (time.time())
+    present       bool[N]          a hand / face was detected
+    points        float32[N, K, 3] normalized (x, y, z); NaN where not present
+    labels        str[N]           what the operator was doing (ground truth)
+
+Hands store all 21 landmarks, faces only the rows the detector reads. The
+label ``none`` marks frames that must not trigger a command.
+
+Clients pick the label with the number keys, or without a display from
+``GESTURE_RECORD_LABEL`` and lines typed on stdin (a number or a label name,
+``0`` pauses).
+"""
+
+import os
+import sys
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+HAND_LANDMARKS = tuple(range(21))
+NONE_LABEL = 'none'  # 不触发任何命令的帧
+
+Sequence = namedtuple('Sequence', 'kind landmark_ids timestamps present points labels')
+
+
+def npz_path(path):
+    """``path`` with the .npz suffix np.savez would append anyway."""
+    path = os.fspath(path)
+    return path if path.endswith('.npz') else path + '.npz'
+
+
+def save_sequence(path, sequence):
+    np.savez(npz_path(path), kind=np.array(sequence.kind), landmark_ids=np.asarray(sequence.landmark_ids, np.int16),
+             timestamps=np.asarray(sequence.timestamps, np.float64),
+             present=np.asarray(sequence.present, bool),
+             points=np.asarray(sequence.points, np.float32), labels=np.asarray(sequence.labels, str))
+
+
+def load_sequence(path):
+    with np.load(path) as data:
+        points = data['points']
+        labels = data['labels'].astype(str)
+        if 'timestamps' not in data:  # 早期的训练录制：只有带手的帧，没有时间戳
+            return Sequence('hand', np.arange(points.shape[1]), np.arange(len(labels)) / 30.0,
+                            np.ones(len(labels), bool), points, labels)
+        return Sequence(str(data['kind']), data['landmark_ids'], data['timestamps'], data['present'],
+                        points, labels)
+
+
+def load_recordings(paths):
+    """Labeled frames with a detection from several recordings → (points, labels), for training."""
+    points, labels = [], []
+    for path in paths:
+        sequence = load_sequence(path)
+        keep = sequence.present & (sequence.labels != '')
+        points.append(sequence.points[keep])
+        labels.append(sequence.labels[keep])
+    return np.concatenate(points), np.concatenate(labels)
+
+
+def parse_label(text, labels):
+    """Recording label typed as its key number (1-based) or name; ``0`` pauses → None."""
+    text = text.strip()
+    if text.isdigit():
+        index = int(text) - 1
+        return labels[index] if 0 <= index < len(labels) else None
+    if text in labels:
+        return text
+    raise ValueError(f"unknown label '{text}', expected 0-{len(labels)} or one of {', '.join(labels)}")
+
+
+def read_labels(labels, on_label, stream=None):
+    """Call ``on_label(label or None)`` for every line typed on stdin (daemon thread)."""
+    def run():
+        for line in stream or sys.stdin:
+            if not line.strip():
+                continue
+            try:
+                on_label(parse_label(line, labels))
+            except ValueError as e:
+                print(f"[Recorder] {e}")
+    threading.Thread(target=run, name='record-labels', daemon=True).start()
+
+
+class LandmarkRecorder:
+    """Collects frames in memory and appends them to a recording on ``save``."""
+
+    def __init__(self, path, kind='hand', landmark_ids=HAND_LANDMARKS):
+        self.path = npz_path(path)  # np.savez 会补上 .npz；追加时要检查的是真正写入的文件
+        self.kind = kind
+        self.landmark_ids = tuple(landmark_ids)
+        self.timestamps = []
+        self.points = []
+        self.labels = []
+
+    def add(self, timestamp, points, label):
+        """``points`` is (K, 3) for the stored landmarks, or None when nothing was detected."""
+        self.timestamps.append(timestamp)
+        self.points.append(None if points is None else np.array(points, dtype=np.float32))
+        self.labels.append(label)
+
+    def counts(self):
+        return {label: self.labels.count(label) for label in sorted(set(self.labels))}
+
+    def save(self):
+        """Append to the file (existing frames are kept); returns the total frame count."""
+        if not self.labels:
+            return 0
+        present = np.array([p is not None for p in self.points])
+        points = np.full((len(self.points), len(self.landmark_ids), 3), np.nan, np.float32)
+        if present.any():
+            points[present] = np.stack([p for p in self.points if p is not None])
+        sequence = Sequence(self.kind, self.landmark_ids, np.array(self.timestamps), present, points,
+                            np.array(self.labels))
+        if os.path.exists(self.path):
+            old = load_sequence(self.path)
+            if old.kind != self.kind:
+                raise ValueError(f"{self.path} holds a {old.kind} recording, not {self.kind}")
+            sequence = Sequence(self.kind, self.landmark_ids,
+                                *(np.concatenate([a, b]) for a, b in zip(old[2:], sequence[2:])))
+        save_sequence(self.path, sequence)
+        self.timestamps, self.points, self.labels = [], [], []
+        return len(sequence.labels)
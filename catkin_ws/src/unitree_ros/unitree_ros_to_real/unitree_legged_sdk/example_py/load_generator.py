@@ -0,0 +1,279 @@
+"""Multi-connection load generator and throughput benchmark for server.py.
+
+By default the server is started in a child process with a stub dog_control
+(every action returns immediately), so this runs on any Linux box without the
+SDK or the robot:
+
+    python load_generator.py --clients 500 --rate 30 --duration 10
+    python load_generator.py --mode thread --clients 500
+    python load_generator.py --burst 20 --protocol text     # coalesced bursts
+    python load_generator.py --target 127.0.0.1:8888        # existing server
+    python load_generator.py --clients 500 --heartbeat 50   # watchdog cost at 50 Hz heartbeats
+
+Reported: connect (accept) latency, client send rate, server-side dispatch
+throughput, and p50/p99/p999 of send->receive and arrival->dispatch latency.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+import types
+
+from gesture_protocol import (HEARTBEAT_TOKEN, SOURCE_FACE, SOURCE_HAND, encode_hello,
+                              encode_message, encode_token)
+
+DEFAULT_MIX = 'open:4,fist:4,pointing_up:2,yes:1,no:1'
+STUB_ACTIONS = ('move_forward', 'move_backward', 'stop', 'stand', 'sit',
+                'angry_reaction', 'sad_reaction', 'happy_reaction', 'speed_up', 'speed_down')
+
+
+def percentiles(samples):
+    if not samples:
+        return {'n': 0}
+    samples = sorted(samples)
+    n = len(samples)
+
+    def pick(q):
+        return samples[min(n - 1, int(q * n))] * 1000
+
+    return {'n': n, 'p50_ms': pick(0.50), 'p99_ms': pick(0.99), 'p999_ms': pick(0.999),
+            'max_ms': samples[-1] * 1000}
+
+
+def parse_mix(text):
+    tokens, weights = [], []
+    for item in text.split(','):
+        token, _, weight = item.partition(':')
+        tokens.append(token.strip())
+        weights.append(float(weight) if weight else 1.0)
+    return tokens, weights
+
+
+# ========== Server side (child process) ==========
+
+def _install_stub_dog_control(dispatch_latency, counts):
+    """Register a dog_control module whose actions only record timing."""
+    stub = types.ModuleType('dog_control')
+
+    def make(name):
+        def action(origin=None):
+            counts[name] = counts.get(name, 0) + 1
+            if origin is not None:
+                dispatch_latency.append(time.monotonic() - origin)
+        action.__name__ = name
+        return action
+
+    for name in STUB_ACTIONS:
+        setattr(stub, name, make(name))
+    stub.unknown = lambda: counts.__setitem__('unknown', counts.get('unknown', 0) + 1)
+    stub.safety_stop = lambda origin=None: counts.__setitem__('safety_stop', counts.get('safety_stop', 0) + 1)
+    stub.stream_velocity = lambda vx, vy, yaw_speed, stamp=None: 'accepted'
+    sys.modules['dog_control'] = stub
+
+
+def run_server(mode, port, window, pipe, show_output, heartbeat_timeout=0.0):
+    """Child process entry: stubbed server that reports its samples on request."""
+    if not show_output:
+        sys.stdout = open(os.devnull, 'w')
+
+    receive_latency = []
+    dispatch_latency = []
+    counts = {}
+    _install_stub_dog_control(dispatch_latency, counts)
+    import server
+    if heartbeat_timeout > 0:
+        from watchdog import HeartbeatWatchdog
+        server.watchdog = HeartbeatWatchdog(server._heartbeat_expired, heartbeat_timeout)
+    submit_gestures = server.submit_gestures
+
+    def timed_submit(arbiter, messages, addr, sources, arrival=None):
+        now = time.time()
+        for msg in messages:
+            if msg.capture_ts is not None and msg.token != HEARTBEAT_TOKEN:
+                receive_latency.append(now - msg.capture_ts)
+        counts['received'] = counts.get('received', 0) + sum(
+            msg.token != HEARTBEAT_TOKEN for msg in messages)
+        submit_gestures(arbiter, messages, addr, sources, arrival)
+
+    server.submit_gestures = timed_submit
+
+    def reporter():
+        pipe.recv()  # 等待主进程请求结果
+        watchdog = server.watchdog.stats() if server.watchdog is not None else None
+        pipe.send({'receive': receive_latency, 'dispatch': dispatch_latency, 'counts': counts,
+                   'watchdog': watchdog})
+
+    threading.Thread(target=reporter, daemon=True).start()
+    if mode == 'thread':
+        server.serve_threaded('127.0.0.1', port, window)
+    else:
+        server.serve_async('127.0.0.1', port, window)
+
+
+# ========== Client side ==========
+
+async def send_heartbeats(writer, source, binary, hz, seq, stats, stop_at):
+    """Heartbeat stream of one client; ``seq`` is shared with its token sender."""
+    interval = 1.0 / hz
+    next_beat = time.monotonic()
+    while time.monotonic() < stop_at:
+        if binary:
+            writer.write(encode_message(HEARTBEAT_TOKEN, source, seq[0], time.time(), interval))
+            seq[0] += 1
+        else:
+            writer.write(encode_token(HEARTBEAT_TOKEN))
+        stats['heartbeats'] += 1
+        next_beat += interval
+        await asyncio.sleep(max(0.0, next_beat - time.monotonic()))
+
+async def run_client(index, args, tokens, weights, stats, stop_at):
+    rng = random.Random(args.seed + index)
+    source = SOURCE_HAND if index % 2 == 0 else SOURCE_FACE
+    binary = args.protocol == 'binary'
+
+    t0 = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+    except OSError:
+        stats['connect_failed'] += 1
+        return
+    stats['connect'].append(time.perf_counter() - t0)
+
+    if binary:
+        writer.write(encode_hello())
+    seq = [0]  # 与心跳协程共用
+    heartbeats = None
+    if args.heartbeat > 0:
+        heartbeats = asyncio.ensure_future(
+            send_heartbeats(writer, source, binary, args.heartbeat, seq, stats, stop_at))
+    interval = args.burst / args.rate if args.rate > 0 else 0.0
+    next_send = time.monotonic()
+    try:
+        while time.monotonic() < stop_at:
+            frames = []
+            for _ in range(args.burst):
+                token = rng.choices(tokens, weights)[0]
+                if binary:
+                    frames.append(encode_message(token, source, seq[0], time.time()))
+                else:
+                    frames.append(token.encode() if args.no_delimiter else encode_token(token))
+                seq[0] += 1
+            writer.write(b''.join(frames))  # burst>1 时多条消息合并为一次发送
+            await writer.drain()
+            stats['sent'] += args.burst
+
+            if interval:
+                next_send += interval
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                await asyncio.sleep(0)
+        if heartbeats is not None:
+            await heartbeats
+    except (ConnectionError, OSError):
+        stats['send_failed'] += 1
+    finally:
+        if heartbeats is not None:
+            heartbeats.cancel()
+        writer.close()
+
+
+async def run_clients(args):
+    tokens, weights = parse_mix(args.mix)
+    stats = {'connect': [], 'connect_failed': 0, 'send_failed': 0, 'sent': 0, 'heartbeats': 0}
+    stop_at = time.monotonic() + args.duration
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(i, args, tokens, weights, stats, stop_at)
+                           for i in range(args.clients)))
+    stats['elapsed'] = time.perf_counter() - start
+    return stats
+
+
+def wait_for_port(host, port, timeout=10.0):
+    import socket
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for server.py")
+    parser.add_argument('--clients', type=int, default=100, help="concurrent TCP connections")
+    parser.add_argument('--rate', type=float, default=30.0, help="tokens per second per client (0 = flat out)")
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds of sending")
+    parser.add_argument('--burst', type=int, default=1, help="tokens coalesced into one send")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="weighted token mix, e.g. 'open:3,fist:1'")
+    parser.add_argument('--protocol', choices=['binary', 'text'], default='binary')
+    parser.add_argument('--no-delimiter', action='store_true',
+                        help="text protocol without terminators (legacy coalescing behaviour)")
+    parser.add_argument('--mode', choices=['async', 'thread'], default='async', help="stub server mode")
+    parser.add_argument('--window', type=float, default=0.0, help="stub server arbitration window")
+    parser.add_argument('--port', type=int, default=18888)
+    parser.add_argument('--target', default=None, help="host:port of an already running server")
+    parser.add_argument('--server-output', action='store_true', help="keep the stub server's prints")
+    parser.add_argument('--heartbeat', type=float, default=0.0,
+                        help="heartbeats per second per client (0 = none)")
+    parser.add_argument('--heartbeat-timeout', type=float, default=0.15,
+                        help="stub server watchdog timeout when --heartbeat is set")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    server_proc = parent_pipe = None
+    if args.target:
+        args.host, port = args.target.rsplit(':', 1)
+        args.port = int(port)
+    else:
+        args.host = '127.0.0.1'
+        parent_pipe, child_pipe = multiprocessing.Pipe()
+        server_proc = multiprocessing.Process(
+            target=run_server,
+            args=(args.mode, args.port, args.window, child_pipe, args.server_output,
+                  args.heartbeat_timeout if args.heartbeat > 0 else 0.0),
+            daemon=True)
+        server_proc.start()
+        if not wait_for_port(args.host, args.port):
+            print("[LoadGen] Stub server did not start")
+            server_proc.terminate()
+            return
+
+    print(f"[LoadGen] {args.clients} clients x {args.rate:g} tok/s (burst {args.burst}, "
+          f"{args.protocol}) for {args.duration:g}s against {args.host}:{args.port}")
+    stats = asyncio.run(run_clients(args))
+
+    print(f"[LoadGen] connect latency: {percentiles(stats['connect'])} "
+          f"(failed {stats['connect_failed']}, send errors {stats['send_failed']})")
+    print(f"[LoadGen] sent {stats['sent']} tokens in {stats['elapsed']:.2f}s "
+          f"= {stats['sent'] / stats['elapsed']:.0f} tok/s")
+    if stats['heartbeats']:
+        print(f"[LoadGen] sent {stats['heartbeats']} heartbeats "
+              f"= {stats['heartbeats'] / stats['elapsed']:.0f} beats/s")
+
+    if server_proc is not None:
+        time.sleep(max(0.2, args.window * 2))  # 等待最后的消息和仲裁窗口
+        parent_pipe.send('report')
+        report = parent_pipe.recv()
+        server_proc.terminate()
+        counts = report['counts']
+        dispatched = sum(v for k, v in counts.items() if k not in ('received', 'safety_stop'))
+        print(f"[LoadGen] server received {counts.get('received', 0)} tokens, dispatched {dispatched} actions "
+              f"= {dispatched / stats['elapsed']:.0f} dispatch/s")
+        print(f"[LoadGen] send->receive latency: {percentiles(report['receive'])}")
+        print(f"[LoadGen] arrival->dispatch latency: {percentiles(report['dispatch'])}")
+        if report['watchdog'] is not None:
+            print(f"[LoadGen] watchdog: {report['watchdog']} "
+                  f"(dead-man stops {counts.get('safety_stop', 0)})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""Minimal in-process metrics with a Prometheus text endpoint.
+
+Updates are plain dict/list operations without locks so they are cheap enough
+for the 500 Hz ``udp.Send()`` loops (well under a microsecond each); under
+heavy contention an increment can in theory be lost, which is acceptable for
+monitoring. ``start_http_server()`` serves ``render()`` on ``/metrics``.
+"""
+
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9108
+
+REGISTRY = []
+
+
+def _escape_label(value):
+    """Label value escaped per the Prometheus text format (backslash, quote, newline)."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape_label(v)}"' for k, v in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+        REGISTRY.append(self)
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self, kind='counter'):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {kind}']
+        for label_values, value in list(self.values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value, *label_values):
+        self.values[label_values] = value
+
+    def render(self, kind='gauge'):
+        return super().render(kind)
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, labels=()):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.labels = tuple(labels)
+        self.series = {}  # label values -> [bucket counts (+Inf last), sum]
+        REGISTRY.append(self)
+
+    def observe(self, value, *label_values):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def snapshot(self, *label_values):
+        """Return (count, sum) for one label set."""
+        series = self.series.get(label_values)
+        if series is None:
+            return 0, 0.0
+        return sum(series[0]), series[1]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for label_values, (counts, total) in list(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, label_values, ("le", le))} {cumulative}')
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # 不刷屏
+
+
+def start_http_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Serve /metrics from a daemon thread; returns the HTTP server."""
+    httpd = ThreadingHTTPServer((host, port), _MetricsHandler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name='metrics-http', daemon=True).start()
+    print(f"[Metrics] Serving Prometheus metrics on http://{host}:{port}/metrics")
+    return httpd
+
+
+# ========== Metrics shared by server.py and dog_control.py ==========
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+ACTION_BUCKETS = (0.01, 0.1, 0.5, 1.0, 2.0, 3.0, 4.0, 5.0, 7.5, 10.0)
+PERIOD_BUCKETS = (0.0015, 0.0019, 0.002, 0.0021, 0.0025, 0.003, 0.004, 0.005, 0.01, 0.02)
+JITTER_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.002, 0.005, 0.01)
+
+TOKENS_RECEIVED = Counter('gesture_tokens_received_total',
+                          'Gesture tokens received per client and gesture', ('client', 'gesture'))
+DUPLICATES_IGNORED = Counter('gesture_duplicates_ignored_total',
+                             'Tokens dropped as per-source duplicates', ('client',))
+UNKNOWN_GESTURES = Counter('gesture_unknown_total', 'Decided tokens with no mapped action')
+ACTION_QUEUE_DEPTH = Gauge('action_queue_depth', 'Running plus pending robot actions')
+ACTION_DURATION = Histogram('action_duration_seconds', 'Wall time of each robot action',
+                            ACTION_BUCKETS, ('action',))
+TOKEN_TO_FIRST_SEND = Histogram('token_to_first_send_seconds',
+                                'Token arrival to the first udp.Send() of the resulting action',
+                                LATENCY_BUCKETS)
+UDP_SEND_PERIOD = Histogram('udp_send_period_seconds', 'Interval between consecutive udp.Send() calls',
+                            PERIOD_BUCKETS)
+CONTROL_JITTER = Histogram('control_loop_jitter_seconds', 'Control loop wake-up lateness past each tick deadline',
+                           JITTER_BUCKETS)
+CONTROL_MISSED_DEADLINES = Counter('control_loop_missed_deadlines_total',
+                                   'Control loop periods skipped because a tick woke too late')
+ACTION_CONVERGENCE = Histogram('action_convergence_seconds',
+                               'Setpoint published to HighState settled within tolerance',
+                               ACTION_BUCKETS, ('action',))
+CONVERGENCE_TIMEOUTS = Counter('action_convergence_timeouts_total',
+                               'Setpoints that did not converge before their timeout', ('action',))
+VELOCITY_SETPOINTS = Counter('velocity_setpoints_total',
+                             'Streamed velocity setpoints by outcome (accepted, coalesced, stale, busy)',
+                             ('result',))
+HEARTBEATS_MISSED = Counter('client_heartbeats_missed_total',
+                            'Heartbeats a client skipped, inferred from its declared interval')
+WATCHDOG_EXPIRED = Counter('client_heartbeat_expired_total', 'Clients whose heartbeats timed out')
+DEADMAN_STOPS = Counter('deadman_stops_total',
+                        'Robot stopped because the client driving it was lost (timeout, disconnect)',
+                        ('reason',))
+DEADMAN_STOP_LATENCY = Histogram('deadman_stop_latency_seconds',
+                                 'Last heartbeat (or disconnect) to the stop setpoint being published',
+                                 LATENCY_BUCKETS)
@@ -0,0 +1,327 @@
+"""Robot backends behind dog_control's ``udp``, ``cmd`` and ``state``.
+
+``SdkBackend`` is the real Unitree SDK talking UDP to the Go1.
+``SimBackend`` is a kinematic Go1 stand-in with the same ``UDP``/``HighCmd``/
+``HighState`` surface: every ``Recv()`` integrates the last sent ``HighCmd``
+(velocity, yawSpeed, bodyHeight, euler) into a plausible ``HighState``.
+With ``virtual=True`` it runs on a ``VirtualClock`` whose ``sleep()`` only
+advances simulated time, so choreographies run as fast as the CPU allows.
+
+dog_control picks the backend from ``ROBOT_BACKEND`` (sdk | sim | sim-virtual)
+or ``dog_control.use_backend()``. ``python robot_backend.py`` benchmarks the
+emotion reactions on the virtual simulator; ``--tick-benchmark`` measures the
+per-tick cost of building the HighCmd (``--backend sdk`` for the real pybind
+objects).
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+
+HIGHLEVEL = 0xee
+ROBOT_IP = "192.168.123.161"
+
+NOMINAL_BODY_HEIGHT = 0.28  # Go1 站立时的机身高度 (m)
+BODY_HEIGHT_RANGE = 0.25    # bodyHeight 偏移量上限 (m)
+EULER_LIMIT = 0.75          # 姿态角上限 (rad)
+VELOCITY_TAU = 0.20         # 速度一阶响应时间常数 (s)
+POSE_TAU = 0.15             # 高度/姿态一阶响应时间常数 (s)
+STANDING_FOOT_FORCE = 60.0  # 单足静态受力（原始单位）
+
+
+class RealClock:
+    virtual = False
+
+    def time(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """Simulated time: ``sleep()`` advances the clock instead of blocking.
+
+    ``hold(limit)`` lets another thread drive the clock (gesture_journal
+    replay): a ``sleep()`` that would pass ``limit`` waits until the limit
+    is raised, so actions advance in step with the replayed timeline.
+    """
+    virtual = True
+
+    def __init__(self):
+        self._now = 0.0
+        self._limit = None     # None：自由运行
+        self._held = False     # 有 sleep() 停在 limit 处
+        self._cond = threading.Condition()
+
+    def time(self):
+        return self._now
+
+    def sleep(self, seconds):
+        with self._cond:
+            target = self._now + max(seconds, 0.0)
+            while self._limit is not None and target > self._limit + 1e-9:
+                self._held = True
+                self._cond.notify_all()
+                self._cond.wait()
+            self._held = False
+            self._now = target
+
+    def hold(self, limit):
+        """Don't let ``sleep()`` pass ``limit`` (None: run freely again)."""
+        with self._cond:
+            self._limit = limit
+            self._held = False
+            self._cond.notify_all()
+
+    def wait_held(self, timeout):
+        """Wait until a ``sleep()`` is parked at the limit; returns whether one is."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._held, timeout)
+
+
+class SdkBackend:
+    """The real robot through robot_interface (UDP to 192.168.123.161)."""
+    name = 'sdk'
+
+    def __init__(self, sdk_path='../lib/python/amd64'):
+        if sdk_path not in sys.path:
+            sys.path.append(sdk_path)
+        import robot_interface as sdk
+
+        self.clock = RealClock()
+        self.udp = sdk.UDP(HIGHLEVEL, 8080, ROBOT_IP, 8082)
+        self.cmd = sdk.HighCmd()
+        self.state = sdk.HighState()
+        self.udp.InitCmdData(self.cmd)
+
+
+# ========== Simulated Go1 ==========
+
+class SimHighCmd:
+    def __init__(self):
+        self.levelFlag = HIGHLEVEL
+        self.mode = 0
+        self.gaitType = 0
+        self.speedLevel = 0
+        self.footRaiseHeight = 0.0
+        self.bodyHeight = 0.0
+        self.euler = [0.0, 0.0, 0.0]
+        self.velocity = [0.0, 0.0]
+        self.yawSpeed = 0.0
+        self.reserve = 0
+
+
+class SimIMU:
+    def __init__(self):
+        self.quaternion = [1.0, 0.0, 0.0, 0.0]
+        self.gyroscope = [0.0, 0.0, 0.0]
+        self.accelerometer = [0.0, 0.0, 9.81]
+        self.rpy = [0.0, 0.0, 0.0]
+        self.temperature = 30
+
+
+class SimHighState:
+    def __init__(self):
+        self.levelFlag = HIGHLEVEL
+        self.mode = 0
+        self.gaitType = 0
+        self.imu = SimIMU()
+        self.footForce = [STANDING_FOOT_FORCE] * 4
+        self.position = [0.0, 0.0, 0.0]
+        self.bodyHeight = NOMINAL_BODY_HEIGHT
+        self.velocity = [0.0, 0.0, 0.0]
+        self.yawSpeed = 0.0
+        self.tick = 0  # 仿真时间 (ms)
+
+
+def _clamp(value, limit):
+    return max(-limit, min(limit, value))
+
+
+def _approach(current, target, dt, tau):
+    return current + (target - current) * min(1.0, dt / tau)
+
+
+class SimUDP:
+    """Integrates the last ``SetSend`` command on every ``Recv()``."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.sim = SimHighState()
+        self.sent = 0
+        self._cmd = SimHighCmd()
+        self._heading = 0.0
+        self._last = clock.time()
+
+    def InitCmdData(self, cmd):
+        cmd.levelFlag = HIGHLEVEL
+
+    def SetSend(self, cmd):
+        c = self._cmd
+        c.mode = cmd.mode
+        c.gaitType = cmd.gaitType
+        c.bodyHeight = cmd.bodyHeight
+        c.euler = list(cmd.euler)
+        c.velocity = list(cmd.velocity)
+        c.yawSpeed = cmd.yawSpeed
+
+    def Send(self):
+        self.sent += 1
+
+    def Recv(self):
+        now = self.clock.time()
+        dt = min(now - self._last, 0.05)
+        self._last = now
+        if dt > 0:
+            self._integrate(dt)
+
+    def GetRecv(self, state):
+        s = self.sim
+        state.mode = s.mode
+        state.gaitType = s.gaitType
+        state.bodyHeight = s.bodyHeight
+        state.position = list(s.position)
+        state.velocity = list(s.velocity)
+        state.yawSpeed = s.yawSpeed
+        state.footForce = list(s.footForce)
+        state.imu.rpy = list(s.imu.rpy)
+        state.imu.gyroscope = list(s.imu.gyroscope)
+        state.imu.quaternion = list(s.imu.quaternion)
+        if hasattr(state, 'tick'):
+            state.tick = s.tick
+
+    def _integrate(self, dt):
+        c, s = self._cmd, self.sim
+        walking = c.mode == 2
+        vx_target, vy_target = (c.velocity[0], c.velocity[1]) if walking else (0.0, 0.0)
+        yaw_target = c.yawSpeed if walking else 0.0
+        height_target = _clamp(c.bodyHeight, BODY_HEIGHT_RANGE) if c.mode == 1 else 0.0
+        roll_target, pitch_target, yaw_offset = (
+            [_clamp(a, EULER_LIMIT) for a in c.euler] if c.mode == 1 else (0.0, 0.0, 0.0))
+
+        vx = _approach(s.velocity[0], vx_target, dt, VELOCITY_TAU)
+        vy = _approach(s.velocity[1], vy_target, dt, VELOCITY_TAU)
+        s.yawSpeed = _approach(s.yawSpeed, yaw_target, dt, VELOCITY_TAU)
+        self._heading += s.yawSpeed * dt
+        cos_h, sin_h = math.cos(self._heading), math.sin(self._heading)
+        s.position[0] += (vx * cos_h - vy * sin_h) * dt
+        s.position[1] += (vx * sin_h + vy * cos_h) * dt
+        s.velocity = [vx, vy, 0.0]
+
+        s.bodyHeight = _approach(s.bodyHeight, NOMINAL_BODY_HEIGHT + height_target, dt, POSE_TAU)
+        rpy = s.imu.rpy
+        old_roll, old_pitch = rpy[0], rpy[1]
+        rpy[0] = _approach(rpy[0], roll_target, dt, POSE_TAU)
+        rpy[1] = _approach(rpy[1], pitch_target, dt, POSE_TAU)
+        rpy[2] = self._heading + _approach(rpy[2] - self._heading, yaw_offset, dt, POSE_TAU)
+        s.imu.gyroscope = [(rpy[0] - old_roll) / dt, (rpy[1] - old_pitch) / dt, s.yawSpeed]
+
+        half = [a / 2 for a in rpy]
+        cr, sr = math.cos(half[0]), math.sin(half[0])
+        cp, sp = math.cos(half[1]), math.sin(half[1])
+        cy, sy = math.cos(half[2]), math.sin(half[2])
+        s.imu.quaternion = [cr * cp * cy + sr * sp * sy, sr * cp * cy - cr * sp * sy,
+                            cr * sp * cy + sr * cp * sy, cr * cp * sy - sr * sp * cy]
+
+        # 侧倾时左右足受力重新分配（FR, FL, RR, RL）
+        shift = STANDING_FOOT_FORCE * math.sin(rpy[0])
+        s.footForce = [STANDING_FOOT_FORCE - shift, STANDING_FOOT_FORCE + shift,
+                       STANDING_FOOT_FORCE - shift, STANDING_FOOT_FORCE + shift]
+        s.mode = c.mode
+        s.gaitType = c.gaitType
+        s.tick = int(self.clock.time() * 1000)
+
+
+class SimBackend:
+    """Simulated Go1; ``virtual=True`` runs it in virtual time."""
+
+    def __init__(self, virtual=False):
+        self.name = 'sim-virtual' if virtual else 'sim'
+        self.clock = VirtualClock() if virtual else RealClock()
+        self.udp = SimUDP(self.clock)
+        self.cmd = SimHighCmd()
+        self.state = SimHighState()
+        self.udp.InitCmdData(self.cmd)
+
+
+def create_backend(name=None):
+    """Build the backend named by ``name`` or ``$ROBOT_BACKEND`` (default: sdk)."""
+    name = name or os.environ.get('ROBOT_BACKEND', 'sdk')
+    if name == 'sdk':
+        return SdkBackend()
+    if name == 'sim':
+        return SimBackend(virtual=False)
+    if name == 'sim-virtual':
+        return SimBackend(virtual=True)
+    raise ValueError(f"unknown robot backend '{name}' (expected sdk, sim or sim-virtual)")
+
+
+def tick_benchmark(ticks):
+    """Per-tick CPU cost of HighCmd construction: full rewrite vs. changed fields only."""
+    import dog_control
+    happy = dog_control.REACTIONS['happy_reaction'].setpoints
+    scenarios = [
+        ('hold stand', [dog_control.STAND] * ticks),
+        ('walk', [dog_control.WALK._replace(velocity=(0.3, 0.0))] * ticks),
+        ('happy_reaction', (happy * (ticks // len(happy) + 1))[:ticks]),
+    ]
+    for name, setpoints in scenarios:
+        costs = []
+        for write in (dog_control._write_full, dog_control._write_changed):
+            dog_control._write_full(dog_control.IDLE)
+            start = time.process_time()
+            for sp in setpoints:
+                write(sp)
+            costs.append((time.process_time() - start) / ticks * 1e6)
+        before, after = costs
+        print(f"[Tick] {name:15s} full rewrite {before:6.2f} us/tick, changed fields {after:6.2f} us/tick "
+              f"({before / after if after else float('inf'):.1f}x)")
+
+
+def main():
+    """Run every emotion reaction on the virtual simulator and report throughput."""
+    import argparse
+    import contextlib
+    import io
+    parser = argparse.ArgumentParser(description="Benchmark dog_control choreographies in virtual time")
+    parser.add_argument('--runs', type=int, default=20, help="runs per reaction")
+    parser.add_argument('--tick-benchmark', type=int, default=0, metavar='TICKS',
+                        help="instead, time HighCmd construction over TICKS ticks")
+    parser.add_argument('--backend', default='sim-virtual', help="backend for --tick-benchmark")
+    args = parser.parse_args()
+
+    if args.tick_benchmark:
+        os.environ['ROBOT_BACKEND'] = args.backend
+        import dog_control
+        dog_control.control.stop()  # 控制线程不参与计时
+        tick_benchmark(args.tick_benchmark)
+        return
+
+    os.environ['ROBOT_BACKEND'] = 'sim-virtual'
+    import dog_control
+
+    reactions = ['angry_reaction', 'sad_reaction', 'happy_reaction',
+                 'fear_reaction', 'surprise_reaction', 'disgust_reaction', 'stand', 'sit']
+    for name in reactions:
+        body = getattr(dog_control, name).run  # 同步执行，不经过 executor
+        dog_control.use_backend(SimBackend(virtual=True))
+        backend = dog_control.backend
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):  # 不计入动作中的打印
+            for _ in range(args.runs):
+                body()
+        elapsed = time.perf_counter() - start
+        s = backend.udp.sim
+        print(f"[Sim] {name:18s} {args.runs / elapsed:8.1f} runs/s "
+              f"({backend.clock.time() / elapsed:7.0f}x real time, {backend.clock.time() / args.runs:4.2f}s each), "
+              f"pos=({s.position[0]:+.2f}, {s.position[1]:+.2f}) height={s.bodyHeight:.3f} "
+              f"rpy=({s.imu.rpy[0]:+.2f}, {s.imu.rpy[1]:+.2f}, {s.imu.rpy[2]:+.2f})")
+    for name, stats in dog_control.convergence_stats().items():
+        print(f"[Converge] {name}: {stats}")
+
+
+if __name__ == '__main__':
+    main()
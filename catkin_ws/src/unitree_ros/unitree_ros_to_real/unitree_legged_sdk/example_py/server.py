@@ -1,89 +1,305 @@
+import argparse
+import asyncio
 import socket
 import threading
+import time
+
 import dog_control  # 使用增强版的dog_control
+import metrics
+from gesture_arbiter import ARBITRATION_WINDOW, SOURCE_NAMES, SOURCE_PRIORITY, GestureArbiter, describe
+from gesture_journal import KIND_ACCEPTED, KIND_DISPATCH, KIND_DUPLICATE, JournalWriter
+from gesture_protocol import HEARTBEAT_TOKEN, ConnectionDecoder, VelocityMessage
+from watchdog import HEARTBEAT_TIMEOUT, HeartbeatWatchdog
 
 HOST = '0.0.0.0'
 PORT = 8888
+BACKLOG = 128        # 允许大量客户端同时排队连接
+
+journal = None  # 可选的手势日志（--journal）
+watchdog = None  # 心跳看门狗（--heartbeat-timeout 0 关闭）
+
+# 最近一次让机器人运动的连接：它心跳超时或断开时执行 dead-man 停止
+motion_owner = None
+_owner_lock = threading.Lock()
+MOTION_TOKENS = ('open', 'fist', 'faster', 'slower')
+
+# 手势 → 动作映射
+GESTURE_ACTIONS = {
+    'open': dog_control.move_forward,
+    'fist': dog_control.move_backward,
+    'pointing_up': dog_control.stop,
+    'yes': dog_control.stand,
+    'no': dog_control.sit,
+    # 情绪反应命令 - 只支持3种情绪
+    'angry_reaction': dog_control.angry_reaction,
+    'sad_reaction': dog_control.sad_reaction,
+    'happy_reaction': dog_control.happy_reaction,
+    # 调整连续运动速度
+    'faster': dog_control.speed_up,
+    'slower': dog_control.speed_down,
+}
+
+def token_label(token):
+    """Metric label for a received token; anything unmapped counts as 'unknown'."""
+    # 文本客户端可以发任意字符串，直接做标签会让指标无限膨胀
+    return token if token in GESTURE_ACTIONS else 'unknown'
+
+def print_banner():
+    print("[Listening] Waiting for clients...")
+    print("Supported commands:")
+    print(" Hand/Face gestures: open (forward), fist (backward), pointing_up (stop)")
+    print(" Hand gestures: thumbs_up -> yes (stand), thumbs_down -> no (sit)")
+    print(" Emotions (3 types): angry_reaction, sad_reaction, happy_reaction")
+    print(" Speed: faster / slower; binary v2 clients can stream vx/vy/yaw setpoints")
+
+def execute_decision(decision, virtual_time=False):
+    """仲裁结果 → 执行动作（virtual_time：到达时间不是本机 monotonic 时钟，如日志回放，不计首包延迟）"""
+    print(f"[Decision] {describe(decision)}")
+    vote = decision.votes[0]
+    addr, source = vote.source_key
+    action = GESTURE_ACTIONS.get(decision.token)
+    if journal is not None:
+        journal.record(KIND_DISPATCH, addr, source, decision.token,
+                       action.__name__ if action is not None else 'unknown')
+    if action is None:
+        print(f"[Warning] Unknown gesture: '{decision.token}'")
+        metrics.UNKNOWN_GESTURES.inc()  # 原始 token 只打日志，不做标签
+        dog_control.unknown()
+        return
+    if decision.token in MOTION_TOKENS:
+        _set_motion_owner(addr)
+    elif decision.token == 'pointing_up':
+        _set_motion_owner(None)
+    # origin: 最早一票的到达时间，用于统计"手势到达 → 首次 UDP 发送"延迟
+    run_action(action, addr, None if virtual_time else vote.arrival)
+
+def _set_motion_owner(addr):
+    global motion_owner
+    with _owner_lock:
+        motion_owner = addr
+    if addr is not None and watchdog is not None:
+        # 从第一条运动命令开始监视：不发心跳的客户端同样受 dead-man 停止保护
+        watchdog.watch(addr)
+
+def client_lost(addr, reason, since=None):
+    """连接心跳超时或断开：如果它在控制运动，立即停止机器人
+
+    ``since`` 是最后一次心跳（超时）或检测到断开的 monotonic 时间，
+    用于统计 dead-man 停止延迟。
+    """
+    global motion_owner
+    with _owner_lock:
+        if motion_owner != addr:
+            return False
+        motion_owner = None
+    dog_control.safety_stop()
+    if since is not None:
+        metrics.DEADMAN_STOP_LATENCY.observe(time.monotonic() - since)
+    metrics.DEADMAN_STOPS.inc(reason)
+    print(f"[Deadman] {addr} {reason} - robot stopped")
+    return True
+
+def _heartbeat_expired(addr, last_seen):
+    print(f"[Watchdog] {addr} missed heartbeats for {time.monotonic() - last_seen:.3f}s")
+    metrics.WATCHDOG_EXPIRED.inc()
+    client_lost(addr, 'timeout', last_seen)
+
+def _connection_closed(addr):
+    if watchdog is not None:
+        watchdog.remove(addr)
+    client_lost(addr, 'disconnect', time.monotonic())
 
-server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-server_socket.bind((HOST, PORT))
-server_socket.listen(5)  # 可同时接受多个 client
+def submit_gestures(arbiter, messages, addr, sources, arrival=None):
+    """把一个连接收到的手势交给仲裁器（按 连接+来源 去重）"""
+    velocity = None
+    for msg in messages:
+        if isinstance(msg, VelocityMessage):
+            if velocity is not None:
+                metrics.VELOCITY_SETPOINTS.inc('coalesced')  # 同一批里只有最新的有意义
+            velocity = msg
+            continue
+        if msg.token == HEARTBEAT_TOKEN:
+            # 心跳不经过仲裁器和日志，只刷新看门狗（O(1)）
+            if watchdog is not None:
+                missed = watchdog.beat(addr, msg.confidence)
+                if missed:
+                    metrics.HEARTBEATS_MISSED.inc(amount=missed)
+            continue
+        source_key = (addr, msg.source)
+        sources.add(source_key)
+        client = f"{addr[0]}/{SOURCE_NAMES.get(msg.source, 'text')}"
+        metrics.TOKENS_RECEIVED.inc(client, token_label(msg.token))
+        accepted = arbiter.submit(msg.token, source_key, msg.source, arrival)
+        if accepted:
+            print(f"[Gesture] ({addr}) => {msg.token}")
+        else:
+            metrics.DUPLICATES_IGNORED.inc(client)
+        if journal is not None:
+            journal.record(KIND_ACCEPTED if accepted else KIND_DUPLICATE, addr, msg.source, msg.token)
+    if velocity is not None:
+        result = dog_control.stream_velocity(velocity.vx, velocity.vy, velocity.yaw_speed,
+                                             velocity.capture_ts)
+        if result == 'accepted':
+            _set_motion_owner(addr)
 
-print("[Listening] Waiting for clients...")
-print("Supported commands:")
-print(" Hand/Face gestures: open (forward), fist (backward), pointing_up (stop)")
-print(" Hand gestures: thumbs_up -> yes (stand), thumbs_down -> no (sit)")
-print(" Emotions (3 types): angry_reaction, sad_reaction, happy_reaction")
+def make_arbiter(on_decision, window, priority_order, threaded=True):
+    priority = SOURCE_PRIORITY
+    if priority_order:
+        names = [n.strip() for n in priority_order.split(',') if n.strip()]
+        priority = {name: len(names) - i for i, name in enumerate(names)}
+    return GestureArbiter(on_decision, window=window, source_priority=priority, threaded=threaded)
 
-last_gesture = None
-lock = threading.Lock()
+def run_action(action, addr, origin=None):
+    """执行动作并记录异常（在动作线程中运行）"""
+    try:
+        action(origin=origin)
+    except Exception as e:
+        print(f"[Error] {addr} - action {action.__name__} failed: {e}")
+
+# ========== Thread-per-client mode ==========
 
-def handle_client(conn, addr):
-    global last_gesture
+def handle_client(conn, addr, arbiter):
     print(f"[Connected] {addr}")
-    
+    decoder = ConnectionDecoder()  # 根据首字节协商文本/二进制协议
+    sources = set()
+
     try:
         while True:
-            data = conn.recv(1024)
+            data = conn.recv(4096)
+            # 连接关闭时处理最后一个未以分隔符结尾的帧
+            messages = decoder.feed(data) if data else decoder.flush()
+            submit_gestures(arbiter, messages, addr, sources)
+
             if not data:
                 print(f"[Disconnected] {addr}")
                 break
-            
-            # 处理接收到的文本
-            text = data.decode(errors='ignore').strip().lower()
-            if not text:
-                continue
-            
-            # 拆分粘包（按行或空格）
-            gestures = []
-            for line in text.splitlines():
-                gestures.extend(line.split())
-            
-            for gesture in gestures:
-                with lock:
-                    if gesture == last_gesture:
-                        print(f"[Ignored] Gesture '{gesture}' (duplicate)")
-                        continue
-                    last_gesture = gesture
-                
-                print(f"[Gesture] ({addr}) => {gesture}")
-                
-                # 调用对应的动作 - 更新后的映射
-                if gesture == 'open':
-                    dog_control.move_forward()
-                elif gesture == 'fist':
-                    dog_control.move_backward()
-                elif gesture == 'pointing_up':
-                    dog_control.stop()
-                elif gesture == 'yes':
-                    dog_control.stand()
-                elif gesture == 'no':
-                    dog_control.sit()
-                # 情绪反应命令 - 只支持3种情绪
-                elif gesture == 'angry_reaction':
-                    dog_control.angry_reaction()
-                elif gesture == 'sad_reaction':
-                    dog_control.sad_reaction()
-                elif gesture == 'happy_reaction':
-                    dog_control.happy_reaction()
-                else:
-                    print(f"[Warning] Unknown gesture: '{gesture}'")
-                    dog_control.unknown()
-                    
+
     except Exception as e:
         print(f"[Error] {addr} - {e}")
     finally:
+        for source_key in sources:
+            arbiter.forget(source_key)
+        _connection_closed(addr)
         conn.close()
-        print(f"[Connection Closed] {addr}")
-
-# 主线程：等待多个 client
-try:
-    while True:
-        conn, addr = server_socket.accept()
-        threading.Thread(target=handle_client, args=(conn, addr), daemon=True).start()
-except KeyboardInterrupt:
-    print("\n[Interrupted] Server shutting down...")
-finally:
-    server_socket.close()
-    print("[Closed] Server socket closed.")
\ No newline at end of file
+        print(f"[Connection Closed] {addr} ({decoder.mode}) {decoder.stats.summary()}")
+
+def serve_threaded(host=HOST, port=PORT, window=ARBITRATION_WINDOW, priority_order=None):
+    """每个客户端一个线程（旧模式）"""
+    arbiter = make_arbiter(execute_decision, window, priority_order)
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server_socket.bind((host, port))
+    server_socket.listen(BACKLOG)
+    print_banner()
+
+    try:
+        while True:
+            conn, addr = server_socket.accept()
+            threading.Thread(target=handle_client, args=(conn, addr, arbiter), daemon=True).start()
+    except KeyboardInterrupt:
+        print("\n[Interrupted] Server shutting down...")
+    finally:
+        server_socket.close()
+        print(f"[Arbiter] {arbiter.stats()}")
+        print("[Closed] Server socket closed.")
+
+# ========== Event-loop mode ==========
+
+async def handle_client_async(reader, writer, arbiter):
+    """单个事件循环复用所有连接；动作由 ActionExecutor 异步执行，接收从不被动作阻塞"""
+    addr = writer.get_extra_info('peername')
+    print(f"[Connected] {addr}")
+    decoder = ConnectionDecoder()  # 根据首字节协商文本/二进制协议
+    sources = set()
+
+    try:
+        while True:
+            data = await reader.read(4096)
+            # 连接关闭时处理最后一个未以分隔符结尾的帧
+            messages = decoder.feed(data) if data else decoder.flush()
+            submit_gestures(arbiter, messages, addr, sources)
+
+            if not data:
+                print(f"[Disconnected] {addr}")
+                break
+
+    except (ConnectionError, OSError, ValueError) as e:
+        print(f"[Error] {addr} - {e}")
+    finally:
+        for source_key in sources:
+            arbiter.forget(source_key)
+        _connection_closed(addr)
+        writer.close()
+        print(f"[Connection Closed] {addr} ({decoder.mode}) {decoder.stats.summary()}")
+
+async def _serve_async(host, port, arbiter):
+    server = await asyncio.start_server(
+        lambda r, w: handle_client_async(r, w, arbiter),
+        host, port, reuse_address=True, backlog=BACKLOG)
+    print_banner()
+    async with server:
+        await server.serve_forever()
+
+def serve_async(host=HOST, port=PORT, window=ARBITRATION_WINDOW, priority_order=None):
+    """事件循环模式：所有客户端共用一个线程，动作由 ActionExecutor 按优先级执行"""
+    # execute_decision 只是把动作交给 ActionExecutor，不会阻塞：直接调用，STOP 不必多一次线程切换
+    arbiter = make_arbiter(execute_decision, window, priority_order)
+    try:
+        asyncio.run(_serve_async(host, port, arbiter))
+    except KeyboardInterrupt:
+        print("\n[Interrupted] Server shutting down...")
+    finally:
+        print(f"[Arbiter] {arbiter.stats()}")
+        print("[Closed] Server socket closed.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Gesture TCP server")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--mode', choices=['async', 'thread'], default='async',
+                        help="async: one event loop for all clients; thread: one thread per client")
+    parser.add_argument('--window', type=float, default=ARBITRATION_WINDOW,
+                        help="arbitration window in seconds (0 disables fusion)")
+    parser.add_argument('--priority', default=None,
+                        help="source priority on conflict, highest first, e.g. 'hand,face,text'")
+    parser.add_argument('--metrics-port', type=int, default=metrics.METRICS_PORT,
+                        help="Prometheus /metrics port on 127.0.0.1 (0 disables)")
+    parser.add_argument('--journal', default=None,
+                        help="append every received token and dispatch to this binary journal")
+    parser.add_argument('--telemetry', default=None,
+                        help="memory-map the control loop's HighState ring to this file")
+    parser.add_argument('--heartbeat-timeout', type=float, default=HEARTBEAT_TIMEOUT,
+                        help="stop the robot when the client driving it sends no heartbeat "
+                             "for this many seconds, counted from its first motion command (0 disables)")
+    args = parser.parse_args()
+
+    global journal, watchdog
+    if args.heartbeat_timeout > 0:
+        watchdog = HeartbeatWatchdog(_heartbeat_expired, args.heartbeat_timeout)
+    if args.journal:
+        journal = JournalWriter(args.journal)
+        print(f"[Journal] Recording to {args.journal}")
+
+    if args.telemetry:
+        dog_control.enable_telemetry(args.telemetry)
+        print(f"[Telemetry] Recording HighState to {args.telemetry}")
+
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+
+    try:
+        if args.mode == 'thread':
+            serve_threaded(args.host, args.port, args.window, args.priority)
+        else:
+            serve_async(args.host, args.port, args.window, args.priority)
+    finally:
+        print(f"[Control] {dog_control.control.stats()}")
+        print(f"[Converge] {dog_control.convergence_stats()}")
+        if watchdog is not None:
+            print(f"[Watchdog] {watchdog.stats()}")
+        dog_control.telemetry_ring.close()
+        if journal is not None:
+            journal.close()
+
+if __name__ == '__main__':
+    main()
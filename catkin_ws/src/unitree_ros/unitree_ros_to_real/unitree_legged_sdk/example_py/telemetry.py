@@ -0,0 +1,159 @@
+"""HighState telemetry ring recorded by dog_control's control loop.
+
+Every tick the received ``HighState`` is written as one fixed-size record
+into a preallocated NumPy structured-array ring. The ring lives either in
+process memory or in a memory-mapped file (``server.py --telemetry FILE``)
+that another process can tail without copies:
+
+    python telemetry.py robot.tlm            # follow a running server
+
+File layout (little-endian):
+    header   int64[8]          magic, version, capacity, record size, records written, 0, 0, 0
+    records  RECORD_DTYPE[N]   record k is stored in slot k % N
+
+A record is published by bumping "records written" after it is complete; a
+reader that falls more than N records behind loses the overwritten ones.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+TELEMETRY_MAGIC = 0x4D4C5447  # 'GTLM'
+TELEMETRY_VERSION = 1
+DEFAULT_CAPACITY = 30000  # 500 Hz 下 60 秒
+
+H_MAGIC, H_VERSION, H_CAPACITY, H_RECORD_SIZE, H_WRITTEN = range(5)
+HEADER_BYTES = 64
+
+RECORD_DTYPE = np.dtype([
+    ('wall_time', '<f8'),        # time.time()，与 gesture journal 对齐
+    ('loop_time', '<f8'),        # 控制循环时钟（虚拟仿真时为仿真时间）
+    ('tick', '<u4'),             # HighState.tick (ms)
+    ('mode', 'u1'),
+    ('gait_type', 'u1'),
+    ('body_height', '<f4'),
+    ('position', '<f4', (3,)),
+    ('velocity', '<f4', (3,)),
+    ('yaw_speed', '<f4'),
+    ('rpy', '<f4', (3,)),
+    ('gyroscope', '<f4', (3,)),
+    ('quaternion', '<f4', (4,)),
+    ('foot_force', '<f4', (4,)),
+])
+
+
+def _layout(buf, capacity):
+    header = np.ndarray((8,), '<i8', buf, 0)
+    records = np.ndarray((capacity,), RECORD_DTYPE, buf, HEADER_BYTES)
+    return header, records
+
+
+class TelemetryRing:
+    """Fixed-capacity ring of RECORD_DTYPE; ``path`` backs it with a memory-mapped file."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, path=None):
+        self.capacity = capacity
+        self.path = path
+        size = HEADER_BYTES + capacity * RECORD_DTYPE.itemsize
+        if path is None:
+            self._buf = np.zeros(size, np.uint8)
+        else:
+            self._buf = np.memmap(path, np.uint8, mode='w+', shape=(size,))
+        self.header, self.records = _layout(self._buf, capacity)
+        self.header[:] = [TELEMETRY_MAGIC, TELEMETRY_VERSION, capacity, RECORD_DTYPE.itemsize, 0, 0, 0, 0]
+        self.written = 0
+
+    def record(self, state, loop_time):
+        """Append one HighState (called from the control loop only)."""
+        imu = state.imu
+        # 整条记录一次赋值，避免逐字段跨越 NumPy 边界
+        self.records[self.written % self.capacity] = (
+            time.time(), loop_time, state.tick, state.mode, state.gaitType, state.bodyHeight,
+            state.position, state.velocity, state.yawSpeed, imu.rpy, imu.gyroscope,
+            imu.quaternion, state.footForce)
+        self.written += 1
+        self.header[H_WRITTEN] = self.written
+
+    def snapshot(self, last=None):
+        """Copy of the newest ``last`` records (default: all retained), oldest first."""
+        count = min(self.written, self.capacity)
+        if last is not None:
+            count = min(count, last)
+        start = self.written - count
+        return np.take(self.records, np.arange(start, self.written) % self.capacity)
+
+    def between(self, start, end):
+        """Retained records whose wall_time lies in [start, end]."""
+        records = self.snapshot()
+        mask = (records['wall_time'] >= start) & (records['wall_time'] <= end)
+        return records[mask]
+
+    def close(self):
+        if self.path is not None:
+            self._buf.flush()
+            print(f"[Telemetry] {self.written} records, newest {min(self.written, self.capacity)} "
+                  f"kept in {self.path}")
+
+
+class TelemetryReader:
+    """Tails a memory-mapped telemetry file written by another process."""
+
+    def __init__(self, path):
+        self._buf = np.memmap(path, np.uint8, mode='r')
+        header = np.ndarray((8,), '<i8', self._buf, 0)
+        if header[H_MAGIC] != TELEMETRY_MAGIC or header[H_VERSION] != TELEMETRY_VERSION:
+            raise ValueError(f"{path} is not a telemetry ring v{TELEMETRY_VERSION}")
+        if header[H_RECORD_SIZE] != RECORD_DTYPE.itemsize:
+            raise ValueError(f"{path}: record size {header[H_RECORD_SIZE]} != {RECORD_DTYPE.itemsize}")
+        self.capacity = int(header[H_CAPACITY])
+        self.header, self.records = _layout(self._buf, self.capacity)
+        self.position = 0
+        self.lost = 0
+
+    def written(self):
+        return int(self.header[H_WRITTEN])
+
+    def read_new(self):
+        """Records written since the last call: a zero-copy view, or a copy across the wrap."""
+        written = self.written()
+        if written - self.position > self.capacity:
+            self.lost += written - self.position - self.capacity
+            self.position = written - self.capacity
+        start, self.position = self.position, written
+        if start == written:
+            return self.records[:0]
+        first, last = start % self.capacity, (written - 1) % self.capacity
+        if first <= last:
+            return self.records[first:last + 1]
+        return np.concatenate([self.records[first:], self.records[:last + 1]])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Follow a memory-mapped telemetry ring")
+    parser.add_argument('path')
+    parser.add_argument('--interval', type=float, default=0.5, help="seconds between summaries")
+    args = parser.parse_args()
+
+    reader = TelemetryReader(args.path)
+    reader.position = reader.written()
+    print(f"[Telemetry] Following {args.path} ({reader.capacity} records)")
+    try:
+        while True:
+            time.sleep(args.interval)
+            records = reader.read_new()
+            if not len(records):
+                continue
+            newest = records[-1]
+            rate = len(records) / args.interval
+            print(f"[Telemetry] {rate:5.0f} Hz mode={newest['mode']} height={newest['body_height']:.3f} "
+                  f"v=({newest['velocity'][0]:+.2f}, {newest['velocity'][1]:+.2f}) "
+                  f"rpy=({newest['rpy'][0]:+.2f}, {newest['rpy'][1]:+.2f}, {newest['rpy'][2]:+.2f}) "
+                  f"feet={np.round(newest['foot_force']).astype(int).tolist()} lost={reader.lost}")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
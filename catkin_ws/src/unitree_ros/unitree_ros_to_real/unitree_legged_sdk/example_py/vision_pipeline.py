@@ -0,0 +1,391 @@
+"""Staged capture / inference / render pipeline for the vision clients.
+
+    capture thread ──LatestSlot──> inference thread ──LatestSlot──> render (main thread)
+
+Each handoff holds a single item and the newest one wins: a stage that
+falls behind skips straight to the latest frame instead of working through
+a queue, and every overwritten item is counted as a drop. The capture
+thread keeps reading, so frames never pile up in the camera buffer, and a
+slow ``imshow``/``waitKey`` only lowers the render rate; gesture latency is
+capture + inference time.
+
+The render stage runs on the main thread (HighGUI wants that) at no more
+than ``render_fps``; without a render callback (headless) the main thread
+just waits. ``AdaptiveInput`` decides what part of each frame the hand
+model sees; static overlay text is drawn once by ``StaticOverlay``.
+"""
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class LatestSlot:
+    """Single-item handoff between two threads; ``put`` overwrites, ``get`` takes."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.puts = 0
+        self.dropped = 0  # 被覆盖、从未被取走的项
+
+    def put(self, item):
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self.puts += 1
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Newest item, or None on timeout or once closed and drained."""
+        with self._cond:
+            if self._item is None and not self._closed:
+                self._cond.wait(timeout)
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed and self._item is None
+
+
+def _summary(samples):
+    if not samples:
+        return 0.0, 0.0
+    ordered = sorted(samples)
+    return sum(ordered) / len(ordered) * 1000, ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))] * 1000
+
+
+class VisionPipeline:
+    """Runs ``infer(frame, capture_time)`` on the newest camera frame.
+
+    ``infer`` returns a view for the render stage (or None to skip
+    rendering that frame). ``render(view)`` is called with the newest view,
+    or None when nothing new arrived, and returns False to stop.
+
+    Frames from a capture with ``is_current(seq)`` (frame_bus.BusCapture)
+    are shared-memory views: ones overwritten while queued are dropped, and
+    when rendering, inference runs on a private copy the render stage can keep.
+    """
+
+    def __init__(self, capture, infer, render=None, render_fps=30.0, name='Vision', history=1000):
+        self.capture = capture
+        self.infer = infer
+        self.render = render
+        self.render_period = 1.0 / render_fps if render_fps > 0 else 0.0
+        self.name = name
+        self.frames = LatestSlot()
+        self.views = LatestSlot()
+        self.captured = 0
+        self.inferred = 0
+        self.rendered = 0
+        self.stale = 0  # 推理前已被生产者覆盖的共享内存帧
+        self.infer_time = deque(maxlen=history)   # 秒，单帧推理耗时
+        self.latency = deque(maxlen=history)      # 秒，采集 → 推理完成（即手势发出）
+        self.infer_cpu = 0.0    # 秒，推理线程 CPU 时间
+        self.render_cpu = 0.0   # 秒，渲染（主线程）CPU 时间
+        self._running = True
+        self._started = None
+        self._process_cpu = None
+        self._stopped = None
+
+    def _capture_loop(self):
+        try:
+            while self._running and self.capture.isOpened():
+                success, frame = self.capture.read()
+                if not success:
+                    break
+                self.captured += 1
+                capture_time = self.capture.capture_time
+                self.frames.put((frame, capture_time if capture_time is not None else time.time(),
+                                 getattr(self.capture, 'seq', None)))
+        finally:
+            self.frames.close()
+
+    def _infer_loop(self):
+        try:
+            while self._running:
+                item = self.frames.get(timeout=0.5)
+                if item is None:
+                    if self.frames.closed:
+                        break
+                    continue
+                frame, capture_time, seq = item
+                if seq is not None:
+                    if self.render is not None:
+                        frame = frame.copy()  # 渲染阶段会保留这帧，而共享内存槽随后会被复用
+                    if not self.capture.is_current(seq):  # 排队（或复制）期间被覆盖
+                        self.stale += 1
+                        continue
+                start, cpu = time.perf_counter(), time.thread_time()
+                view = self.infer(frame, capture_time)
+                self.infer_cpu += time.thread_time() - cpu
+                self.infer_time.append(time.perf_counter() - start)
+                self.latency.append(time.time() - capture_time)
+                self.inferred += 1
+                if view is not None and self.render is not None:
+                    self.views.put(view)
+        finally:
+            self._running = False
+            self.views.close()
+
+    def run(self):
+        """Start capture and inference threads and render until stopped."""
+        self._started = time.monotonic()
+        self._process_cpu = time.process_time()
+        threads = [threading.Thread(target=self._capture_loop, name=f'{self.name}-capture', daemon=True),
+                   threading.Thread(target=self._infer_loop, name=f'{self.name}-infer', daemon=True)]
+        for thread in threads:
+            thread.start()
+        try:
+            if self.render is None:
+                while threads[1].is_alive():
+                    threads[1].join(0.5)
+                return
+            next_frame = time.monotonic()
+            while self._running or not self.views.closed:
+                view = self.views.get(timeout=max(self.render_period, 0.005))
+                cpu = time.thread_time()
+                keep_going = self.render(view)
+                self.render_cpu += time.thread_time() - cpu
+                if keep_going is False:
+                    break
+                if view is not None:
+                    self.rendered += 1
+                next_frame += self.render_period
+                delay = next_frame - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_frame = time.monotonic()  # 渲染跟不上时不追赶
+        finally:
+            self._running = False
+            threads[1].join(1.0)
+            self._stopped = (time.monotonic(), time.process_time())
+
+    def stats(self):
+        now, cpu = self._stopped or (time.monotonic(), time.process_time())
+        elapsed = now - self._started if self._started else 0.0
+        infer_mean, infer_p99 = _summary(list(self.infer_time))
+        latency_mean, latency_p99 = _summary(list(self.latency))
+        frames = max(1, self.inferred)
+        return {
+            'captured': self.captured,
+            'inferred': self.inferred,
+            'rendered': self.rendered,
+            'dropped_before_infer': self.frames.dropped,
+            'dropped_stale': self.stale,
+            'dropped_before_render': self.views.dropped,
+            'infer_fps': self.inferred / elapsed if elapsed else 0.0,
+            'infer_ms_mean': infer_mean,
+            'infer_ms_p99': infer_p99,
+            'latency_ms_mean': latency_mean,
+            'latency_ms_p99': latency_p99,
+            # 每处理一帧的 CPU 时间：整个进程（含采集和 MediaPipe 内部线程）、推理线程、渲染
+            'cpu_ms_per_frame': (cpu - self._process_cpu) / frames * 1000 if self._started else 0.0,
+            'infer_cpu_ms_per_frame': self.infer_cpu / frames * 1000,
+            'render_cpu_ms_per_frame': self.render_cpu / max(1, self.rendered) * 1000,
+        }
+
+    def summary(self):
+        s = self.stats()
+        return (f"captured {s['captured']}, inferred {s['inferred']} ({s['infer_fps']:.1f} fps), "
+                f"rendered {s['rendered']}; dropped {s['dropped_before_infer']} before inference, "
+                f"{s['dropped_stale']} overwritten on the bus, "
+                f"{s['dropped_before_render']} before render; inference {s['infer_ms_mean']:.1f} ms "
+                f"(p99 {s['infer_ms_p99']:.1f}), capture->gesture {s['latency_ms_mean']:.1f} ms "
+                f"(p99 {s['latency_ms_p99']:.1f}); CPU {s['cpu_ms_per_frame']:.1f} ms/frame "
+                f"(inference {s['infer_cpu_ms_per_frame']:.1f}, "
+                + (f"render {s['render_cpu_ms_per_frame']:.1f} ms/rendered frame)" if self.render is not None
+                   else "headless)"))
+
+
+# ========== Adaptive model input (ROI, resolution, idle rate) ==========
+
+class AdaptiveInput:
+    """Chooses what the landmark model sees for each frame.
+
+    - ROI: after a detection, the next frame is cropped to the landmarks'
+      bounding box grown by ``roi_margin`` (square, at least ``min_roi`` of
+      the shorter side); a miss falls back to the full frame.
+    - Resolution: the input is downscaled (not below ``min_scale``) while
+      the model's smoothed run time exceeds ``budget`` seconds and scaled
+      back up when it is well under.
+    - Idle: after ``idle_after`` seconds without a hand only ``idle_fps``
+      frames per second reach the model; the first detection restores the
+      full rate, so a new hand costs at most one idle period.
+
+    ``plan()`` returns None for a skipped frame, else (image, region);
+    landmarks found in ``image`` are mapped back with ``to_frame()``.
+    """
+
+    def __init__(self, roi=True, adaptive=True, idle=True, budget=0.015, roi_margin=0.5,
+                 min_roi=0.3, min_scale=0.4, idle_after=1.0, idle_fps=5.0):
+        import cv2
+        self._cv2 = cv2
+        self.roi_enabled = roi
+        self.adaptive = adaptive
+        self.idle_enabled = idle
+        self.budget = budget
+        self.roi_margin = roi_margin
+        self.min_roi = min_roi
+        self.min_scale = min_scale
+        self.idle_after = idle_after
+        self.idle_period = 1.0 / idle_fps
+        self.scale = 1.0
+        self.roi = None              # 下一帧的裁剪区域（像素 x0, y0, x1, y1）
+        self.last_seen = time.monotonic()  # 最近一次检测到手（启动时按刚见过计）
+        self.last_run = None         # monotonic，最近一次运行模型
+        self.model_time = None       # 秒，模型耗时的指数平均
+        self.full_frame_time = None  # 秒，全分辨率整帧耗时的指数平均（估算节省量的基准）
+        self._started = time.monotonic()
+        self.frames = 0
+        self.runs = 0
+        self.skipped = 0
+        self.roi_runs = 0
+        self.pixels = 0.0            # 模型输入像素占整帧的比例之和
+        self.spent = 0.0             # 秒，模型实际耗时总和
+
+    def is_idle(self, now=None):
+        now = time.monotonic() if now is None else now
+        return self.idle_enabled and now - self.last_seen > self.idle_after
+
+    def plan(self, frame, now=None):
+        now = time.monotonic() if now is None else now
+        self.frames += 1
+        if self.is_idle(now) and self.last_run is not None and now - self.last_run < self.idle_period:
+            self.skipped += 1
+            return None
+        self.last_run = now
+
+        height, width = frame.shape[:2]
+        x0, y0, x1, y1 = self.roi if self.roi is not None else (0, 0, width, height)
+        image = frame[y0:y1, x0:x1]
+        if self.scale < 1.0:
+            size = (max(1, int((x1 - x0) * self.scale)), max(1, int((y1 - y0) * self.scale)))
+            image = self._cv2.resize(image, size, interpolation=self._cv2.INTER_AREA)
+        self.pixels += (x1 - x0) * (y1 - y0) * self.scale * self.scale / (width * height)
+        if self.roi is not None:
+            self.roi_runs += 1
+        return image, (x0 / width, y0 / height, (x1 - x0) / width, (y1 - y0) / height)
+
+    @staticmethod
+    def to_frame(landmarks, region):
+        """Map MediaPipe landmarks from ``image`` coordinates back to the full frame, in place."""
+        left, top, w, h = region
+        if (left, top, w, h) == (0.0, 0.0, 1.0, 1.0):
+            return
+        for p in landmarks:
+            p.x = left + p.x * w
+            p.y = top + p.y * h
+
+    def observe(self, points, elapsed, region, frame_shape, now=None):
+        """Feed back the model result: ``points`` is an (N, 2+) array of full-frame
+        normalized landmarks of all hands (None if none) and ``elapsed`` the model time."""
+        now = time.monotonic() if now is None else now
+        self.runs += 1
+        self.spent += elapsed
+        if self.runs > 1:  # 第一次运行包含模型初始化，不计入平均
+            self.model_time = elapsed if self.model_time is None else 0.8 * self.model_time + 0.2 * elapsed
+            if region == (0.0, 0.0, 1.0, 1.0) and self.scale == 1.0:
+                self.full_frame_time = (elapsed if self.full_frame_time is None
+                                        else 0.8 * self.full_frame_time + 0.2 * elapsed)
+
+        if self.adaptive and self.model_time is not None:
+            if self.model_time > self.budget:
+                self.scale = max(self.min_scale, self.scale * 0.85)
+            elif self.model_time < 0.6 * self.budget:
+                self.scale = min(1.0, self.scale * 1.1)
+
+        if points is None:
+            self.roi = None  # 丢失：下一帧回到整帧检测
+            return
+        self.last_seen = now
+        if not self.roi_enabled:
+            return
+        height, width = frame_shape[:2]
+        lo = points[:, :2].min(axis=0) * (width, height)
+        hi = points[:, :2].max(axis=0) * (width, height)
+        side = max((hi - lo).max() * (1 + 2 * self.roi_margin), self.min_roi * min(width, height))
+        center = (lo + hi) / 2
+        x0, y0 = (center - side / 2).astype(int).tolist()
+        x1, y1 = (center + side / 2).astype(int).tolist()
+        x0, y0, x1, y1 = max(0, x0), max(0, y0), min(width, x1), min(height, y1)
+        self.roi = (x0, y0, x1, y1) if x1 - x0 > 1 and y1 - y0 > 1 else None
+
+    def stats(self):
+        elapsed = time.monotonic() - self._started
+        full = self.full_frame_time
+        saved = 1.0 - self.spent / (self.frames * full) if full and self.frames else 0.0
+        return {
+            'frames': self.frames,
+            'model_runs': self.runs,
+            'skipped_idle': self.skipped,
+            'roi_runs': self.roi_runs,
+            'effective_fps': self.runs / elapsed if elapsed else 0.0,
+            'scale': self.scale,
+            'mean_input_pixels': self.pixels / self.runs if self.runs else 0.0,
+            'model_ms_mean': self.spent / self.runs * 1000 if self.runs else 0.0,
+            'full_frame_ms': full * 1000 if full else 0.0,
+            'cpu_saved': saved,
+        }
+
+    def summary(self):
+        s = self.stats()
+        return (f"model ran on {s['model_runs']}/{s['frames']} frames ({s['effective_fps']:.1f} fps, "
+                f"{s['skipped_idle']} skipped idle, {s['roi_runs']} on ROI), input "
+                f"{s['mean_input_pixels']:.0%} of the frame, {s['model_ms_mean']:.1f} ms/run vs "
+                f"{s['full_frame_ms']:.1f} ms full frame; model CPU saved ~{s['cpu_saved']:.0%}")
+
+
+class StaticOverlay:
+    """Overlay text that never changes, rendered once and pasted onto every frame.
+
+    The text is drawn once per frame size; afterwards each frame only gets
+    the covered pixels written back in a single indexed assignment instead
+    of one ``putText`` (and its color logic) per line.
+    """
+
+    def __init__(self):
+        import cv2
+        self._cv2 = cv2
+        self._blocks = []
+        self._pixels = None
+        self._shape = None
+
+    def add_lines(self, lines, origin, line_height=20, scale=0.5, thickness=1, font=None):
+        """``lines`` is a list of (text, BGR color); empty text keeps its row blank."""
+        if font is None:
+            font = self._cv2.FONT_HERSHEY_SIMPLEX
+        self._blocks.append((lines, origin, line_height, scale, thickness, font))
+        self._pixels = None
+
+    def _build(self, shape):
+        cv2 = self._cv2
+        layer = np.zeros(shape, np.uint8)
+        mask = np.zeros(shape[:2], np.uint8)  # 单独的掩码，黑色文字也能保留
+        for lines, (x, y), line_height, scale, thickness, font in self._blocks:
+            for i, (text, color) in enumerate(lines):
+                if text:
+                    org = (x, y + i * line_height)
+                    cv2.putText(layer, text, org, font, scale, color, thickness)
+                    cv2.putText(mask, text, org, font, scale, 255, thickness)
+        rows, cols = np.nonzero(mask)
+        self._pixels = (rows, cols, layer[rows, cols])
+        self._shape = shape
+
+    def apply(self, frame):
+        if self._pixels is None or self._shape != frame.shape:
+            self._build(frame.shape)
+        rows, cols, colors = self._pixels
+        frame[rows, cols] = colors
+        return frame
@@ -0,0 +1,105 @@
+"""Heartbeat watchdog for the dead-man stop in server.py.
+
+Clients send a heartbeat every ``interval`` seconds (binary: the HEARTBEAT
+opcode with the interval in the confidence field; text: a ``heartbeat``
+token). A client whose last heartbeat is older than ``timeout`` expires
+and ``on_expired(key, last_seen)`` is called from the watchdog thread.
+server.py also ``watch()``es a client from its first motion command on, so
+a client that never sends heartbeats expires ``timeout`` after it starts
+the robot moving instead of escaping the dead-man stop.
+
+Every client shares the same timeout, so the connections are kept in an
+OrderedDict ordered by last heartbeat: ``beat()`` is an O(1) move to the
+end and the thread only ever looks at the oldest entry, however many
+clients there are.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+HEARTBEAT_TIMEOUT = 0.15    # 秒，最后一次心跳到发出停止的上限
+HEARTBEAT_INTERVAL = 0.05   # 秒，客户端默认心跳间隔
+
+
+class HeartbeatWatchdog:
+    """Expires clients whose heartbeats stop; see module docstring."""
+
+    def __init__(self, on_expired, timeout=HEARTBEAT_TIMEOUT, history=1000):
+        self.on_expired = on_expired
+        self.timeout = timeout
+        self.beats = 0
+        self.missed = 0      # 根据客户端声明的间隔推算出的丢失心跳数
+        self.expired = 0
+        self.lateness = deque(maxlen=history)  # 秒，实际判定时间 - 截止时间
+        self._cond = threading.Condition()
+        self._last_seen = OrderedDict()  # key -> (monotonic 时间, 声明的间隔)
+        threading.Thread(target=self._run, name='heartbeat-watchdog', daemon=True).start()
+
+    def beat(self, key, interval=None, now=None):
+        """Record a heartbeat; returns the number of heartbeats missed before it."""
+        if now is None:
+            now = time.monotonic()
+        missed = 0
+        with self._cond:
+            previous = self._last_seen.pop(key, None)
+            was_empty = not self._last_seen
+            self._last_seen[key] = (now, interval)
+            self.beats += 1
+            if previous is not None and interval:
+                missed = max(0, int((now - previous[0]) / interval) - 1)  # 间隔翻倍才算丢失
+                self.missed += missed
+            if was_empty:
+                self._cond.notify()  # 只有队首变化时才需要唤醒
+        return missed
+
+    def watch(self, key, now=None):
+        """Start watching ``key`` unless it already is; its heartbeats must follow within ``timeout``."""
+        if now is None:
+            now = time.monotonic()
+        with self._cond:
+            if key in self._last_seen:
+                return False  # 已在监视：不刷新时间，运动命令不能代替心跳
+            was_empty = not self._last_seen
+            self._last_seen[key] = (now, None)
+            if was_empty:
+                self._cond.notify()
+            return True
+
+    def remove(self, key):
+        """Stop watching ``key`` (connection closed)."""
+        with self._cond:
+            return self._last_seen.pop(key, None) is not None
+
+    def stats(self):
+        with self._cond:
+            lateness = list(self.lateness)
+            return {
+                'clients': len(self._last_seen),
+                'beats': self.beats,
+                'missed': self.missed,
+                'expired': self.expired,
+                'detect_late_mean_ms': sum(lateness) / len(lateness) * 1000 if lateness else 0.0,
+                'detect_late_max_ms': max(lateness) * 1000 if lateness else 0.0,
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._last_seen:
+                        self._cond.wait()
+                        continue
+                    key, (seen, _) = next(iter(self._last_seen.items()))
+                    deadline = seen + self.timeout
+                    now = time.monotonic()
+                    if now >= deadline:
+                        break
+                    self._cond.wait(deadline - now)
+                del self._last_seen[key]
+                self.expired += 1
+                self.lateness.append(now - deadline)
+            try:
+                self.on_expired(key, seen)
+            except Exception as e:
+                print(f"[Error] Watchdog handler failed for {key}: {e}")